@@ -0,0 +1,159 @@
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any, Dict, List, Optional
+
+from phi.document import Document
+from phi.vectordb.pgvector import PgVector2
+from sqlalchemy import (
+    BigInteger,
+    Column,
+    DateTime,
+    Integer,
+    MetaData,
+    String,
+    Table,
+    delete,
+    distinct,
+    func,
+    literal,
+    select,
+    text,
+)
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.engine import Engine
+
+from ai.tenant import get_namespace, tenant_filters
+from utils.log import logger
+
+######################################################
+## Document catalog
+######################################################
+
+# One row per document in each vector db collection (or tenant of a shared collection),
+# so listing documents does not scan the chunk tables
+catalog_table = Table(
+    "document_catalog",
+    MetaData(schema="ai"),
+    Column("collection", String, primary_key=True),
+    Column("name", String, primary_key=True),
+    Column("title", String),
+    Column("num_pages", Integer),
+    Column("num_chunks", Integer),
+    Column("num_bytes", BigInteger),
+    Column("created_at", DateTime(timezone=True), server_default=func.now()),
+    Column("updated_at", DateTime(timezone=True), server_default=func.now(), onupdate=func.now()),
+)
+
+
+@lru_cache
+def create_catalog_table(engine: Engine) -> None:
+    with engine.begin() as conn:
+        conn.execute(text("CREATE SCHEMA IF NOT EXISTS ai;"))
+    catalog_table.create(engine, checkfirst=True)
+
+
+def update_catalog(vector_db: PgVector2, documents: List[Document]) -> None:
+    """Records the documents just loaded into `vector_db` in the catalog.
+
+    `documents` must hold every chunk of the documents they belong to,
+    the catalog entry of each document name is replaced.
+    """
+    entries: Dict[str, Dict[str, Any]] = OrderedDict()
+    pages: Dict[str, set] = {}
+    for document in documents:
+        name = document.name or document.id
+        if name is None:
+            continue
+        meta_data = document.meta_data or {}
+        entry = entries.setdefault(
+            name,
+            dict(collection=get_namespace(vector_db), name=name, title=None, num_chunks=0, num_bytes=0),
+        )
+        if entry["title"] is None and meta_data.get("title"):
+            entry["title"] = meta_data["title"]
+        entry["num_chunks"] += 1
+        entry["num_bytes"] += len(document.content.encode())
+        if meta_data.get("page") is not None:
+            pages.setdefault(name, set()).add(meta_data["page"])
+    if len(entries) == 0:
+        return
+
+    for name, entry in entries.items():
+        entry["num_pages"] = len(pages.get(name, ()))
+        entry["title"] = entry["title"] or name
+
+    create_catalog_table(vector_db.db_engine)
+    stmt = postgresql.insert(catalog_table).values(list(entries.values()))
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["collection", "name"],
+        set_=dict(
+            title=stmt.excluded.title,
+            num_pages=stmt.excluded.num_pages,
+            num_chunks=stmt.excluded.num_chunks,
+            num_bytes=stmt.excluded.num_bytes,
+            updated_at=func.now(),
+        ),
+    )
+    with vector_db.Session() as session, session.begin():
+        session.execute(stmt)
+
+
+def backfill_catalog(vector_db: PgVector2) -> int:
+    """Catalogs the documents already in `vector_db` from its chunk table and returns their number.
+
+    Only needed once for collections loaded before the catalog existed.
+    """
+    if not vector_db.table_exists():
+        return 0
+
+    create_catalog_table(vector_db.db_engine)
+    table = vector_db.table
+    page = table.c.meta_data["page"].astext
+    documents = (
+        select(
+            literal(get_namespace(vector_db)),
+            table.c.name,
+            func.coalesce(func.min(table.c.meta_data["title"].astext), table.c.name),
+            func.count(distinct(page)),
+            func.count(),
+            func.sum(func.octet_length(table.c.content)),
+            func.min(table.c.created_at),
+        )
+        .where(table.c.name.is_not(None), *tenant_filters(vector_db))
+        .group_by(table.c.name)
+    )
+    stmt = (
+        postgresql.insert(catalog_table)
+        .from_select(
+            ["collection", "name", "title", "num_pages", "num_chunks", "num_bytes", "created_at"], documents
+        )
+        .on_conflict_do_nothing(index_elements=["collection", "name"])
+    )
+    with vector_db.Session() as session, session.begin():
+        result = session.execute(stmt)
+    logger.info(f"Cataloged {result.rowcount} documents in {get_namespace(vector_db)}")
+    return result.rowcount
+
+
+def list_catalog(vector_db: PgVector2, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Returns the catalog entries of the documents in `vector_db`, oldest first"""
+    create_catalog_table(vector_db.db_engine)
+    stmt = (
+        select(catalog_table)
+        .where(catalog_table.c.collection == get_namespace(vector_db))
+        .order_by(catalog_table.c.created_at, catalog_table.c.name)
+    )
+    if limit is not None:
+        stmt = stmt.limit(limit)
+    with vector_db.Session() as session, session.begin():
+        rows = session.execute(stmt).fetchall()
+    if len(rows) == 0 and backfill_catalog(vector_db) > 0:
+        return list_catalog(vector_db, limit=limit)
+    return [dict(row._mapping) for row in rows]
+
+
+def clear_catalog(vector_db: PgVector2) -> None:
+    """Removes every catalog entry of `vector_db`, for when the collection is cleared"""
+    create_catalog_table(vector_db.db_engine)
+    with vector_db.Session() as session, session.begin():
+        session.execute(delete(catalog_table).where(catalog_table.c.collection == get_namespace(vector_db)))
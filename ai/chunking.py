@@ -0,0 +1,211 @@
+import re
+from bisect import bisect_right
+from collections import Counter
+from functools import lru_cache
+from statistics import median
+from typing import List, NamedTuple, Optional, Set, Tuple
+
+import tiktoken
+
+######################################################
+## Structure-aware chunking
+######################################################
+
+# Section headings of papers, like "3.1 Model Architecture", "IV. RESULTS" or "Abstract"
+SECTION_HEADING = re.compile(
+    r"^(?:\d{1,2}(?:\.\d{1,2})*\.?|[IVX]+\.|[A-H]\.)\s+[A-Z][^.!?]{0,80}$"
+    r"|^(?:Abstract|Introduction|Related Work|Background|Methods?|Methodology|Experiments?|Results"
+    r"|Discussion|Conclusions?|References|Acknowledge?ments|Appendix)\b[^.!?]{0,60}$"
+)
+SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+
+@lru_cache
+def get_encoding() -> tiktoken.Encoding:
+    # Used by the OpenAI embedding and chat models
+    return tiktoken.get_encoding("cl100k_base")
+
+
+def count_tokens(text: str) -> int:
+    return len(get_encoding().encode(text, disallowed_special=()))
+
+
+class Chunk(NamedTuple):
+    """A chunk of a text, as offsets into it.
+
+    The chunk content is `text[overlap_start:end]`, where `text[overlap_start:start]` repeats
+    the end of the previous chunk. Reassemble the text from `text[start:end]` of each chunk.
+    """
+
+    overlap_start: int
+    start: int
+    end: int
+    page: Optional[int]
+    section: Optional[str]
+    num_tokens: int
+
+
+def _normalize_line(line: str) -> str:
+    # Page numbers change from page to page in otherwise identical headers and footers
+    return re.sub(r"\d+", "#", line.strip())
+
+
+def find_headers_and_footers(pages: List[str], num_lines: int = 3, min_fraction: float = 0.5) -> Set[str]:
+    """Returns the normalized lines repeated at the top or bottom of at least `min_fraction` of `pages`"""
+    if len(pages) < 3:
+        return set()
+    counts: Counter = Counter()
+    for page in pages:
+        lines = [line for line in page.splitlines() if line.strip()]
+        counts.update({_normalize_line(line) for line in lines[:num_lines] + lines[-num_lines:]})
+    return {line for line, count in counts.items() if line and count >= min_fraction * len(pages)}
+
+
+def remove_headers_and_footers(pages: List[str], num_lines: int = 3) -> List[str]:
+    """Removes the header and footer lines repeated across `pages`, like running titles and page numbers"""
+    repeated = find_headers_and_footers(pages, num_lines=num_lines)
+    cleaned_pages = []
+    for page in pages:
+        lines = page.splitlines()
+        content_lines = [i for i, line in enumerate(lines) if line.strip()]
+        edges = set(content_lines[:num_lines] + content_lines[-num_lines:])
+        kept_lines = [
+            line for i, line in enumerate(lines) if i not in edges or _normalize_line(line) not in repeated
+        ]
+        cleaned_pages.append("\n".join(kept_lines))
+    return cleaned_pages
+
+
+def _split_blocks(text: str) -> List[Tuple[int, int, Optional[str]]]:
+    """Splits `text` into paragraphs, as (start, end, section) spans.
+
+    Paragraphs end at blank lines, section headings, and short lines ending a sentence,
+    which is how paragraph ends look in text extracted from PDFs.
+    """
+    lines: List[Tuple[int, int]] = []
+    position = 0
+    for line in text.splitlines(keepends=True):
+        lines.append((position, position + len(line.rstrip())))
+        position += len(line)
+    line_lengths = [end - start for start, end in lines if end > start]
+    short_line = 0.75 * median(line_lengths) if line_lengths else 0
+
+    blocks: List[Tuple[int, int, Optional[str]]] = []
+    section: Optional[str] = None
+    block_start: Optional[int] = None
+    block_end = 0
+    for start, end in lines:
+        line = text[start:end].strip()
+        if not line or SECTION_HEADING.match(line):
+            if block_start is not None:
+                blocks.append((block_start, block_end, section))
+                block_start = None
+            if line:
+                section = line
+                blocks.append((start, end, section))
+            continue
+        if block_start is None:
+            block_start = start
+        block_end = end
+        if line[-1] in ".!?:" and end - start < short_line:
+            blocks.append((block_start, block_end, section))
+            block_start = None
+    if block_start is not None:
+        blocks.append((block_start, block_end, section))
+    return blocks
+
+
+def _split_span(text: str, start: int, end: int, max_tokens: int) -> List[Tuple[int, int, int]]:
+    """Splits the span of `text` into sentences, and sentences into words, of at most `max_tokens`"""
+    num_tokens = count_tokens(text[start:end])
+    if num_tokens <= max_tokens:
+        return [(start, end, num_tokens)]
+
+    pattern = SENTENCE_END if SENTENCE_END.search(text, start, end) else re.compile(r"\s+")
+    pieces: List[Tuple[int, int]] = []
+    piece_start = start
+    for match in pattern.finditer(text, start, end):
+        pieces.append((piece_start, match.start()))
+        piece_start = match.end()
+    pieces.append((piece_start, end))
+    if len(pieces) == 1:
+        # A single word longer than the budget, split it by characters
+        size = max(len(text[start:end]) * max_tokens // num_tokens, 1)
+        pieces = [(i, min(i + size, end)) for i in range(start, end, size)]
+
+    spans: List[Tuple[int, int, int]] = []
+    for piece_start, piece_end in pieces:
+        if pattern is SENTENCE_END:
+            spans.extend(_split_span(text, piece_start, piece_end, max_tokens))
+        else:
+            spans.append((piece_start, piece_end, count_tokens(text[piece_start:piece_end])))
+    return spans
+
+
+def _overlap_start(text: str, start: int, lower_bound: int, overlap_tokens: int) -> int:
+    """Returns the start of the last words before `start` that fit in `overlap_tokens`"""
+    overlap_start = start
+    for match in reversed(list(re.finditer(r"\S+", text[lower_bound:start]))):
+        candidate = lower_bound + match.start()
+        if count_tokens(text[candidate:start]) > overlap_tokens:
+            break
+        overlap_start = candidate
+    return overlap_start
+
+
+def chunk_pages(
+    pages: List[Tuple[int, str]], max_tokens: int = 400, overlap_tokens: int = 50
+) -> Tuple[str, List[Chunk]]:
+    """Splits the pages of a document into chunks along its sections and paragraphs.
+
+    Repeated headers and footers are removed and the pages are joined into one text. Paragraphs
+    of the same section are packed into chunks of at most `max_tokens` tokens; longer paragraphs
+    are split into sentences, and sentences into words. Chunks of a section start with the last
+    `overlap_tokens` tokens of the previous chunk, and never span two sections.
+
+    Args:
+        pages (list): The number and text of each page.
+        max_tokens (int): Maximum number of tokens of a chunk, without the overlap.
+        overlap_tokens (int): Number of tokens repeated from the previous chunk.
+
+    Returns:
+        The joined text and its chunks.
+    """
+    page_numbers = [page_number for page_number, _ in pages]
+    cleaned_pages = remove_headers_and_footers([page_content for _, page_content in pages])
+    page_starts: List[int] = []
+    text = ""
+    for page_content in cleaned_pages:
+        page_starts.append(len(text))
+        text += page_content + "\n"
+
+    def page_of(offset: int) -> Optional[int]:
+        index = bisect_right(page_starts, offset) - 1
+        return page_numbers[index] if index >= 0 else None
+
+    chunks: List[Chunk] = []
+    current: Optional[List[int]] = None  # [start, end, num_tokens]
+    current_section: Optional[str] = None
+
+    def close_chunk() -> None:
+        if current is None:
+            return
+        start, end, num_tokens = current
+        overlap_start = start
+        if len(chunks) > 0 and chunks[-1].section == current_section:
+            overlap_start = _overlap_start(text, start, chunks[-1].start, overlap_tokens)
+        chunks.append(Chunk(overlap_start, start, end, page_of(start), current_section, num_tokens))
+
+    for block_start, block_end, section in _split_blocks(text):
+        for start, end, num_tokens in _split_span(text, block_start, block_end, max_tokens):
+            if current is not None and section == current_section and current[2] + num_tokens <= max_tokens:
+                current[1], current[2] = end, current[2] + num_tokens
+                continue
+            close_chunk()
+            current, current_section = [start, end, num_tokens], section
+    close_chunk()
+
+    # Each chunk ends where the next one starts, so the chunks reassemble the whole text
+    for i in range(len(chunks) - 1):
+        chunks[i] = chunks[i]._replace(end=chunks[i + 1].start)
+    return text, chunks
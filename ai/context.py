@@ -0,0 +1,120 @@
+import threading
+from collections import OrderedDict
+from hashlib import sha256
+from typing import Any, Dict, List, Optional, Tuple
+
+from phi.document import Document
+
+from ai.chunking import count_tokens, get_encoding
+from ai.settings import ai_settings
+
+######################################################
+## Token-budgeted context packing
+######################################################
+
+# Marks the text left out between two packed parts
+GAP = "\n\n[...]\n\n"
+
+
+class TokenCounts:
+    """Bounded LRU cache of the number of tokens of texts, by their SHA-256"""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._counts: "OrderedDict[str, int]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def count(self, text: str) -> int:
+        key = sha256(text.encode()).hexdigest()
+        with self._lock:
+            num_tokens = self._counts.get(key)
+            if num_tokens is not None:
+                self._counts.move_to_end(key)
+                return num_tokens
+        num_tokens = count_tokens(text)
+        with self._lock:
+            self._counts[key] = num_tokens
+            while len(self._counts) > self.max_size:
+                self._counts.popitem(last=False)
+        return num_tokens
+
+
+token_counts = TokenCounts(max_size=ai_settings.token_count_cache_size)
+
+
+def get_num_tokens(content: str, meta_data: Optional[Dict[str, Any]] = None) -> int:
+    """Returns the number of tokens of a document, as stored when it was loaded or counted once"""
+    if meta_data is not None and meta_data.get("num_tokens") is not None:
+        return int(meta_data["num_tokens"])
+    return token_counts.count(content)
+
+
+def truncate_tokens(text: str, max_tokens: int) -> str:
+    """Returns the start of `text` that fits in `max_tokens` tokens"""
+    if max_tokens <= 0:
+        return ""
+    tokens = get_encoding().encode(text, disallowed_special=())
+    if len(tokens) <= max_tokens:
+        return text
+    return get_encoding().decode(tokens[:max_tokens])
+
+
+def _reading_order(document: Document) -> Tuple[str, int, int]:
+    meta_data = document.meta_data or {}
+    # Documents without a page or chunk (like arXiv summaries) come first
+    return (document.name or "", meta_data.get("page") or 0, meta_data.get("chunk") or 0)
+
+
+def _follows(document: Document, previous: Optional[Document]) -> bool:
+    """Returns True if `document` is the chunk right after `previous`"""
+    if previous is None or previous.name != document.name:
+        return False
+    meta_data = document.meta_data or {}
+    previous_meta_data = previous.meta_data or {}
+    if meta_data.get("chunk") is None or previous_meta_data.get("chunk") is None:
+        return False
+    # Chunks of arXiv papers are numbered across pages, the chunks of other PDFs on each page
+    if "offset" not in meta_data and meta_data.get("page") != previous_meta_data.get("page"):
+        return False
+    return meta_data["chunk"] == previous_meta_data["chunk"] + 1
+
+
+def pack_documents(documents: List[Document], max_tokens: int, header: Optional[str] = None) -> str:
+    """Packs the most relevant documents that fit in `max_tokens` tokens into one text.
+
+    `documents` are taken in the order given, most relevant first, and each one that still fits is
+    packed; their token counts are read from `meta_data["num_tokens"]` when stored at load time.
+    The packed documents are joined in reading order. Consecutive chunks are joined without the
+    overlap they repeat, other parts are separated by a gap marker.
+
+    Args:
+        documents (List[Document]): The documents, most relevant first.
+        max_tokens (int): Maximum number of tokens of the packed text.
+        header (str): (optional) Text to start with, like the metadata of a paper. Truncated to the budget.
+
+    Returns:
+        str: The packed text.
+    """
+    parts: List[str] = []
+    budget = max_tokens
+    if header:
+        header = truncate_tokens(header, budget)
+        parts.append(header)
+        budget -= get_num_tokens(header)
+
+    gap_tokens = get_num_tokens(GAP)
+    packed: List[Document] = []
+    for document in documents:
+        num_tokens = get_num_tokens(document.content, document.meta_data) + gap_tokens
+        if num_tokens <= budget:
+            packed.append(document)
+            budget -= num_tokens
+
+    previous: Optional[Document] = None
+    for document in sorted(packed, key=_reading_order):
+        if _follows(document, previous):
+            parts[-1] += document.content[(document.meta_data or {}).get("overlap") or 0 :]
+        else:
+            parts.append(document.content)
+        previous = document
+    return GAP.join(parts)
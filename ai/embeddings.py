@@ -0,0 +1,206 @@
+import threading
+import unicodedata
+from array import array
+from collections import OrderedDict
+from functools import lru_cache
+from hashlib import sha256
+from typing import Dict, List, Optional, Tuple
+
+from phi.embedder.openai import OpenAIEmbedder
+from sqlalchemy import (
+    Column,
+    DateTime,
+    LargeBinary,
+    MetaData,
+    String,
+    Table,
+    create_engine,
+    func,
+    select,
+    text,
+)
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import Engine
+
+from ai.settings import ai_settings
+from db.session import db_engine
+from utils.log import logger
+
+######################################################
+## Embedding cache
+######################################################
+
+
+def normalize_text(content: str) -> str:
+    """Normalizes `content` for the cache key: unicode normalization and collapsed whitespace.
+
+    Case is kept, it changes the meaning of acronyms and names.
+    """
+    return " ".join(unicodedata.normalize("NFC", content).split())
+
+
+def get_openai_embeddings(
+    embedder: OpenAIEmbedder, texts: List[str], batch_size: int = 100
+) -> List[List[float]]:
+    """Embeds `texts` with one API request per batch of `batch_size` texts"""
+    embeddings: List[List[float]] = []
+    for start in range(0, len(texts), batch_size):
+        request_params = {
+            "input": texts[start : start + batch_size],
+            "model": embedder.model,
+            "encoding_format": embedder.encoding_format,
+        }
+        if embedder.model.startswith("text-embedding-3"):
+            request_params["dimensions"] = embedder.dimensions
+        response = embedder.client.embeddings.create(**request_params)
+        embeddings.extend(embedding.embedding for embedding in sorted(response.data, key=lambda e: e.index))
+    return embeddings
+
+
+class EmbeddingCache:
+    """
+    Content-addressed cache of embeddings, keyed by the embedding model and the normalized text.
+
+    Lookups go through an in-process LRU of `max_size` embeddings, then a table shared by all
+    processes: `ai.embedding_cache` on Postgres, or `embedding_cache` on other databases like SQLite.
+    Embeddings are stored as float32 bytes. Errors of the table are logged and treated as misses,
+    so the cache never stops documents or queries from being embedded.
+    """
+
+    def __init__(self, engine: Engine, max_size: int = 10000):
+        self.engine: Engine = engine
+        self.max_size: int = max_size
+        self.entries: OrderedDict[str, List[float]] = OrderedDict()
+        self.lock = threading.Lock()
+        self.schema: Optional[str] = "ai" if engine.dialect.name == "postgresql" else None
+        self.table = Table(
+            "embedding_cache",
+            MetaData(schema=self.schema),
+            Column("key", String, primary_key=True),
+            Column("model", String),
+            Column("embedding", LargeBinary),
+            Column("created_at", DateTime(timezone=True), server_default=func.now()),
+        )
+        self.table_created = False
+
+    @staticmethod
+    def get_key(model: str, content: str) -> str:
+        return sha256(f"{model}\n{normalize_text(content)}".encode()).hexdigest()
+
+    def create_table(self) -> None:
+        if self.table_created:
+            return
+        if self.schema is not None:
+            with self.engine.begin() as conn:
+                conn.execute(text(f"CREATE SCHEMA IF NOT EXISTS {self.schema};"))
+        self.table.create(self.engine, checkfirst=True)
+        self.table_created = True
+
+    def get_many(self, model: str, texts: List[str]) -> List[Optional[List[float]]]:
+        """Returns the cached embedding of each of `texts`, None for the ones not cached"""
+        keys = [self.get_key(model, content) for content in texts]
+        found: Dict[str, List[float]] = {}
+        with self.lock:
+            for key in keys:
+                if key in self.entries:
+                    self.entries.move_to_end(key)
+                    found[key] = self.entries[key]
+
+        missing = list({key for key in keys if key not in found})
+        if len(missing) > 0:
+            try:
+                self.create_table()
+                with self.engine.connect() as conn:
+                    rows = conn.execute(
+                        select(self.table.c.key, self.table.c.embedding).where(self.table.c.key.in_(missing))
+                    ).fetchall()
+            except Exception as e:
+                logger.warning(f"Could not read the embedding cache: {e}")
+                rows = []
+            stored = {row.key: array("f", row.embedding).tolist() for row in rows}
+            self._remember(stored)
+            found.update(stored)
+        return [found.get(key) for key in keys]
+
+    def put_many(self, model: str, texts: List[str], embeddings: List[List[float]]) -> None:
+        """Caches the embedding of each of `texts`"""
+        entries = {
+            self.get_key(model, content): embedding
+            for content, embedding in zip(texts, embeddings)
+            if embedding
+        }
+        if len(entries) == 0:
+            return
+        self._remember(entries)
+
+        insert = postgresql.insert if self.engine.dialect.name == "postgresql" else sqlite.insert
+        stmt = insert(self.table).values(
+            [
+                dict(key=key, model=model, embedding=array("f", embedding).tobytes())
+                for key, embedding in entries.items()
+            ]
+        )
+        try:
+            self.create_table()
+            with self.engine.begin() as conn:
+                conn.execute(stmt.on_conflict_do_nothing(index_elements=["key"]))
+        except Exception as e:
+            logger.warning(f"Could not write the embedding cache: {e}")
+
+    def _remember(self, entries: Dict[str, List[float]]) -> None:
+        if self.max_size <= 0:
+            return
+        with self.lock:
+            for key, embedding in entries.items():
+                self.entries[key] = embedding
+                self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+
+@lru_cache
+def get_embedding_cache() -> EmbeddingCache:
+    engine = db_engine
+    if ai_settings.embedding_cache_db_url is not None:
+        engine = create_engine(ai_settings.embedding_cache_db_url)
+    return EmbeddingCache(engine=engine, max_size=ai_settings.embedding_cache_size)
+
+
+class CachedOpenAIEmbedder(OpenAIEmbedder):
+    """OpenAIEmbedder that only calls the API for texts not in the embedding cache"""
+
+    @property
+    def cache_model(self) -> str:
+        return f"{self.model}:{self.dimensions}"
+
+    def get_embeddings(self, texts: List[str], batch_size: int = 100) -> List[List[float]]:
+        """Embeds `texts`, one API request per batch of texts not in the cache"""
+        cache = get_embedding_cache()
+        embeddings = cache.get_many(self.cache_model, texts)
+        # Identical texts missing from the cache are embedded once
+        missing: Dict[str, List[int]] = OrderedDict()
+        for i, (content, embedding) in enumerate(zip(texts, embeddings)):
+            if embedding is None:
+                missing.setdefault(cache.get_key(self.cache_model, content), []).append(i)
+        if len(missing) > 0:
+            missing_texts = [texts[positions[0]] for positions in missing.values()]
+            new_embeddings = get_openai_embeddings(self, missing_texts, batch_size=batch_size)
+            cache.put_many(self.cache_model, missing_texts, new_embeddings)
+            for positions, embedding in zip(missing.values(), new_embeddings):
+                for i in positions:
+                    embeddings[i] = embedding
+        num_missing = sum(len(positions) for positions in missing.values())
+        logger.debug(f"Embedded {len(texts)} texts, {len(texts) - num_missing} from the cache")
+        return embeddings  # type: ignore
+
+    def get_embedding(self, content: str) -> List[float]:
+        return self.get_embedding_and_usage(content)[0]
+
+    def get_embedding_and_usage(self, content: str) -> Tuple[List[float], Optional[Dict]]:
+        cache = get_embedding_cache()
+        cached = cache.get_many(self.cache_model, [content])[0]
+        if cached is not None:
+            return cached, None
+        embedding, usage = super().get_embedding_and_usage(content)
+        cache.put_many(self.cache_model, [content], [embedding])
+        return embedding, usage
@@ -0,0 +1,328 @@
+import argparse
+from math import sqrt
+from typing import Any, Dict, List, Optional, Union
+
+from phi.vectordb.distance import Distance
+from phi.vectordb.pgvector import PgVector2
+from phi.vectordb.pgvector.index import HNSW, Ivfflat
+from pydantic import BaseModel
+from sqlalchemy import func, inspect, literal, select, text
+from sqlalchemy.engine import Connection, Engine
+
+from ai.settings import ai_settings
+from db.session import db_engine
+from utils.log import logger
+
+######################################################
+## Approximate nearest neighbour indexes
+######################################################
+
+
+class IndexPolicy(BaseModel):
+    """How the ANN index of a collection is built and searched"""
+
+    # "hnsw" suits collections that grow over time, "ivfflat" collections loaded in bulk
+    index_type: str = "hnsw"
+    # Below this number of rows a sequential scan is fast and exact, so no index is built
+    min_rows: int = ai_settings.vector_index_min_rows
+    # HNSW build and search parameters, ef_search must be at least the number of documents searched
+    m: int = 16
+    ef_construction: int = 64
+    ef_search: int = 40
+    # IVFFlat: number of lists probed per search, about the square root of the number of lists
+    probes: int = 10
+    # IVFFlat: rebuild once the recommended number of lists differs from the built one by this factor
+    rebuild_factor: float = 2.0
+
+
+# Index policies by collection, per-user collections (like `pdf_documents_{user_id}`)
+# and shared tenant collections (like `tenant_pdf_documents`) use the policy of their prefix
+INDEX_POLICIES: Dict[str, IndexPolicy] = {
+    "hn_documents": IndexPolicy(ef_search=80),
+    "pdf_documents": IndexPolicy(),
+    "arxiv_knowledge": IndexPolicy(),
+    "arxiv_summary": IndexPolicy(ef_search=60),
+    "website_documents": IndexPolicy(index_type="ivfflat"),
+    "sales_knowledge": IndexPolicy(index_type="ivfflat"),
+}
+
+# Shared tables are filtered on tenant_id after the index scan, so each search
+# needs more candidates to find `limit` rows of the tenant
+TENANT_EF_SEARCH_FACTOR = 4
+TENANT_PREFIX = "tenant_"
+
+
+def get_index_policy(collection: str) -> IndexPolicy:
+    """Returns the index policy of `collection`"""
+    is_tenant_table = collection.startswith(TENANT_PREFIX)
+    name = collection[len(TENANT_PREFIX) :] if is_tenant_table else collection
+    matches = [prefix for prefix in INDEX_POLICIES if name == prefix or name.startswith(f"{prefix}_")]
+    policy = INDEX_POLICIES[max(matches, key=len)] if matches else IndexPolicy()
+    if is_tenant_table:
+        policy = policy.model_copy(update={"ef_search": policy.ef_search * TENANT_EF_SEARCH_FACTOR})
+    return policy
+
+
+def get_vector_index(collection: str) -> Union[HNSW, Ivfflat]:
+    """Returns the index settings to create the PgVector2 of `collection` with.
+
+    PgVector2 applies `ef_search` or `probes` to every search, and `PgVector2.optimize`
+    builds an index with the same name as `refresh_index`.
+    """
+    policy = get_index_policy(collection)
+    if policy.index_type == "ivfflat":
+        return Ivfflat(name=f"{collection}_ivfflat_index", probes=policy.probes)
+    return HNSW(
+        name=f"{collection}_hnsw_index",
+        m=policy.m,
+        ef_construction=policy.ef_construction,
+        ef_search=policy.ef_search,
+    )
+
+
+def get_num_lists(num_rows: int) -> int:
+    """Returns the number of IVFFlat lists recommended by pgvector for `num_rows` rows"""
+    if num_rows <= 1000000:
+        return max(num_rows // 1000, 1)
+    return int(sqrt(num_rows))
+
+
+def get_operator_class(vector_db: PgVector2) -> str:
+    if vector_db.distance == Distance.l2:
+        return "vector_l2_ops"
+    if vector_db.distance == Distance.max_inner_product:
+        return "vector_ip_ops"
+    return "vector_cosine_ops"
+
+
+def _table_name(vector_db: PgVector2) -> str:
+    return f'"{vector_db.schema}"."{vector_db.collection}"'
+
+
+def _get_index(conn: Connection, table_name: str) -> Optional[Dict[str, Any]]:
+    """Returns the ANN index on `table_name` and its state, None if there is none"""
+    row = conn.execute(
+        text(
+            "SELECT c.relname AS name, am.amname AS method, i.indisvalid AS valid, c.reloptions AS options, "
+            "(SELECT sum(pg_relation_size(t.relid)) FROM pg_partition_tree(c.oid) t) AS size_bytes, "
+            "(SELECT coalesce(sum(s.idx_scan), 0) FROM pg_stat_all_indexes s "
+            "JOIN pg_partition_tree(c.oid) t ON s.indexrelid = t.relid) AS scans "
+            "FROM pg_index i "
+            "JOIN pg_class c ON c.oid = i.indexrelid "
+            "JOIN pg_am am ON am.oid = c.relam "
+            "WHERE i.indrelid = to_regclass(:table_name) AND am.amname IN ('hnsw', 'ivfflat') "
+            "ORDER BY i.indisvalid DESC LIMIT 1"
+        ),
+        {"table_name": table_name},
+    ).first()
+    if row is None:
+        return None
+    index = dict(row._mapping)
+    options = dict(option.split("=", 1) for option in index.pop("options") or [])
+    index["lists"] = int(options["lists"]) if "lists" in options else None
+    index["size_bytes"] = int(index["size_bytes"] or 0)
+    index["scans"] = int(index["scans"])
+    return index
+
+
+def _is_partitioned(conn: Connection, table_name: str) -> bool:
+    relkind = conn.execute(
+        text("SELECT relkind FROM pg_class WHERE oid = to_regclass(:table_name)"), {"table_name": table_name}
+    ).scalar()
+    return relkind == "p"
+
+
+def _estimate_rows(conn: Connection, table_name: str) -> int:
+    """Returns the planner's estimate of the number of rows in `table_name`, summed over its partitions"""
+    estimate = conn.execute(
+        text(
+            "SELECT sum(greatest(c.reltuples, 0)) FROM pg_partition_tree(to_regclass(:table_name)) t "
+            "JOIN pg_class c ON c.oid = t.relid WHERE t.isleaf"
+        ),
+        {"table_name": table_name},
+    ).scalar()
+    return int(estimate or 0)
+
+
+def _create_index(
+    conn: Connection, vector_db: PgVector2, policy: IndexPolicy, name: str, num_rows: int, concurrently: bool
+) -> None:
+    if policy.index_type == "ivfflat":
+        method, options = "ivfflat", f"lists = {get_num_lists(num_rows)}"
+    else:
+        method, options = "hnsw", f"m = {policy.m}, ef_construction = {policy.ef_construction}"
+    logger.info(f"Creating {method} index {name} on {vector_db.collection} ({num_rows} rows) with {options}")
+    create = "CREATE INDEX CONCURRENTLY" if concurrently else "CREATE INDEX"
+    conn.execute(
+        text(
+            f'{create} IF NOT EXISTS "{name}" '
+            f"ON {_table_name(vector_db)} USING {method} (embedding {get_operator_class(vector_db)}) "
+            f"WITH ({options})"
+        )
+    )
+
+
+def _lists_are_stale(index: Dict[str, Any], num_rows: int, policy: IndexPolicy) -> bool:
+    num_lists, built_lists = get_num_lists(num_rows), index["lists"] or 1
+    return max(num_lists, built_lists) / min(num_lists, built_lists) >= policy.rebuild_factor
+
+
+def _count_live_rows(conn: Connection, table_name: str) -> int:
+    """Returns the number of live rows tracked by the statistics collector, which needs no ANALYZE"""
+    num_rows = conn.execute(
+        text(
+            "SELECT sum(s.n_live_tup) FROM pg_partition_tree(to_regclass(:table_name)) t "
+            "JOIN pg_stat_all_tables s ON s.relid = t.relid WHERE t.isleaf"
+        ),
+        {"table_name": table_name},
+    ).scalar()
+    return int(num_rows or 0)
+
+
+def _bounded_count(vector_db: PgVector2, limit: int):
+    """Returns a query counting at most `limit` rows, which is enough to know if the index is needed"""
+    return select(func.count()).select_from(
+        select(literal(1)).select_from(vector_db.table).limit(limit).subquery()
+    )
+
+
+def index_refresh_needed(vector_db: PgVector2) -> bool:
+    """Returns True if `refresh_index` would build or rebuild the index of `vector_db`.
+
+    Cheap enough to run after every load: it neither analyzes the table nor takes a lock. True once the
+    collection reaches `min_rows` rows without an index, if the index is invalid, or once the number of
+    lists of an IVFFlat index differs from the recommended one by `rebuild_factor`.
+    """
+    if not vector_db.table_exists():
+        return False
+
+    policy = get_index_policy(vector_db.collection)
+    table_name = _table_name(vector_db)
+    with vector_db.db_engine.connect() as conn:
+        index = _get_index(conn, table_name)
+        if index is None:
+            return conn.execute(_bounded_count(vector_db, policy.min_rows)).scalar() >= policy.min_rows
+        if not index["valid"]:
+            return True
+        return index["method"] == "ivfflat" and _lists_are_stale(
+            index, _count_live_rows(conn, table_name), policy
+        )
+
+
+def refresh_index(vector_db: PgVector2) -> Optional[Dict[str, Any]]:
+    """Creates or rebuilds the ANN index of `vector_db` as its collection grows, run it after bulk loads.
+
+    - No index is built until the collection has `min_rows` rows.
+    - A missing index is built, and an invalid one (from a failed build) is built again.
+    - An IVFFlat index is rebuilt once its number of lists no longer suits the number of rows.
+      HNSW indexes are kept up to date by inserts and never need rebuilding.
+
+    A build can take minutes on a large table, so request handlers queue it on the job queue
+    with `ai.jobs.schedule_index_refresh` instead of calling this.
+
+    Indexes are built without locking out writes, except on partitioned tables where Postgres
+    does not support it. Only one process refreshes the index of a table at a time, others skip it.
+
+    Returns:
+        dict: The index health after the refresh, see `get_index_health`.
+    """
+    if not vector_db.table_exists():
+        return None
+
+    policy = get_index_policy(vector_db.collection)
+    table_name = _table_name(vector_db)
+    index_name = f"{vector_db.collection}_{policy.index_type}_index"
+
+    with vector_db.db_engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        if conn.execute(_bounded_count(vector_db, policy.min_rows)).scalar() < policy.min_rows:
+            logger.debug(f"{vector_db.collection} has less than {policy.min_rows} rows, not indexing")
+            return get_index_health(vector_db, conn=conn)
+        if not conn.execute(
+            text("SELECT pg_try_advisory_lock(hashtext(:table_name))"), {"table_name": table_name}
+        ).scalar():
+            logger.info(f"Index of {vector_db.collection} is being refreshed by another process")
+            return get_index_health(vector_db, conn=conn)
+
+        try:
+            for key, value in (vector_db.index.configuration if vector_db.index else {}).items():
+                conn.execute(text(f"SET {key} = '{value}'"))
+            concurrently = not _is_partitioned(conn, table_name)
+            # Fresh statistics for the number of rows, which sets the number of IVFFlat lists
+            conn.execute(text(f"ANALYZE {table_name}"))
+            health = get_index_health(vector_db, conn=conn)
+            index = health["index"]
+            if index is None:
+                _create_index(conn, vector_db, policy, index_name, health["rows"], concurrently)
+            elif health["status"] in ("invalid", "stale"):
+                # Build the new index next to the old one, so searches keep using the old one meanwhile
+                logger.info(f"Rebuilding index {index['name']} on {vector_db.collection}")
+                new_name = f"{index_name}_new"
+                conn.execute(text(f'DROP INDEX IF EXISTS "{vector_db.schema}"."{new_name}"'))
+                _create_index(conn, vector_db, policy, new_name, health["rows"], concurrently)
+                # Swap the indexes in one transaction
+                schema = vector_db.schema
+                with vector_db.db_engine.begin() as swap:
+                    swap.execute(text(f'DROP INDEX "{schema}"."{index["name"]}"'))
+                    swap.execute(text(f'ALTER INDEX "{schema}"."{new_name}" RENAME TO "{index_name}"'))
+        finally:
+            conn.execute(text("RESET ALL"))
+            conn.execute(text("SELECT pg_advisory_unlock(hashtext(:table_name))"), {"table_name": table_name})
+        return get_index_health(vector_db, conn=conn)
+
+
+def get_index_health(vector_db: PgVector2, conn: Optional[Connection] = None) -> Dict[str, Any]:
+    """Reports the state of the ANN index of `vector_db`.
+
+    Returns:
+        dict: The collection, its estimated number of rows, the index name, method, size,
+        number of scans and a status, one of:
+        "ok", "not_needed" (the collection is too small), "missing", "invalid" or "stale"
+        (an IVFFlat index whose number of lists no longer suits the number of rows).
+    """
+    if conn is None:
+        with vector_db.db_engine.connect() as new_conn:
+            return get_index_health(vector_db, conn=new_conn)
+
+    policy = get_index_policy(vector_db.collection)
+    table_name = _table_name(vector_db)
+    num_rows = _estimate_rows(conn, table_name)
+    index = _get_index(conn, table_name)
+    health: Dict[str, Any] = {"collection": vector_db.collection, "rows": num_rows, "index": index}
+    if index is None:
+        health["status"] = "not_needed" if num_rows < policy.min_rows else "missing"
+    elif not index["valid"]:
+        health["status"] = "invalid"
+    elif index["method"] == "ivfflat" and _lists_are_stale(index, num_rows, policy):
+        health["status"] = "stale"
+    else:
+        health["status"] = "ok"
+    return health
+
+
+def get_vector_tables(engine: Engine = db_engine, schema: str = "ai") -> List[str]:
+    """Returns the tables in `schema` with an `embedding` column, without partitions of shared tables"""
+    inspector = inspect(engine)
+    with engine.connect() as conn:
+        partitions = set(
+            conn.execute(
+                text("SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid")
+            ).scalars()
+        )
+    return [
+        table_name
+        for table_name in inspector.get_table_names(schema=schema)
+        if table_name not in partitions
+        and any(column["name"] == "embedding" for column in inspector.get_columns(table_name, schema=schema))
+    ]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Report and refresh the ANN indexes of the vector tables")
+    parser.add_argument("collections", nargs="*", help="Collections to check, all vector tables by default")
+    parser.add_argument("--refresh", action="store_true", help="Create or rebuild the indexes that need it")
+    args = parser.parse_args()
+
+    for collection in args.collections or get_vector_tables():
+        vector_db = PgVector2(collection=collection, schema="ai", db_engine=db_engine)
+        index_health = refresh_index(vector_db) if args.refresh else get_index_health(vector_db)
+        logger.info(index_health)
@@ -0,0 +1,198 @@
+import re
+import uuid
+from datetime import timedelta
+from functools import lru_cache
+from typing import Any, Dict, Optional
+
+from phi.vectordb.pgvector import PgVector2
+from sqlalchemy import (
+    BigInteger,
+    Column,
+    DateTime,
+    Index,
+    MetaData,
+    String,
+    Table,
+    Text,
+    func,
+    or_,
+    select,
+    text,
+    update,
+)
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.engine import Engine
+
+from ai.index import index_refresh_needed
+from ai.settings import ai_settings
+from db.session import db_engine
+
+######################################################
+## Queue of background jobs
+######################################################
+
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+ACTIVE_STATUSES = (QUEUED, RUNNING)
+
+# Jobs named "index:{schema}.{collection}" refresh the ANN index of a vector table.
+# Names are quoted in the index SQL, so they may not contain quotes.
+INDEX_JOB_PATTERN = re.compile(r'^index:([^."]+)\.([^"]+)$')
+
+
+class JobQueue:
+    """
+    Queue of knowledge base loading jobs, stored in the `ai.knowledge_base_jobs` table.
+
+    At most one job per knowledge base is queued or running at a time, which a partial unique
+    index enforces, so duplicate submissions return the job already in flight. Workers in any
+    process claim jobs with `FOR UPDATE SKIP LOCKED` and heartbeat while running, so the job
+    of a worker that died is claimed again once its heartbeat is older than `stale_after`.
+    """
+
+    def __init__(self, engine: Engine = db_engine, schema: str = "ai", stale_after: float = 300):
+        self.engine = engine
+        self.stale_after = stale_after
+        self.table = Table(
+            "knowledge_base_jobs",
+            MetaData(schema=schema),
+            Column("id", String, primary_key=True),
+            Column("knowledge_base", String, nullable=False),
+            Column("status", String, nullable=False),
+            Column("num_done", BigInteger, nullable=False, server_default=text("0")),
+            Column("num_total", BigInteger),
+            Column("message", Text),
+            Column("error", Text),
+            Column("created_at", DateTime(timezone=True), server_default=func.now()),
+            Column("started_at", DateTime(timezone=True)),
+            Column("heartbeat_at", DateTime(timezone=True)),
+            Column("finished_at", DateTime(timezone=True)),
+        )
+        Index(
+            "knowledge_base_jobs_active_idx",
+            self.table.c.knowledge_base,
+            unique=True,
+            postgresql_where=self.table.c.status.in_(ACTIVE_STATUSES),
+        )
+        with self.engine.begin() as conn:
+            conn.execute(text(f"CREATE SCHEMA IF NOT EXISTS {schema};"))
+        self.table.create(self.engine, checkfirst=True)
+
+    def submit(self, knowledge_base: str) -> Dict[str, Any]:
+        """Queues a load of `knowledge_base` and returns its job, or the job already queued or running"""
+        stmt = (
+            postgresql.insert(self.table)
+            .values(id=str(uuid.uuid4()), knowledge_base=knowledge_base, status=QUEUED)
+            .on_conflict_do_nothing(
+                index_elements=["knowledge_base"],
+                index_where=self.table.c.status.in_(ACTIVE_STATUSES),
+            )
+        )
+        with self.engine.begin() as conn:
+            conn.execute(stmt)
+            row = conn.execute(
+                self._select().where(
+                    self.table.c.knowledge_base == knowledge_base,
+                    self.table.c.status.in_(ACTIVE_STATUSES),
+                )
+            ).first()
+        if row is None:
+            # The active job finished between the insert and the select
+            return self.submit(knowledge_base)
+        return self._to_dict(row)
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self.engine.connect() as conn:
+            row = conn.execute(self._select().where(self.table.c.id == job_id)).first()
+        return self._to_dict(row) if row is not None else None
+
+    def claim(self) -> Optional[Dict[str, Any]]:
+        """Marks the oldest queued or stale job as running and returns it"""
+        table = self.table
+        with self.engine.begin() as conn:
+            row = conn.execute(
+                select(table.c.id)
+                .where(
+                    or_(
+                        table.c.status == QUEUED,
+                        (table.c.status == RUNNING)
+                        & (table.c.heartbeat_at < func.now() - timedelta(seconds=self.stale_after)),
+                    )
+                )
+                .order_by(table.c.created_at)
+                .limit(1)
+                .with_for_update(skip_locked=True)
+            ).first()
+            if row is None:
+                return None
+            conn.execute(
+                update(table)
+                .where(table.c.id == row.id)
+                .values(status=RUNNING, started_at=func.now(), heartbeat_at=func.now(), error=None)
+            )
+            job = conn.execute(self._select().where(table.c.id == row.id)).first()
+        return self._to_dict(job)
+
+    def heartbeat(self, job_id: str, num_done: Optional[int] = None, num_total: Optional[int] = None) -> None:
+        values: Dict[str, Any] = {"heartbeat_at": func.now()}
+        if num_done is not None:
+            values["num_done"] = num_done
+            values["num_total"] = num_total
+        with self.engine.begin() as conn:
+            conn.execute(update(self.table).where(self.table.c.id == job_id).values(**values))
+
+    def finish(self, job_id: str, message: Optional[str] = None, error: Optional[str] = None) -> None:
+        with self.engine.begin() as conn:
+            conn.execute(
+                update(self.table)
+                .where(self.table.c.id == job_id)
+                .values(
+                    status=FAILED if error is not None else COMPLETED,
+                    message=message,
+                    error=error,
+                    heartbeat_at=func.now(),
+                    finished_at=func.now(),
+                )
+            )
+
+    def _select(self):
+        return select(self.table, func.now().label("now"))
+
+    @staticmethod
+    def _to_dict(row) -> Dict[str, Any]:
+        """Returns the job with its throughput in items per second and ETA in seconds, when known"""
+        job = dict(row._mapping)
+        now = job.pop("now")
+        throughput = None
+        eta_seconds = None
+        if job["started_at"] is not None:
+            elapsed = ((job["finished_at"] or now) - job["started_at"]).total_seconds()
+            if elapsed > 0 and job["num_done"] > 0:
+                throughput = job["num_done"] / elapsed
+                if job["status"] == RUNNING and job["num_total"] is not None:
+                    eta_seconds = max(job["num_total"] - job["num_done"], 0) / throughput
+        job["throughput"] = throughput
+        job["eta_seconds"] = eta_seconds
+        return job
+
+
+@lru_cache
+def get_job_queue() -> JobQueue:
+    return JobQueue(stale_after=ai_settings.job_stale_after)
+
+
+def schedule_index_refresh(vector_db: PgVector2) -> Optional[Dict[str, Any]]:
+    """Queues a refresh of the ANN index of `vector_db` once it crosses a threshold of its index policy.
+
+    The check is cheap, so it runs after every load. The job is only written to the queue, no worker
+    is started in the calling process: the job workers of the Api, or `python -m api.jobs`, run it.
+    Loads of the same table while a refresh is queued share its job.
+
+    Returns:
+        The job, None if the index does not need a refresh.
+    """
+    if not index_refresh_needed(vector_db):
+        return None
+    return get_job_queue().submit(f"index:{vector_db.schema}.{vector_db.collection}")
@@ -1,9 +1,10 @@
-from phi.embedder.openai import OpenAIEmbedder
 from phi.knowledge.combined import CombinedKnowledgeBase
 from phi.knowledge.pdf import PDFUrlKnowledgeBase, PDFKnowledgeBase
 from phi.knowledge.website import WebsiteKnowledgeBase
 from phi.vectordb.pgvector import PgVector2
 
+from ai.embeddings import CachedOpenAIEmbedder
+from ai.index import get_vector_index
 from ai.settings import ai_settings
 from db.session import db_url
 
@@ -16,7 +17,8 @@ pdf_knowledge_base = CombinedKnowledgeBase(
         db_url=db_url,
         # Store the embeddings in ai.pdf_documents
         collection="pdf_documents",
-        embedder=OpenAIEmbedder(model=ai_settings.embedding_model),
+        embedder=CachedOpenAIEmbedder(model=ai_settings.embedding_model),
+        index=get_vector_index("pdf_documents"),
     ),
     # 2 references are added to the prompt
     num_documents=2,
@@ -31,7 +33,8 @@ website_knowledge_base = WebsiteKnowledgeBase(
         db_url=db_url,
         # Store the embeddings in ai.website_documents
         collection="website_documents",
-        embedder=OpenAIEmbedder(model=ai_settings.embedding_model),
+        embedder=CachedOpenAIEmbedder(model=ai_settings.embedding_model),
+        index=get_vector_index("website_documents"),
     ),
     # 3 references are added to the prompt
     num_documents=3,
@@ -0,0 +1,166 @@
+import multiprocessing
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import IO, Any, Dict, List, Optional, Tuple
+
+from phi.document import Document
+from phi.document.reader.pdf import PDFReader
+from phi.vectordb.pgvector import PgVector2
+
+from ai.catalog import update_catalog
+from ai.jobs import schedule_index_refresh
+from ai.pdf_store import Pages, count_pages, extract_page_range, get_page_documents, pdf_store
+from ai.pipeline import batched, delete_stale_documents, embed_documents, upsert_documents
+from ai.settings import ai_settings
+from ai.tenant import get_namespace
+from utils.log import logger
+
+######################################################
+## Background loading of uploaded PDFs
+######################################################
+
+# Number of finished ingestions remembered, so uploading the same PDF again does not load it again
+MAX_FINISHED_INGESTIONS = 256
+
+
+@dataclass
+class PdfIngestion:
+    """Progress of loading an uploaded PDF into a vector db"""
+
+    name: str
+    digest: str
+    num_pages: int = 0
+    pages_done: int = 0
+    num_documents: int = 0
+    # One of "queued", "running", "done" or "failed"
+    status: str = "queued"
+    error: Optional[str] = None
+    future: Optional[Future] = field(default=None, repr=False)
+
+    @property
+    def running(self) -> bool:
+        return self.status in ("queued", "running")
+
+    @property
+    def progress(self) -> float:
+        return self.pages_done / self.num_pages if self.num_pages > 0 else 0.0
+
+
+# Runs the ingestions, so uploads do not block the Streamlit script
+executor = ThreadPoolExecutor(max_workers=ai_settings.pdf_ingest_workers, thread_name_prefix="pdf-ingest")
+
+# Ingestions by (namespace, sha256), shared by all the sessions of the app
+_ingestions: "OrderedDict[Tuple[str, str], PdfIngestion]" = OrderedDict()
+_lock = threading.Lock()
+
+
+@lru_cache
+def get_parse_pool() -> ProcessPoolExecutor:
+    # Workers are forked from a server process that preloads this module, so they do not inherit
+    # the threads and connections of the app
+    mp_context = multiprocessing.get_context("forkserver")
+    mp_context.set_forkserver_preload([__name__])
+    return ProcessPoolExecutor(max_workers=ai_settings.pdf_parse_workers, mp_context=mp_context)
+
+
+def submit_pdf(pdf: IO[Any], vector_db: PgVector2, reader: Optional[PDFReader] = None) -> PdfIngestion:
+    """Starts loading an uploaded PDF into `vector_db` in the background.
+
+    The PDF is added to the PDF store right away, then its pages are extracted in the parse process
+    pool, `pdf_pages_per_task` pages per task. The chunks of each batch of pages are embedded and
+    written as soon as the pages are extracted, so the document is searchable while it loads.
+    A PDF that is loading or was loaded into the same vector db is not loaded again.
+
+    Args:
+        pdf (IO): The uploaded file, its name is used as the document name.
+        vector_db (PgVector2): Vector db to load the PDF into.
+        reader (PDFReader): (optional) Reader whose chunking settings are used.
+
+    Returns:
+        PdfIngestion: The progress of the ingestion, updated by the background worker.
+    """
+    doc_name = pdf.name.split(".")[0]
+    digest = pdf_store.put(pdf.read())
+    key = (get_namespace(vector_db), digest)
+    with _lock:
+        ingestion = _ingestions.get(key)
+        if ingestion is not None and ingestion.name == doc_name and ingestion.status != "failed":
+            return ingestion
+        ingestion = PdfIngestion(name=doc_name, digest=digest)
+        _ingestions[key] = ingestion
+        _ingestions.move_to_end(key)
+        finished = [key for key, ingestion in _ingestions.items() if not ingestion.running]
+        for finished_key in finished[: max(len(finished) - MAX_FINISHED_INGESTIONS, 0)]:
+            del _ingestions[finished_key]
+    logger.info(f"Queued: {doc_name} ({digest})")
+    ingestion.future = executor.submit(_ingest, ingestion, vector_db, reader or PDFReader())
+    return ingestion
+
+
+def _ingest(ingestion: PdfIngestion, vector_db: PgVector2, reader: PDFReader) -> None:
+    ingestion.status = "running"
+    try:
+        documents = _load_pages(ingestion, vector_db, reader)
+        if len(documents) == 0:
+            raise ValueError("No text found in the PDF")
+        # Rows of an earlier upload of a document with the same name
+        delete_stale_documents(vector_db, ingestion.name, [document.id for document in documents])
+        update_catalog(vector_db, documents)
+        # Queued for a job worker, only once the collection crosses a threshold of its index policy
+        schedule_index_refresh(vector_db)
+        ingestion.status = "done"
+        logger.info(f"Loaded {len(documents)} documents for {ingestion.name}")
+    except Exception as e:
+        ingestion.error = str(e)
+        ingestion.status = "failed"
+        logger.error(f"Error loading {ingestion.name}: {e}")
+
+
+def _load_pages(ingestion: PdfIngestion, vector_db: PgVector2, reader: PDFReader) -> List[Document]:
+    """Extracts, embeds and writes the pages of the PDF, returns the documents written"""
+    documents: List[Document] = []
+
+    def write_pages(pages: Pages) -> None:
+        page_documents = get_page_documents(ingestion.name, pages, reader)
+        for batch in batched(page_documents, ai_settings.pdf_batch_size):
+            embed_documents(batch, embedder=vector_db.embedder, batch_size=ai_settings.pdf_batch_size)
+            upsert_documents(vector_db, batch)
+        documents.extend(page_documents)
+        ingestion.num_documents = len(documents)
+
+    # Extracted before, by an earlier upload of the same PDF
+    stored_pages = pdf_store.get_pages(ingestion.digest)
+    if stored_pages is not None:
+        ingestion.num_pages = max((page_number for page_number, _ in stored_pages), default=0)
+        for batch_pages in batched(stored_pages, ai_settings.pdf_pages_per_task):
+            write_pages(batch_pages)
+            ingestion.pages_done = batch_pages[-1][0]
+        ingestion.pages_done = ingestion.num_pages
+        return documents
+
+    path = str(pdf_store.blob_path(ingestion.digest))
+    ingestion.num_pages = count_pages(path)
+    pages_per_task = ai_settings.pdf_pages_per_task
+    try:
+        extracting: Dict[Future, int] = {
+            get_parse_pool().submit(
+                extract_page_range, path, start, min(start + pages_per_task, ingestion.num_pages)
+            ): min(pages_per_task, ingestion.num_pages - start)
+            for start in range(0, ingestion.num_pages, pages_per_task)
+        }
+        pages: Pages = []
+        for future in as_completed(extracting):
+            range_pages = future.result()
+            write_pages(range_pages)
+            pages.extend(range_pages)
+            ingestion.pages_done += extracting[future]
+    except BrokenProcessPool:
+        # A crashed worker breaks the pool, the next uploads get a new one
+        get_parse_pool.cache_clear()
+        raise
+    pdf_store.set_pages(ingestion.digest, sorted(pages))
+    return documents
@@ -0,0 +1,175 @@
+import json
+import os
+import tempfile
+from hashlib import sha256
+from pathlib import Path
+from typing import IO, Any, List, Optional, Tuple
+
+from phi.document import Document
+from phi.document.reader.pdf import PDFReader
+from pypdf import PdfReader
+
+from ai.chunking import count_tokens
+from utils.log import logger
+from workspace.settings import ws_settings
+
+######################################################
+## Content-addressed PDF store
+######################################################
+
+# Number and text of the pages of a PDF that have text
+Pages = List[Tuple[int, str]]
+
+
+def extract_pages(pdf: Any, start: int = 0, end: Optional[int] = None) -> Pages:
+    """Returns the number and text of each page of `pdf` (a path or file) that has text.
+
+    Only the pages from index `start` up to `end` are extracted, all pages by default.
+    """
+    pdf_reader = PdfReader(pdf)
+    pages = []
+    for page_index in range(start, len(pdf_reader.pages) if end is None else end):
+        page_content = pdf_reader.pages[page_index].extract_text()
+        if page_content:
+            pages.append((page_index + 1, page_content))
+    return pages
+
+
+def count_pages(pdf: Any) -> int:
+    """Returns the number of pages of `pdf` (a path or file)"""
+    return len(PdfReader(pdf).pages)
+
+
+class PdfStore:
+    """
+    Content-addressed store of PDFs and the text extracted from them, shared by all users.
+
+    Each PDF is stored once as `blobs/{sha256[:2]}/{sha256}.pdf`, with the text of its pages in
+    `{sha256}.pages.json` next to it. References map other keys, like arXiv ids with their version,
+    to the SHA-256 of a stored PDF, so a known PDF is found without downloading it again.
+    Files are written to a temporary file and renamed into place, so concurrent writers are safe.
+    """
+
+    def __init__(self, root: Path):
+        self.root: Path = root
+
+    def blob_path(self, digest: str) -> Path:
+        return self.root.joinpath("blobs", digest[:2], f"{digest}.pdf")
+
+    def pages_path(self, digest: str) -> Path:
+        return self.root.joinpath("blobs", digest[:2], f"{digest}.pages.json")
+
+    def ref_path(self, key: str) -> Path:
+        return self.root.joinpath("refs", *key.split("/"))
+
+    def temp_dir(self) -> Path:
+        path = self.root.joinpath("tmp")
+        path.mkdir(parents=True, exist_ok=True)
+        return path
+
+    def _write(self, path: Path, data: bytes) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=self.temp_dir())
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(temp_path, path)
+
+    def put(self, data: bytes) -> str:
+        """Stores the PDF `data` and returns its SHA-256"""
+        digest = sha256(data).hexdigest()
+        if not self.blob_path(digest).exists():
+            self._write(self.blob_path(digest), data)
+        return digest
+
+    def put_file(self, path: Path) -> str:
+        """Moves the PDF at `path`, which must be in `temp_dir()`, into the store and returns its SHA-256"""
+        hasher = sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                hasher.update(block)
+        digest = hasher.hexdigest()
+        blob_path = self.blob_path(digest)
+        if blob_path.exists():
+            path.unlink()
+        else:
+            blob_path.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(path, blob_path)
+        return digest
+
+    def get_ref(self, key: str) -> Optional[str]:
+        """Returns the SHA-256 of the PDF stored for `key`, None if there is none"""
+        ref_path = self.ref_path(key)
+        if not ref_path.exists():
+            return None
+        digest = ref_path.read_text().strip()
+        return digest if self.blob_path(digest).exists() else None
+
+    def set_ref(self, key: str, digest: str) -> None:
+        self._write(self.ref_path(key), digest.encode())
+
+    def get_pages(self, digest: str) -> Optional[Pages]:
+        """Returns the text extracted from the PDF `digest`, None if it was not extracted yet"""
+        pages_path = self.pages_path(digest)
+        if not pages_path.exists():
+            return None
+        return [(page_number, content) for page_number, content in json.loads(pages_path.read_text())]
+
+    def set_pages(self, digest: str, pages: Pages) -> None:
+        self._write(self.pages_path(digest), json.dumps(pages).encode())
+
+    def extract(self, digest: str) -> Pages:
+        """Returns the text of the PDF `digest`, extracting it only the first time"""
+        pages = self.get_pages(digest)
+        if pages is None:
+            pages = extract_pages(str(self.blob_path(digest)))
+            self.set_pages(digest, pages)
+        return pages
+
+
+pdf_store = PdfStore(root=ws_settings.ws_root.joinpath(ws_settings.storage_dir, "pdfs"))
+
+
+def extract_stored_pdf(root: str, digest: str) -> Pages:
+    """Same as `PdfStore.extract`, taking and returning plain values to run in a process pool"""
+    return PdfStore(root=Path(root)).extract(digest)
+
+
+def extract_page_range(path: str, start: int, end: int) -> Pages:
+    """Same as `extract_pages` for a range of pages, with plain arguments to run in a process pool"""
+    return extract_pages(path, start=start, end=end)
+
+
+def get_page_documents(doc_name: str, pages: Pages, reader: PDFReader) -> List[Document]:
+    """Returns the documents of the `pages` of a PDF, chunked if the reader chunks, like `PDFReader.read`"""
+    documents = [
+        Document(
+            name=doc_name,
+            id=f"{doc_name}_{page_number}",
+            meta_data={"page": page_number},
+            content=page_content,
+        )
+        for page_number, page_content in pages
+    ]
+    if reader.chunk:
+        documents = [chunk for document in documents for chunk in reader.chunk_document(document)]
+    # Stored with the documents, so their context is packed without tokenizing them again
+    for document in documents:
+        document.meta_data["num_tokens"] = count_tokens(document.content)
+    return documents
+
+
+def read_pdf(pdf: IO[Any], reader: Optional[PDFReader] = None) -> List[Document]:
+    """Reads an uploaded PDF like `PDFReader.read`, extracting the text of each distinct PDF once.
+
+    Args:
+        pdf (IO): The uploaded file, its name is used as the document name.
+        reader (PDFReader): (optional) Reader whose chunking settings are used.
+
+    Returns:
+        List[Document]: The documents of the pages, chunked if the reader chunks.
+    """
+    reader = reader or PDFReader()
+    doc_name = pdf.name.split(".")[0]
+    digest = pdf_store.put(pdf.read())
+    logger.info(f"Reading: {doc_name} ({digest})")
+    return get_page_documents(doc_name, pdf_store.extract(digest), reader)
@@ -0,0 +1,193 @@
+import queue
+import threading
+from hashlib import md5
+from typing import Any, Callable, Iterable, Iterator, List, Optional
+
+from phi.document import Document
+from phi.embedder import Embedder
+from phi.embedder.openai import OpenAIEmbedder
+from phi.vectordb.pgvector import PgVector2
+from sqlalchemy import delete, func
+from sqlalchemy.dialects import postgresql
+
+from ai.embeddings import CachedOpenAIEmbedder, get_openai_embeddings
+
+######################################################
+## Streaming ingestion helpers
+######################################################
+
+# Marks the end of the items flowing through a pipeline queue
+_DONE = object()
+
+
+class _StageError:
+    def __init__(self, error: BaseException):
+        self.error = error
+
+
+def _put(q: queue.Queue, item: Any, stop: threading.Event) -> bool:
+    """Puts `item` on `q`, giving up if the pipeline is stopped while the queue is full"""
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _get(q: queue.Queue, stop: threading.Event) -> Any:
+    while not stop.is_set():
+        try:
+            return q.get(timeout=0.1)
+        except queue.Empty:
+            continue
+    return _DONE
+
+
+def run_pipeline(source: Iterable[Any], *stages: Callable[[Any], Any], queue_size: int = 2) -> Iterator[Any]:
+    """Streams the items of `source` through `stages` and yields the output of the last stage.
+
+    The source and every stage run in their own thread, connected by queues holding at most
+    `queue_size` items, so stages overlap while memory stays bounded. An error in any stage
+    stops the pipeline and is raised to the caller.
+    """
+    stop = threading.Event()
+    queues: List[queue.Queue] = [queue.Queue(maxsize=queue_size) for _ in range(len(stages) + 1)]
+
+    def produce():
+        try:
+            for item in source:
+                if not _put(queues[0], item, stop):
+                    return
+            _put(queues[0], _DONE, stop)
+        except BaseException as e:
+            _put(queues[0], _StageError(e), stop)
+
+    def work(stage: Callable[[Any], Any], in_q: queue.Queue, out_q: queue.Queue):
+        while True:
+            item = _get(in_q, stop)
+            if item is _DONE or isinstance(item, _StageError):
+                _put(out_q, item, stop)
+                return
+            try:
+                result = stage(item)
+            except BaseException as e:
+                _put(out_q, _StageError(e), stop)
+                return
+            if not _put(out_q, result, stop):
+                return
+
+    threads = [threading.Thread(target=produce, daemon=True)]
+    for i, stage in enumerate(stages):
+        threads.append(threading.Thread(target=work, args=(stage, queues[i], queues[i + 1]), daemon=True))
+    for thread in threads:
+        thread.start()
+
+    try:
+        while True:
+            item = queues[-1].get()
+            if item is _DONE:
+                return
+            if isinstance(item, _StageError):
+                raise item.error
+            yield item
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
+
+
+def batched(items: Iterable[Any], batch_size: int) -> Iterator[List[Any]]:
+    """Yields lists of up to `batch_size` items"""
+    batch: List[Any] = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if len(batch) > 0:
+        yield batch
+
+
+def embed_documents(documents: List[Document], embedder: Optional[Embedder], batch_size: int = 100) -> None:
+    """Embeds `documents` in place, using one API request per batch for OpenAI embedders
+
+    Cached OpenAI embedders only request the embeddings of texts not in the embedding cache.
+    """
+    if embedder is None:
+        return
+    if not isinstance(embedder, OpenAIEmbedder):
+        for document in documents:
+            document.embed(embedder=embedder)
+        return
+
+    texts = [document.content for document in documents]
+    if isinstance(embedder, CachedOpenAIEmbedder):
+        embeddings = embedder.get_embeddings(texts, batch_size=batch_size)
+    else:
+        embeddings = get_openai_embeddings(embedder, texts, batch_size=batch_size)
+    for document, embedding in zip(documents, embeddings):
+        document.embedding = embedding
+
+
+def get_content_hash(content: str) -> str:
+    """Returns the content hash the same way PgVector2 computes it on upsert"""
+    return md5(content.replace("\x00", "\ufffd").encode()).hexdigest()
+
+
+def upsert_documents(vector_db: PgVector2, documents: List[Document]) -> None:
+    """Upserts already embedded `documents` into `vector_db` in one statement.
+
+    Unlike `PgVector2.upsert`, this does not embed the documents again.
+    """
+    if len(documents) == 0:
+        return
+
+    # Rows of a shared multi-tenant table (TenantPgVector) are keyed by tenant and id
+    tenant_id = getattr(vector_db, "tenant_id", None)
+    index_elements = ["id"] if tenant_id is None else ["tenant_id", "id"]
+
+    # Postgres rejects an upsert that touches the same row twice, so the last document with an id wins
+    rows = {}
+    for document in documents:
+        cleaned_content = document.content.replace("\x00", "\ufffd")
+        content_hash = get_content_hash(cleaned_content)
+        _id = document.id or content_hash
+        rows[_id] = dict(
+            id=_id,
+            name=document.name,
+            meta_data=document.meta_data,
+            content=cleaned_content,
+            embedding=document.embedding,
+            usage=document.usage,
+            content_hash=content_hash,
+        )
+        if tenant_id is not None:
+            rows[_id]["tenant_id"] = tenant_id
+    stmt = postgresql.insert(vector_db.table).values(list(rows.values()))
+    stmt = stmt.on_conflict_do_update(
+        index_elements=index_elements,
+        set_=dict(
+            name=stmt.excluded.name,
+            meta_data=stmt.excluded.meta_data,
+            content=stmt.excluded.content,
+            embedding=stmt.excluded.embedding,
+            usage=stmt.excluded.usage,
+            content_hash=stmt.excluded.content_hash,
+            updated_at=func.now(),
+        ),
+    )
+    with vector_db.Session() as session, session.begin():
+        session.execute(stmt)
+
+
+def delete_stale_documents(vector_db: PgVector2, name: str, ids: List[str]) -> None:
+    """Deletes the rows of the document `name` other than `ids`, left over from an earlier load of it"""
+    table = vector_db.table
+    stmt = delete(table).where(table.c.name == name, table.c.id.not_in(ids))
+    tenant_id = getattr(vector_db, "tenant_id", None)
+    if tenant_id is not None:
+        stmt = stmt.where(table.c.tenant_id == tenant_id)
+    with vector_db.Session() as session, session.begin():
+        session.execute(stmt)
@@ -0,0 +1,124 @@
+from typing import List, Optional
+
+from phi.document import Document
+from phi.vectordb.distance import Distance
+from phi.vectordb.pgvector import PgVector2
+from phi.vectordb.pgvector.index import HNSW, Ivfflat
+from sqlalchemy import Integer, func, select, text
+from sqlalchemy.sql.expression import ColumnElement
+
+from ai.context import get_num_tokens, truncate_tokens
+from ai.tenant import tenant_filters
+from utils.log import logger
+
+######################################################
+## Vector db query helpers
+######################################################
+
+
+def search_documents(
+    vector_db: PgVector2,
+    query: str,
+    limit: int = 5,
+    where: Optional[List[ColumnElement]] = None,
+) -> List[Document]:
+    """Searches `vector_db` for `query` in one statement, filtered by the `where` clauses.
+
+    Unlike `PgVector2.search`, the filters can be any SQL expression (like a subquery) and
+    the embeddings of the results are not fetched.
+    """
+    query_embedding = vector_db.embedder.get_embedding(query)
+    if query_embedding is None:
+        logger.error(f"Error getting embedding for Query: {query}")
+        return []
+
+    table = vector_db.table
+    stmt = select(table.c.name, table.c.meta_data, table.c.content, table.c.usage)
+    for clause in tenant_filters(vector_db) + (where or []):
+        stmt = stmt.where(clause)
+    if vector_db.distance == Distance.l2:
+        stmt = stmt.order_by(table.c.embedding.l2_distance(query_embedding))
+    elif vector_db.distance == Distance.max_inner_product:
+        stmt = stmt.order_by(table.c.embedding.max_inner_product(query_embedding))
+    else:
+        stmt = stmt.order_by(table.c.embedding.cosine_distance(query_embedding))
+    stmt = stmt.limit(limit)
+
+    try:
+        with vector_db.Session() as session, session.begin():
+            if isinstance(vector_db.index, Ivfflat):
+                session.execute(text(f"SET LOCAL ivfflat.probes = {vector_db.index.probes}"))
+            elif isinstance(vector_db.index, HNSW):
+                session.execute(text(f"SET LOCAL hnsw.ef_search = {vector_db.index.ef_search}"))
+            rows = session.execute(stmt).fetchall()
+    except Exception as e:
+        logger.error(f"Error searching for documents: {e}")
+        return []
+
+    return [
+        Document(
+            name=row.name,
+            meta_data=row.meta_data,
+            content=row.content,
+            embedder=vector_db.embedder,
+            usage=row.usage,
+        )
+        for row in rows
+    ]
+
+
+def read_contents(
+    vector_db: PgVector2,
+    where: List[ColumnElement],
+    max_tokens: int,
+    batch_size: int = 20,
+) -> Optional[str]:
+    """Returns the start of the rows matching `where` that fits in `max_tokens`, in page and chunk order.
+
+    Only the `content` column and stored token count are read, without the overlap of chunks with
+    the previous chunk, through a server-side cursor that stops fetching rows once the budget is used.
+    Only the last row read is tokenized, to cut it at the budget.
+
+    Args:
+        vector_db (PgVector2): Vector db to read from.
+        where (list): Filters on the rows to read, like the document name.
+        max_tokens (int): Maximum number of tokens to return.
+        batch_size (int): Number of rows fetched per round trip.
+
+    Returns:
+        str: The contents, None if no rows match.
+    """
+    table = vector_db.table
+    # Chunks that repeat the end of the previous chunk (like arXiv chunks) store the length of the overlap
+    overlap = func.coalesce(table.c.meta_data["overlap"].astext.cast(Integer), 0)
+    stmt = select(
+        func.substr(table.c.content, overlap + 1).label("content"),
+        table.c.meta_data["num_tokens"].astext.cast(Integer).label("num_tokens"),
+    )
+    for clause in tenant_filters(vector_db) + where:
+        stmt = stmt.where(clause)
+    # Rows without a page (like arXiv summaries) come first
+    stmt = stmt.order_by(
+        table.c.meta_data["page"].astext.cast(Integer).nulls_first(),
+        table.c.meta_data["chunk"].astext.cast(Integer).nulls_first(),
+        table.c.created_at,
+        table.c.id,
+    )
+
+    parts: List[str] = []
+    budget = max_tokens
+    with vector_db.Session() as session, session.begin():
+        result = session.execute(stmt.execution_options(stream_results=True, yield_per=batch_size))
+        for row in result:
+            # The stored count includes the overlap, so it overestimates the tokens read
+            num_tokens = row.num_tokens if row.num_tokens is not None else get_num_tokens(row.content)
+            if num_tokens > budget:
+                parts.append(truncate_tokens(row.content, budget))
+                break
+            parts.append(row.content)
+            budget -= num_tokens
+        result.close()
+
+    if len(parts) == 0:
+        return None
+    return "".join(parts)
@@ -1,3 +1,5 @@
+from typing import Optional
+
 from pydantic_settings import BaseSettings
 
 
@@ -15,6 +17,32 @@ class AISettings(BaseSettings):
     embedding_model: str = "text-embedding-3-small"
     default_max_tokens: int = 1024
     default_temperature: float = 0
+    # Store the documents of all users in one shared table per collection instead of a table per user.
+    # Migrate existing per-user tables with `python -m ai.tenant <collection>`.
+    shared_vector_tables: bool = False
+    # Number of hash partitions of the shared tables, 0 to not partition them.
+    # Only used when a shared table is created.
+    vector_table_partitions: int = 0
+    # Number of rows from which a vector collection gets an ANN index, smaller collections are scanned.
+    # Check and refresh the indexes with `python -m ai.index [--refresh]`.
+    vector_index_min_rows: int = 10000
+    # Number of embeddings kept in memory by the embedding cache, 0 to only use the cache table.
+    embedding_cache_size: int = 10000
+    # Database of the embedding cache table (like sqlite:///embeddings.db), the app database by default.
+    embedding_cache_db_url: Optional[str] = None
+    # Number of token counts of documents without a stored count kept in memory by the context packer.
+    token_count_cache_size: int = 10000
+    # Number of uploaded PDFs loaded into the knowledge bases at the same time, in background threads.
+    pdf_ingest_workers: int = 2
+    # Number of processes extracting the text of uploaded PDFs, and number of pages per extraction task.
+    pdf_parse_workers: int = 2
+    pdf_pages_per_task: int = 8
+    # Number of chunks of an uploaded PDF embedded per API request and written per statement.
+    pdf_batch_size: int = 100
+    # Number of assistant runs kept in memory by the assistant storage, with the version of their row.
+    assistant_run_cache_size: int = 1000
+    # Seconds without a heartbeat after which a running background job is considered dead and claimed again.
+    job_stale_after: int = 300
 
 
 # Create AISettings object
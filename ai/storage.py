@@ -1,18 +1,87 @@
+import threading
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from phi.assistant.run import AssistantRun
 from phi.storage.assistant.postgres import PgAssistantStorage
+from sqlalchemy import literal_column, select
 
+from ai.settings import ai_settings
 from db.session import db_url
 
-pdf_assistant_storage = PgAssistantStorage(
+
+class VersionedAssistantStorage(PgAssistantStorage):
+    """PgAssistantStorage that keeps the runs it read or wrote in memory with the version of their row.
+
+    phi's Assistant reads its run from storage at the start of every turn and after every write.
+    A read of a kept run first fetches the version of its row, the Postgres `xmin`, which changes on
+    every update of the row by any process. The row, with the whole chat memory, is only fetched
+    again when the version changed.
+    """
+
+    def __init__(self, *args, cache_size: int = ai_settings.assistant_run_cache_size, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.cache_size = cache_size
+        self._runs: "OrderedDict[str, Tuple[str, AssistantRun]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def read(self, run_id: str) -> Optional[AssistantRun]:
+        with self._lock:
+            kept = self._runs.get(run_id)
+        if kept is not None and self._read_version(run_id) == kept[0]:
+            with self._lock:
+                if run_id in self._runs:
+                    self._runs.move_to_end(run_id)
+            # Assistants update the run they load, so each read gets its own copy
+            return kept[1].model_copy(deep=True)
+
+        with self.Session() as sess, sess.begin():
+            try:
+                row = sess.execute(
+                    select(self.table, literal_column("xmin::text").label("row_version")).where(
+                        self.table.c.run_id == run_id
+                    )
+                ).first()
+            except Exception:
+                # Create table if it does not exist
+                self.create()
+                row = None
+        if row is None:
+            with self._lock:
+                self._runs.pop(run_id, None)
+            return None
+
+        run = AssistantRun.model_validate(row)
+        with self._lock:
+            self._runs[run_id] = (row.row_version, run)
+            self._runs.move_to_end(run_id)
+            while len(self._runs) > self.cache_size:
+                self._runs.popitem(last=False)
+        return run.model_copy(deep=True)
+
+    def _read_version(self, run_id: str) -> Optional[str]:
+        try:
+            with self.Session() as sess, sess.begin():
+                return sess.execute(
+                    select(literal_column("xmin::text"))
+                    .select_from(self.table)
+                    .where(self.table.c.run_id == run_id)
+                ).scalar()
+        except Exception:
+            return None
+
+
+pdf_assistant_storage = VersionedAssistantStorage(
     db_url=db_url,
     table_name="pdf_assistant",
 )
 
-image_assistant_storage = PgAssistantStorage(
+image_assistant_storage = VersionedAssistantStorage(
     db_url=db_url,
     table_name="image_assistant",
 )
 
-website_assistant_storage = PgAssistantStorage(
+website_assistant_storage = VersionedAssistantStorage(
     db_url=db_url,
     table_name="website_assistant",
 )
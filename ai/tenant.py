@@ -0,0 +1,244 @@
+import argparse
+from typing import Any, Dict, List, Optional
+
+from pgvector.sqlalchemy import Vector
+from phi.document import Document
+from phi.embedder import Embedder
+from phi.vectordb.pgvector import PgVector2
+from sqlalchemy import Column, DateTime, Index, String, Table, delete, func, inspect, literal, select, text
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.sql.expression import ColumnElement
+
+from ai.embeddings import CachedOpenAIEmbedder
+from ai.index import get_vector_index, refresh_index
+from ai.pipeline import batched, embed_documents, get_content_hash, upsert_documents
+from ai.settings import ai_settings
+from db.session import db_engine, db_url
+from utils.log import logger
+
+######################################################
+## Multi-tenant vector storage
+######################################################
+
+# Columns shared by PgVector2 tables and tenant tables
+VECTOR_COLUMNS = [
+    "id",
+    "name",
+    "meta_data",
+    "content",
+    "embedding",
+    "usage",
+    "created_at",
+    "updated_at",
+    "content_hash",
+]
+
+
+class TenantPgVector(PgVector2):
+    """
+    PgVector2 collection stored in a table shared by all tenants (users), scoped to a single tenant.
+
+    Rows are keyed by (tenant_id, id) and every read filters on `tenant_id`, so the tenant filter
+    is part of the search query itself. With `num_partitions` the table is hash partitioned on
+    `tenant_id`, so a tenant's queries only touch its own partition.
+    """
+
+    def __init__(self, collection: str, tenant_id: str, num_partitions: int = 0, **kwargs):
+        self.tenant_id: str = tenant_id
+        self.num_partitions: int = num_partitions
+        super().__init__(collection=collection, **kwargs)
+        # Key of this tenant's documents in the document catalog and latest document tables
+        self.namespace: str = f"{collection}/{tenant_id}"
+
+    def get_table(self) -> Table:
+        partitioning = {"postgresql_partition_by": "HASH (tenant_id)"} if self.num_partitions > 0 else {}
+        return Table(
+            self.collection,
+            self.metadata,
+            Column("tenant_id", String, primary_key=True),
+            Column("id", String, primary_key=True),
+            Column("name", String),
+            Column("meta_data", postgresql.JSONB, server_default=text("'{}'::jsonb")),
+            Column("content", postgresql.TEXT),
+            Column("embedding", Vector(self.dimensions)),
+            Column("usage", postgresql.JSONB),
+            Column("created_at", DateTime(timezone=True), server_default=text("now()")),
+            Column("updated_at", DateTime(timezone=True), onupdate=text("now()")),
+            Column("content_hash", String),
+            Index(f"{self.collection}_tenant_name_idx", "tenant_id", "name"),
+            extend_existing=True,
+            **partitioning,
+        )
+
+    def create(self) -> None:
+        super().create()
+        if self.num_partitions > 0:
+            with self.Session() as sess, sess.begin():
+                for remainder in range(self.num_partitions):
+                    sess.execute(
+                        text(
+                            f'CREATE TABLE IF NOT EXISTS {self.schema}."{self.collection}_p{remainder}" '
+                            f'PARTITION OF {self.schema}."{self.collection}" '
+                            f"FOR VALUES WITH (MODULUS {self.num_partitions}, REMAINDER {remainder})"
+                        )
+                    )
+
+    def tenant_filter(self) -> ColumnElement:
+        return self.table.c.tenant_id == self.tenant_id
+
+    def _first(self, stmt) -> bool:
+        with self.Session() as sess, sess.begin():
+            return sess.execute(stmt.where(self.tenant_filter()).limit(1)).first() is not None
+
+    def doc_exists(self, document: Document) -> bool:
+        content_hash = get_content_hash(document.content)
+        return self._first(select(self.table.c.id).where(self.table.c.content_hash == content_hash))
+
+    def name_exists(self, name: str) -> bool:
+        return self._first(select(self.table.c.id).where(self.table.c.name == name))
+
+    def id_exists(self, id: str) -> bool:
+        return self._first(select(self.table.c.id).where(self.table.c.id == id))
+
+    def insert(self, documents: List[Document], batch_size: int = 100) -> None:
+        self.upsert(documents=documents, batch_size=batch_size)
+
+    def upsert(self, documents: List[Document], batch_size: int = 100) -> None:
+        """Embeds and upserts `documents` for this tenant, one statement per batch"""
+        for batch in batched(documents, batch_size):
+            embed_documents(batch, embedder=self.embedder, batch_size=batch_size)
+            upsert_documents(self, batch)
+            logger.info(f"Upserted {len(batch)} documents for tenant {self.tenant_id}")
+
+    def search(self, query: str, limit: int = 5, filters: Optional[Dict[str, Any]] = None) -> List[Document]:
+        # PgVector2.search turns filters on table columns into WHERE clauses of the search query
+        return super().search(
+            query=query, limit=limit, filters={**(filters or {}), "tenant_id": self.tenant_id}
+        )
+
+    def delete(self) -> None:
+        """Deletes this tenant's documents, the shared table is kept"""
+        self.clear()
+
+    def clear(self) -> bool:
+        if not self.table_exists():
+            return True
+        with self.Session() as sess, sess.begin():
+            sess.execute(delete(self.table).where(self.tenant_filter()))
+        return True
+
+    def get_count(self) -> int:
+        with self.Session() as sess, sess.begin():
+            result = sess.execute(
+                select(func.count()).select_from(self.table).where(self.tenant_filter())
+            ).scalar()
+        return int(result or 0)
+
+
+def get_namespace(vector_db: PgVector2) -> str:
+    """Returns the key of the documents of `vector_db`, which is its collection unless the table is shared"""
+    return getattr(vector_db, "namespace", vector_db.collection)
+
+
+def tenant_filters(vector_db: PgVector2) -> List[ColumnElement]:
+    """Returns the filters restricting a query on the table of `vector_db` to its tenant, if any"""
+    if isinstance(vector_db, TenantPgVector):
+        return [vector_db.tenant_filter()]
+    return []
+
+
+def get_user_vector_db(
+    collection: str, user_id: Optional[str] = None, embedder: Optional[Embedder] = None
+) -> PgVector2:
+    """Returns the vector db holding the documents of `user_id` in `collection`.
+
+    With `ai_settings.shared_vector_tables` every user is a tenant of the shared
+    `tenant_{collection}` table, otherwise each user gets their own `{collection}_{user_id}` table.
+    """
+    embedder = embedder or CachedOpenAIEmbedder(model=ai_settings.embedding_model)
+    if ai_settings.shared_vector_tables:
+        return TenantPgVector(
+            collection=f"tenant_{collection}",
+            tenant_id=user_id or "",
+            num_partitions=ai_settings.vector_table_partitions,
+            schema="ai",
+            db_engine=db_engine,
+            embedder=embedder,
+            index=get_vector_index(f"tenant_{collection}"),
+        )
+    user_collection = f"{collection}_{user_id}" if user_id else collection
+    return PgVector2(
+        schema="ai",
+        db_url=db_url,
+        collection=user_collection,
+        embedder=embedder,
+        index=get_vector_index(user_collection),
+    )
+
+
+def migrate_user_tables(vector_db: TenantPgVector, prefix: str, drop: bool = False) -> int:
+    """Copies every per-user table `{prefix}{user_id}` into the shared table of `vector_db`.
+
+    Embeddings are copied as they are, nothing is embedded again. Rows already in the shared
+    table are kept, so an interrupted migration can be run again.
+
+    Args:
+        vector_db (TenantPgVector): Any tenant of the shared table to migrate to.
+        prefix (str): Prefix of the per-user tables, like "pdf_documents_".
+        drop (bool): Drop each per-user table once it is copied.
+
+    Returns:
+        int: Number of tables migrated.
+    """
+    vector_db.create()
+    table_names = [
+        name
+        for name in inspect(vector_db.db_engine).get_table_names(schema=vector_db.schema)
+        if name.startswith(prefix) and not name.startswith(vector_db.collection)
+    ]
+
+    num_tables = 0
+    for table_name in table_names:
+        tenant_id = table_name[len(prefix) :]
+        user_table = PgVector2(
+            collection=table_name,
+            schema=vector_db.schema,
+            db_engine=vector_db.db_engine,
+            embedder=vector_db.embedder,
+        ).table
+        stmt = (
+            postgresql.insert(vector_db.table)
+            .from_select(
+                ["tenant_id", *VECTOR_COLUMNS],
+                select(literal(tenant_id), *[user_table.c[column] for column in VECTOR_COLUMNS]),
+            )
+            .on_conflict_do_nothing(index_elements=["tenant_id", "id"])
+        )
+        with vector_db.Session() as sess, sess.begin():
+            result = sess.execute(stmt)
+        logger.info(f"Copied {result.rowcount} rows from {table_name} for tenant {tenant_id}")
+        if drop:
+            user_table.drop(vector_db.db_engine)
+        num_tables += 1
+    return num_tables
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Migrate per-user vector tables into a shared tenant table")
+    parser.add_argument("collection", help="Per-user collection to migrate, like pdf_documents")
+    parser.add_argument("--partitions", type=int, default=ai_settings.vector_table_partitions)
+    parser.add_argument("--drop", action="store_true", help="Drop the per-user tables once copied")
+    args = parser.parse_args()
+
+    shared_vector_db = TenantPgVector(
+        collection=f"tenant_{args.collection}",
+        tenant_id="",
+        num_partitions=args.partitions,
+        schema="ai",
+        db_engine=db_engine,
+        embedder=CachedOpenAIEmbedder(model=ai_settings.embedding_model),
+        index=get_vector_index(f"tenant_{args.collection}"),
+    )
+    num_migrated = migrate_user_tables(shared_vector_db, prefix=f"{args.collection}_", drop=args.drop)
+    logger.info(f"Migrated {num_migrated} tables into {shared_vector_db.collection}")
+    logger.info(refresh_index(shared_vector_db))
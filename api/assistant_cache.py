@@ -0,0 +1,86 @@
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Dict, Optional, Tuple
+
+from phi.assistant import Assistant
+
+from api.settings import api_settings
+from utils.log import logger
+
+# (assistant_type, run_id, user_id)
+AssistantKey = Tuple[str, Optional[str], Optional[str]]
+
+
+@dataclass
+class AssistantLease:
+    key: AssistantKey
+    assistant: Assistant
+    generation: int
+    cached: bool
+
+
+class AssistantCache:
+    """Bounded LRU cache of hydrated Assistants with a TTL.
+
+    An Assistant is not safe to share between concurrent requests, so it is checked out
+    of the cache for the duration of a request and checked back in afterwards. Every check-in
+    bumps a per-key generation: if another request for the same run checked in while this
+    one was out, the run was written twice and both copies may be stale, so the entry is
+    dropped and the next request rebuilds it from storage.
+
+    The cache only saves building the Assistant. It is per process and only sees the writes of its
+    own process, so phi still reads the run from storage at the start of every turn, and endpoints
+    that return stored state, like the chat history, read it too. The storage of the assistants,
+    `ai.storage.VersionedAssistantStorage`, turns those reads into a check of the row version while
+    the run is unchanged.
+    """
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: "OrderedDict[AssistantKey, Tuple[float, Assistant]]" = OrderedDict()
+        self._generations: Dict[AssistantKey, int] = {}
+        self._lock = threading.Lock()
+
+    def checkout(self, key: AssistantKey, build: Callable[[], Assistant]) -> AssistantLease:
+        """Takes the Assistant for `key` out of the cache, building a new one on a miss"""
+        with self._lock:
+            generation = self._generations.get(key, 0)
+            entry = self._entries.pop(key, None) if key[1] is not None else None
+        if entry is not None and entry[0] > time.monotonic():
+            return AssistantLease(key=key, assistant=entry[1], generation=generation, cached=True)
+        return AssistantLease(key=key, assistant=build(), generation=generation, cached=False)
+
+    def checkin(self, lease: AssistantLease) -> None:
+        """Returns a leased Assistant to the cache after its request finished"""
+        assistant = lease.assistant
+        # A new run only gets its run_id while handling the request
+        key: AssistantKey = (lease.key[0], assistant.run_id, assistant.user_id)
+        if key[1] is None:
+            return
+        with self._lock:
+            generation = self._generations.get(key, 0)
+            self._generations[key] = generation + 1
+            if lease.key[1] is not None and generation != lease.generation:
+                logger.debug(f"Run {key[1]} was written concurrently, dropping cached assistant")
+                self._entries.pop(key, None)
+                return
+            self._entries[key] = (time.monotonic() + self.ttl, assistant)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                evicted_key, _ = self._entries.popitem(last=False)
+                self._generations.pop(evicted_key, None)
+
+    def discard(self, lease: AssistantLease) -> None:
+        """Drops a leased Assistant whose request failed, its state may be inconsistent"""
+        with self._lock:
+            self._generations[lease.key] = self._generations.get(lease.key, 0) + 1
+            self._entries.pop(lease.key, None)
+
+
+assistant_cache = AssistantCache(
+    max_size=api_settings.assistant_cache_size,
+    ttl=api_settings.assistant_cache_ttl,
+)
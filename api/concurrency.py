@@ -0,0 +1,108 @@
+import asyncio
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from contextlib import asynccontextmanager
+from functools import partial
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, Optional, TypeVar
+
+from fastapi import HTTPException
+
+from api.settings import api_settings
+from utils.log import logger
+
+T = TypeVar("T")
+
+# Runs blocking Assistant work so it does not exhaust the default threadpool
+executor = ThreadPoolExecutor(
+    max_workers=api_settings.executor_max_workers,
+    thread_name_prefix="assistant",
+)
+
+# Returned by next() when a blocking iterator is exhausted
+_END = object()
+
+
+async def run_in_executor(fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """Runs a blocking function on the assistant executor"""
+    return await asyncio.get_running_loop().run_in_executor(executor, partial(fn, *args, **kwargs))
+
+
+def close_iterator(iterator: Iterator[Any], pending: Optional[Future] = None) -> None:
+    """Closes a blocking iterator once the `next()` call in flight on it returned.
+
+    A generator cannot be closed while another thread runs it, so this runs on the executor and
+    first waits for `pending`.
+    """
+    if pending is not None:
+        wait([pending])
+    close = getattr(iterator, "close", None)
+    if close is not None:
+        try:
+            close()
+        except Exception as e:
+            logger.warning(f"Error closing iterator: {e}")
+
+
+async def iterate_in_executor(iterator: Iterator[T]) -> AsyncIterator[T]:
+    """Iterates a blocking iterator on the assistant executor.
+
+    The next item is only pulled once the consumer asks for it, so a slow client
+    applies backpressure instead of letting the producer run ahead.
+    """
+    pending: Optional[Future] = None
+    try:
+        while True:
+            pending = executor.submit(next, iterator, _END)
+            item = await asyncio.wrap_future(pending)
+            if item is _END:
+                break
+            yield item
+    finally:
+        # When the consumer disconnects, the cancelled await leaves next() running in its thread.
+        # The close is submitted as a whole, so it also runs if this await is cancelled as well.
+        await asyncio.wrap_future(executor.submit(close_iterator, iterator, pending))
+
+
+class UserConcurrencyLimiter:
+    """Limits the number of requests a single user can have in flight.
+
+    Only used from the event loop thread, so the counters need no locking.
+    Requests without a user_id are not limited.
+    """
+
+    def __init__(self, max_concurrent: int):
+        self.max_concurrent = max_concurrent
+        self._active: Dict[str, int] = {}
+
+    def acquire(self, user_id: Optional[str]) -> None:
+        """Takes a slot for `user_id`
+
+        Raises:
+            HTTPException: 429 if the user already has `max_concurrent` requests in flight.
+        """
+        if user_id is None:
+            return
+        if self._active.get(user_id, 0) >= self.max_concurrent:
+            raise HTTPException(status_code=429, detail="Too many concurrent requests for this user")
+        self._active[user_id] = self._active.get(user_id, 0) + 1
+
+    def release(self, user_id: Optional[str]) -> None:
+        if user_id is None or user_id not in self._active:
+            return
+        self._active[user_id] -= 1
+        if self._active[user_id] <= 0:
+            del self._active[user_id]
+
+    @asynccontextmanager
+    async def limit(self, user_id: Optional[str]):
+        self.acquire(user_id)
+        try:
+            yield
+        finally:
+            self.release(user_id)
+
+
+user_limiter = UserConcurrencyLimiter(max_concurrent=api_settings.max_concurrent_requests_per_user)
+
+
+def shutdown_executor() -> None:
+    executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,201 @@
+import argparse
+import multiprocessing
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from functools import partial
+from typing import Any, Callable, Dict, Optional, Set
+
+from phi.knowledge import AssistantKnowledge
+from phi.vectordb.pgvector import PgVector2
+
+from ai.catalog import update_catalog
+from ai.index import get_vector_index, refresh_index
+from ai.jobs import INDEX_JOB_PATTERN, QUEUED, get_job_queue
+from ai.knowledge_base import pdf_knowledge_base
+from ai.settings import ai_settings
+from api.settings import api_settings
+from db.session import db_engine
+from hn_ai.knowledge import load_hackernews_knowledge_base
+from utils.log import logger
+
+######################################################
+## Background knowledge base loading jobs
+######################################################
+
+# Called by loaders with the number of items done and the total, if known
+ProgressCallback = Callable[[int, Optional[int]], None]
+
+
+def load_knowledge_base(knowledge_base: AssistantKnowledge, progress: ProgressCallback) -> str:
+    """Same as `AssistantKnowledge.load(recreate=False)`, reporting the number of documents loaded"""
+    vector_db = knowledge_base.vector_db
+    if vector_db is None:
+        return "No vector db provided"
+
+    vector_db.create()
+    num_documents = 0
+    for document_list in knowledge_base.document_lists:
+        documents_to_load = [document for document in document_list if not vector_db.doc_exists(document)]
+        vector_db.insert(documents=documents_to_load)
+        if isinstance(vector_db, PgVector2):
+            update_catalog(vector_db, document_list)
+        num_documents += len(documents_to_load)
+        progress(num_documents, None)
+    if isinstance(vector_db, PgVector2):
+        refresh_index(vector_db)
+    return f"Added {num_documents} documents to knowledge base"
+
+
+# Knowledge bases that can be loaded in the background, by vector db collection
+KNOWLEDGE_BASE_LOADERS: Dict[str, Callable[[ProgressCallback], str]] = {
+    "hn_documents": lambda progress: load_hackernews_knowledge_base(progress=progress),
+    "pdf_documents": lambda progress: load_knowledge_base(pdf_knowledge_base, progress=progress),
+}
+
+
+def refresh_index_job(schema: str, collection: str, progress: ProgressCallback) -> str:
+    vector_db = PgVector2(
+        collection=collection, schema=schema, db_engine=db_engine, index=get_vector_index(collection)
+    )
+    return f"Refreshed index: {refresh_index(vector_db)}"
+
+
+def get_loader(knowledge_base: str) -> Optional[Callable[[ProgressCallback], str]]:
+    """Returns the function that runs the job for `knowledge_base`, None if unknown"""
+    index_job = INDEX_JOB_PATTERN.match(knowledge_base)
+    if index_job is not None:
+        return partial(refresh_index_job, index_job.group(1), index_job.group(2))
+    return KNOWLEDGE_BASE_LOADERS.get(knowledge_base)
+
+
+def run_jobs() -> int:
+    """Runs queued jobs until the queue is empty and returns the number of jobs run.
+
+    Executed in the worker processes.
+    """
+    job_queue = get_job_queue()
+    num_jobs = 0
+    while True:
+        job = job_queue.claim()
+        if job is None:
+            return num_jobs
+
+        job_id = job["id"]
+        logger.info(f"Running job {job_id}: load {job['knowledge_base']}")
+        # Keeps the heartbeat fresh while a loader runs a long step without reporting progress
+        stop = threading.Event()
+
+        def beat():
+            while not stop.wait(ai_settings.job_stale_after / 3):
+                try:
+                    job_queue.heartbeat(job_id)
+                except Exception as e:
+                    logger.warning(f"Heartbeat failed for job {job_id}: {e}")
+
+        heartbeat_thread = threading.Thread(target=beat, daemon=True)
+        heartbeat_thread.start()
+        try:
+            loader = get_loader(job["knowledge_base"])
+            if loader is None:
+                raise ValueError(f"Unknown knowledge base: {job['knowledge_base']}")
+            message = loader(lambda done, total: job_queue.heartbeat(job_id, num_done=done, num_total=total))
+            job_queue.finish(job_id, message=message)
+        except Exception as e:
+            logger.error(f"Job {job_id} failed: {e}")
+            job_queue.finish(job_id, error=str(e))
+        finally:
+            stop.set()
+            heartbeat_thread.join()
+        num_jobs += 1
+
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+# Worker runs submitted to the pool that have not finished yet
+_workers: Set[Future] = set()
+_stop_polling = threading.Event()
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # Spawn so the workers do not inherit the API's threads and connections
+            _pool = ProcessPoolExecutor(
+                max_workers=api_settings.job_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _pool
+
+
+def _worker_done(future: Future) -> None:
+    with _pool_lock:
+        _workers.discard(future)
+    if not future.cancelled() and future.exception() is not None:
+        logger.error(f"Job worker failed: {future.exception()}")
+
+
+def start_job_worker() -> None:
+    """Starts a worker process that drains the job queue"""
+    future = _get_pool().submit(run_jobs)
+    with _pool_lock:
+        _workers.add(future)
+    future.add_done_callback(_worker_done)
+
+
+def submit_job(knowledge_base: str) -> Dict[str, Any]:
+    """Queues a load of `knowledge_base` and returns its job.
+
+    A duplicate submission returns the job already queued or running instead of starting another.
+    """
+    if get_loader(knowledge_base) is None:
+        raise ValueError(f"Unknown knowledge base: {knowledge_base}")
+
+    job = get_job_queue().submit(knowledge_base)
+    if job["status"] == QUEUED:
+        start_job_worker()
+    return job
+
+
+def _poll_jobs() -> None:
+    """Drains jobs queued by other processes, like the index refreshes queued by the apps and bots"""
+    while not _stop_polling.wait(api_settings.job_poll_interval):
+        with _pool_lock:
+            idle = len(_workers) == 0
+        if idle:
+            start_job_worker()
+
+
+def start_job_workers() -> None:
+    """Resumes jobs left queued or running by a previous run of the Api and polls for new ones"""
+    for _ in range(api_settings.job_workers):
+        start_job_worker()
+    threading.Thread(target=_poll_jobs, name="job-poller", daemon=True).start()
+
+
+def shutdown_job_workers() -> None:
+    _stop_polling.set()
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Runs the jobs of the job queue, without the Api")
+    parser.add_argument(
+        "--poll-interval",
+        type=float,
+        default=api_settings.job_poll_interval,
+        help="Seconds between checks of the queue once it is empty",
+    )
+    parser.add_argument("--once", action="store_true", help="Exit once the queue is empty")
+    args = parser.parse_args()
+
+    while True:
+        num_jobs = run_jobs()
+        if num_jobs > 0:
+            logger.info(f"Ran {num_jobs} jobs")
+        if args.once:
+            break
+        time.sleep(args.poll_interval)
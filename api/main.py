@@ -1,6 +1,8 @@
 from fastapi import FastAPI
 from starlette.middleware.cors import CORSMiddleware
 
+from api.concurrency import shutdown_executor
+from api.jobs import shutdown_job_workers, start_job_workers
 from api.settings import api_settings
 from api.routes.v1_router import v1_router
 
@@ -24,6 +26,13 @@ def create_app() -> FastAPI:
     # Add v1 router
     app.include_router(v1_router)
 
+    # Stop the assistant executor on shutdown
+    app.add_event_handler("shutdown", shutdown_executor)
+
+    # Resume knowledge base loading jobs on startup and stop the job workers on shutdown
+    app.add_event_handler("startup", start_job_workers)
+    app.add_event_handler("shutdown", shutdown_job_workers)
+
     # Add Middlewares
     app.add_middleware(
         CORSMiddleware,
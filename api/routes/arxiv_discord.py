@@ -1,6 +1,5 @@
 import asyncio
 from os import getenv
-from typing import Set
 
 from fastapi import APIRouter
 from discord import Intents, Client, Message
@@ -16,7 +15,6 @@ from utils.log import logger
 intents = Intents.default()
 intents.message_content = True
 client = Client(intents=intents)
-client.active_threads: Set[int] = set()
 
 
 @client.event
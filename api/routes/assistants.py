@@ -1,11 +1,17 @@
-from typing import Generator, Optional, List, Dict, Any, Literal
+from contextlib import contextmanager
+from typing import AsyncGenerator, Iterator, Optional, List, Dict, Any, Literal
 
 from fastapi import APIRouter, HTTPException
 from fastapi.responses import StreamingResponse
-from phi.assistant import Assistant, AssistantRun
+from starlette.background import BackgroundTask
+from phi.assistant import AssistantRun
 from pydantic import BaseModel
 
+from api.assistant_cache import AssistantLease, assistant_cache
+from api.concurrency import iterate_in_executor, run_in_executor, user_limiter
+from api.jobs import submit_job
 from api.routes.endpoints import endpoints
+from api.routes.jobs import JobResponse
 from ai.assistants.pdf_rag import get_rag_pdf_assistant
 from ai.assistants.pdf_auto import get_autonomous_pdf_assistant
 from ai.storage import pdf_assistant_storage
@@ -17,6 +23,11 @@ from utils.log import logger
 
 assistants_router = APIRouter(prefix=endpoints.ASSISTANTS, tags=["Assistants"])
 AssistantType = Literal["AUTO_PDF", "RAG_PDF"]
+# Vector db collection of the knowledge base used by each assistant
+ASSISTANT_KNOWLEDGE_BASES: Dict[str, str] = {
+    "AUTO_PDF": "pdf_documents",
+    "RAG_PDF": "pdf_documents",
+}
 
 
 def get_assistant(
@@ -32,18 +43,46 @@ def get_assistant(
         return get_rag_pdf_assistant(run_id=run_id, user_id=user_id)
 
 
+def checkout_assistant(
+    assistant_type: AssistantType,
+    run_id: Optional[str] = None,
+    user_id: Optional[str] = None,
+) -> AssistantLease:
+    """Return the cached assistant for a run, building it on a cache miss"""
+
+    return assistant_cache.checkout(
+        key=(assistant_type, run_id, user_id),
+        build=lambda: get_assistant(assistant_type=assistant_type, run_id=run_id, user_id=user_id),
+    )
+
+
+@contextmanager
+def lease_assistant(
+    assistant_type: AssistantType,
+    run_id: Optional[str] = None,
+    user_id: Optional[str] = None,
+) -> Iterator[AssistantLease]:
+    """Lends the cached assistant for a run to a request and returns it to the cache afterwards"""
+
+    lease = checkout_assistant(assistant_type=assistant_type, run_id=run_id, user_id=user_id)
+    try:
+        yield lease
+    except BaseException:
+        assistant_cache.discard(lease)
+        raise
+    assistant_cache.checkin(lease)
+
+
 class LoadKnowledgeBaseRequest(BaseModel):
     assistant: AssistantType = "RAG_PDF"
 
 
-@assistants_router.post("/load-knowledge-base")
-def load_knowledge_base(body: LoadKnowledgeBaseRequest):
-    """Loads the knowledge base for an Assistant"""
+@assistants_router.post("/load-knowledge-base", response_model=JobResponse)
+async def load_knowledge_base(body: LoadKnowledgeBaseRequest):
+    """Queues a load of the knowledge base for an Assistant and returns the job"""
 
-    assistant = get_assistant(assistant_type=body.assistant)
-    if assistant.knowledge_base:
-        assistant.knowledge_base.load(recreate=False)
-    return {"message": "Knowledge Base Loaded"}
+    job = await run_in_executor(submit_job, ASSISTANT_KNOWLEDGE_BASES[body.assistant])
+    return JobResponse(**job)
 
 
 class CreateRunRequest(BaseModel):
@@ -58,29 +97,67 @@ class CreateRunResponse(BaseModel):
 
 
 @assistants_router.post("/create", response_model=CreateRunResponse)
-def create_assistant_run(body: CreateRunRequest):
+async def create_assistant_run(body: CreateRunRequest):
     """Create a new Assistant run and returns the run_id"""
 
     logger.debug(f"CreateRunRequest: {body}")
-    assistant: Assistant = get_assistant(assistant_type=body.assistant, user_id=body.user_id)
 
-    # create_run() will log the run in the database and return the run_id
-    # which is returned to the frontend to retrieve the run later
-    run_id: Optional[str] = assistant.create_run()
+    def _create_run():
+        with lease_assistant(assistant_type=body.assistant, user_id=body.user_id) as lease:
+            # create_run() will log the run in the database and return the run_id
+            # which is returned to the frontend to retrieve the run later.
+            # The new run is cached so the first chat message skips loading it.
+            run_id = lease.assistant.create_run()
+            return run_id, lease.assistant.user_id, lease.assistant.memory.get_chat_history()
+
+    async with user_limiter.limit(body.user_id):
+        run_id, user_id, chat_history = await run_in_executor(_create_run)
     if run_id is None:
         raise HTTPException(status_code=500, detail="Failed to create assistant run")
     logger.debug(f"Created Assistant Run: {run_id}")
 
     return CreateRunResponse(
         run_id=run_id,
-        user_id=assistant.user_id,
-        chat_history=assistant.memory.get_chat_history(),
+        user_id=user_id,
+        chat_history=chat_history,
     )
 
 
-def chat_response_streamer(assistant: Assistant, message: str) -> Generator:
-    for chunk in assistant.run(message):
-        yield chunk
+class ChatStream:
+    """Holds the user's concurrency slot and the leased assistant of a streamed chat.
+
+    Both are released exactly once: when the stream ends, when the client disconnects, or by the
+    response's background task if the stream was never iterated.
+    """
+
+    def __init__(self, lease: AssistantLease, user_id: Optional[str]):
+        self.lease = lease
+        self.user_id = user_id
+        self.started = False
+        self.completed = False
+        self.released = False
+
+    async def stream(self, message: str) -> AsyncGenerator:
+        """Streams the response chunk by chunk, the LLM is only read as fast as the client consumes"""
+        self.started = True
+        try:
+            async for chunk in iterate_in_executor(self.lease.assistant.run(message)):
+                yield chunk
+            self.completed = True
+        finally:
+            await self.release()
+
+    async def release(self) -> None:
+        """Returns the assistant to the cache and frees the user's slot, only the first time it is called"""
+        if self.released:
+            return
+        self.released = True
+        # A stream cut short leaves the assistant halfway through a run
+        if self.started and not self.completed:
+            assistant_cache.discard(self.lease)
+        else:
+            assistant_cache.checkin(self.lease)
+        user_limiter.release(self.user_id)
 
 
 class ChatRequest(BaseModel):
@@ -92,21 +169,42 @@ class ChatRequest(BaseModel):
 
 
 @assistants_router.post("/chat")
-def chat(body: ChatRequest):
+async def chat(body: ChatRequest):
     """Sends a message to an Assistant and returns the response"""
 
     logger.debug(f"ChatRequest: {body}")
-    assistant: Assistant = get_assistant(
-        assistant_type=body.assistant, run_id=body.run_id, user_id=body.user_id
-    )
-
-    if body.stream:
-        return StreamingResponse(
-            chat_response_streamer(assistant, body.message),
-            media_type="text/event-stream",
-        )
-    else:
-        return assistant.run(body.message, stream=False)
+    user_limiter.acquire(body.user_id)
+    streaming = False
+    try:
+        if body.stream:
+            lease = await run_in_executor(
+                checkout_assistant, assistant_type=body.assistant, run_id=body.run_id, user_id=body.user_id
+            )
+            # From here the stream releases the user's slot and the assistant
+            streaming = True
+            chat_stream = ChatStream(lease, body.user_id)
+            try:
+                return StreamingResponse(
+                    chat_stream.stream(body.message),
+                    media_type="text/event-stream",
+                    # Also runs if the client disconnects before the stream is iterated
+                    background=BackgroundTask(chat_stream.release),
+                )
+            except BaseException:
+                await chat_stream.release()
+                raise
+        else:
+
+            def _run():
+                with lease_assistant(
+                    assistant_type=body.assistant, run_id=body.run_id, user_id=body.user_id
+                ) as lease:
+                    return lease.assistant.run(body.message, stream=False)
+
+            return await run_in_executor(_run)
+    finally:
+        if not streaming:
+            user_limiter.release(body.user_id)
 
 
 class ChatHistoryRequest(BaseModel):
@@ -116,17 +214,23 @@ class ChatHistoryRequest(BaseModel):
 
 
 @assistants_router.post("/history", response_model=List[Dict[str, Any]])
-def get_chat_history(body: ChatHistoryRequest):
+async def get_chat_history(body: ChatHistoryRequest):
     """Return the chat history for an Assistant run"""
 
     logger.debug(f"ChatHistoryRequest: {body}")
-    assistant: Assistant = get_assistant(
-        assistant_type=body.assistant, run_id=body.run_id, user_id=body.user_id
-    )
-    # Load the assistant from the database
-    assistant.read_from_storage()
 
-    return assistant.memory.get_chat_history()
+    def _get_chat_history():
+        with lease_assistant(
+            assistant_type=body.assistant, run_id=body.run_id, user_id=body.user_id
+        ) as lease:
+            # Always loaded from the database: the cache is per process, so a cached assistant
+            # misses messages written by other workers, jobs or the Streamlit apps.
+            # Only the row version is read while the run is unchanged.
+            lease.assistant.read_from_storage()
+            return lease.assistant.memory.get_chat_history()
+
+    async with user_limiter.limit(body.user_id):
+        return await run_in_executor(_get_chat_history)
 
 
 class GetAssistantRunRequest(BaseModel):
@@ -136,15 +240,19 @@ class GetAssistantRunRequest(BaseModel):
 
 
 @assistants_router.post("/get", response_model=Optional[AssistantRun])
-def get_assistant_run(body: GetAssistantRunRequest):
+async def get_assistant_run(body: GetAssistantRunRequest):
     """Returns the Assistant run"""
 
     logger.debug(f"GetAssistantRunRequest: {body}")
-    assistant: Assistant = get_assistant(
-        assistant_type=body.assistant, run_id=body.run_id, user_id=body.user_id
-    )
 
-    return assistant.read_from_storage()
+    def _get_assistant_run():
+        with lease_assistant(
+            assistant_type=body.assistant, run_id=body.run_id, user_id=body.user_id
+        ) as lease:
+            return lease.assistant.read_from_storage()
+
+    async with user_limiter.limit(body.user_id):
+        return await run_in_executor(_get_assistant_run)
 
 
 class GetAllAssistantRunsRequest(BaseModel):
@@ -152,11 +260,11 @@ class GetAllAssistantRunsRequest(BaseModel):
 
 
 @assistants_router.post("/get-all", response_model=List[AssistantRun])
-def get_assistants(body: GetAllAssistantRunsRequest):
+async def get_assistants(body: GetAllAssistantRunsRequest):
     """Return all Assistant runs for a user"""
 
     logger.debug(f"GetAllAssistantRunsRequest: {body}")
-    return pdf_assistant_storage.get_all_runs(user_id=body.user_id)
+    return await run_in_executor(pdf_assistant_storage.get_all_runs, user_id=body.user_id)
 
 
 class GetAllAssistantRunIdsRequest(BaseModel):
@@ -164,11 +272,11 @@ class GetAllAssistantRunIdsRequest(BaseModel):
 
 
 @assistants_router.post("/get-all-ids", response_model=List[str])
-def get_run_ids(body: GetAllAssistantRunIdsRequest):
+async def get_run_ids(body: GetAllAssistantRunIdsRequest):
     """Return all run_ids for a user"""
 
     logger.debug(f"GetAllAssistantRunIdsRequest: {body}")
-    return pdf_assistant_storage.get_all_run_ids(user_id=body.user_id)
+    return await run_in_executor(pdf_assistant_storage.get_all_run_ids, user_id=body.user_id)
 
 
 class RenameAssistantRunRequest(BaseModel):
@@ -184,19 +292,23 @@ class RenameAssistantRunResponse(BaseModel):
 
 
 @assistants_router.post("/rename", response_model=RenameAssistantRunResponse)
-def rename_assistant(body: RenameAssistantRunRequest):
+async def rename_assistant(body: RenameAssistantRunRequest):
     """Rename an Assistant run"""
 
     logger.debug(f"RenameAssistantRunRequest: {body}")
-    assistant: Assistant = get_assistant(
-        assistant_type=body.assistant, run_id=body.run_id, user_id=body.user_id
-    )
-    assistant.rename_run(body.run_name)
 
-    return RenameAssistantRunResponse(
-        run_id=assistant.run_id,
-        run_name=assistant.run_name,
-    )
+    def _rename_run():
+        with lease_assistant(
+            assistant_type=body.assistant, run_id=body.run_id, user_id=body.user_id
+        ) as lease:
+            lease.assistant.rename_run(body.run_name)
+            return RenameAssistantRunResponse(
+                run_id=lease.assistant.run_id,
+                run_name=lease.assistant.run_name,
+            )
+
+    async with user_limiter.limit(body.user_id):
+        return await run_in_executor(_rename_run)
 
 
 class AutoRenameAssistantRunRequest(BaseModel):
@@ -211,16 +323,20 @@ class AutoRenameAssistantRunResponse(BaseModel):
 
 
 @assistants_router.post("/autorename", response_model=AutoRenameAssistantRunResponse)
-def autorename_assistant(body: AutoRenameAssistantRunRequest):
+async def autorename_assistant(body: AutoRenameAssistantRunRequest):
     """Rename a assistant using the LLM"""
 
     logger.debug(f"AutoRenameAssistantRunRequest: {body}")
-    assistant: Assistant = get_assistant(
-        assistant_type=body.assistant, run_id=body.run_id, user_id=body.user_id
-    )
-    assistant.auto_rename_run()
 
-    return RenameAssistantRunResponse(
-        run_id=assistant.run_id,
-        run_name=assistant.run_name,
-    )
+    def _auto_rename_run():
+        with lease_assistant(
+            assistant_type=body.assistant, run_id=body.run_id, user_id=body.user_id
+        ) as lease:
+            lease.assistant.auto_rename_run()
+            return RenameAssistantRunResponse(
+                run_id=lease.assistant.run_id,
+                run_name=lease.assistant.run_name,
+            )
+
+    async with user_limiter.limit(body.user_id):
+        return await run_in_executor(_auto_rename_run)
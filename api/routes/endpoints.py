@@ -8,6 +8,7 @@ class ApiEndpoints:
     ASSISTANTS: str = "/assistants"
     HN: str = "/hn"
     ARXIV_DISCORD: str = "/arxiv_discord"
+    JOBS: str = "/jobs"
 
 
 endpoints = ApiEndpoints()
@@ -3,8 +3,10 @@ from typing import Optional
 from fastapi import APIRouter
 from pydantic import BaseModel
 
+from api.concurrency import run_in_executor
+from api.jobs import submit_job
 from api.routes.endpoints import endpoints
-from hn_ai.knowledge import load_hackernews_knowledge_base
+from api.routes.jobs import JobResponse
 
 ######################################################
 ## Router for Hackernews Assistant
@@ -17,9 +19,9 @@ class LoadKnowledgeBaseRequest(BaseModel):
     key: Optional[str] = None
 
 
-@hn_router.post("/load-knowledge-base")
-def load_knowledge_base(body: LoadKnowledgeBaseRequest):
-    """Loads the hackernews knowledge base"""
+@hn_router.post("/load-knowledge-base", response_model=JobResponse)
+async def load_knowledge_base(body: LoadKnowledgeBaseRequest):
+    """Queues a load of the hackernews knowledge base and returns the job"""
 
-    status = load_hackernews_knowledge_base()
-    return {"message": status}
+    job = await run_in_executor(submit_job, "hn_documents")
+    return JobResponse(**job)
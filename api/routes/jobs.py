@@ -0,0 +1,44 @@
+from datetime import datetime
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException
+from pydantic import BaseModel
+
+from ai.jobs import get_job_queue
+from api.concurrency import run_in_executor
+from api.routes.endpoints import endpoints
+
+######################################################
+## Router for knowledge base loading jobs
+######################################################
+
+jobs_router = APIRouter(prefix=endpoints.JOBS, tags=["Jobs"])
+
+
+class JobResponse(BaseModel):
+    id: str
+    knowledge_base: str
+    # One of "queued", "running", "completed" or "failed"
+    status: str
+    num_done: int
+    num_total: Optional[int] = None
+    message: Optional[str] = None
+    error: Optional[str] = None
+    created_at: Optional[datetime] = None
+    started_at: Optional[datetime] = None
+    heartbeat_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    # Items loaded per second
+    throughput: Optional[float] = None
+    # Seconds until the job is expected to finish
+    eta_seconds: Optional[float] = None
+
+
+@jobs_router.get("/{job_id}", response_model=JobResponse)
+async def get_job(job_id: str):
+    """Returns the status, progress, throughput and ETA of a job"""
+
+    job = await run_in_executor(lambda: get_job_queue().get(job_id))
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return JobResponse(**job)
@@ -28,6 +28,21 @@ class ApiSettings(BaseSettings):
     # default cors origin list.
     cors_origin_list: Optional[List[str]] = Field(None, validate_default=True)
 
+    # Number of threads that run blocking Assistant work (LLM calls, storage reads and writes)
+    executor_max_workers: int = 16
+    # Maximum number of assistant requests a single user can have in flight.
+    # Requests over the limit are rejected with a 429.
+    max_concurrent_requests_per_user: int = 2
+    # Maximum number of hydrated Assistants kept in memory between requests
+    # and the number of seconds an idle Assistant stays cached.
+    assistant_cache_size: int = 256
+    assistant_cache_ttl: int = 600
+
+    # Number of worker processes running knowledge base loading jobs
+    job_workers: int = 2
+    # Seconds between checks for jobs queued by other processes, like the index refreshes of the apps
+    job_poll_interval: int = 30
+
     @field_validator("runtime_env")
     def validate_runtime_env(cls, runtime_env):
         """Validate runtime_env."""
@@ -1,8 +1,7 @@
-from typing import List
+from typing import Any, Dict, List
 
 import streamlit as st
 from phi.assistant import Assistant
-from phi.document import Document
 from phi.document.reader.pdf import PDFReader
 from phi.tools.streamlit.components import (
     get_openai_key_sidebar,
@@ -11,9 +10,12 @@ from phi.tools.streamlit.components import (
     get_username_sidebar,
 )
 
+from ai.catalog import backfill_catalog, clear_catalog
+from ai.pdf_ingest import submit_pdf
 from ai.assistants.pdf_auto import get_autonomous_pdf_assistant
 from ai.assistants.pdf_rag import get_rag_pdf_assistant
 from utils.log import logger
+from utils.session_cache import invalidate, session_cached
 
 st.set_page_config(
     page_title="PDF AI",
@@ -30,10 +32,35 @@ with st.expander(":rainbow[:point_down: Example Questions]"):
 def restart_assistant():
     st.session_state["pdf_assistant"] = None
     st.session_state["pdf_assistant_run_id"] = None
+    invalidate("pdf_messages", "pdf_run_ids")
     st.session_state["file_uploader_key"] += 1
     st.rerun()
 
 
+def show_ingestions(polling: bool) -> None:
+    """Shows the progress of the PDFs loading in the background"""
+    for ingestion in list(st.session_state["pdf_ingestions"]):
+        if not ingestion.running:
+            st.session_state["pdf_ingestions"].remove(ingestion)
+            st.session_state["pdf_ingestions_finished"].append(ingestion)
+            if ingestion.status == "failed":
+                logger.error(f"Could not read {ingestion.name}: {ingestion.error}")
+    if polling and len(st.session_state["pdf_ingestions"]) == 0:
+        # The last PDF finished loading, a full run of the page stops the polling
+        st.session_state["pdf_ingestions_stopped"] = True
+        st.rerun()
+    # Finished ingestions are shown until the next full run of the page, or the one after the
+    # run that stopped the polling
+    for ingestion in st.session_state["pdf_ingestions_finished"]:
+        if ingestion.status == "failed":
+            st.error("Could not read PDF")
+        else:
+            st.success(f"Loaded {ingestion.name}")
+    for ingestion in st.session_state["pdf_ingestions"]:
+        pages = f"{ingestion.pages_done}/{ingestion.num_pages or '?'} pages"
+        st.progress(ingestion.progress, text=f"Loading {ingestion.name}: {pages}")
+
+
 def main() -> None:
     # Get OpenAI key from environment variable or user input
     get_openai_key_sidebar()
@@ -75,7 +102,8 @@ def main() -> None:
     else:
         pdf_assistant = st.session_state["pdf_assistant"]
 
-    # Create assistant run (i.e. log to database) and save run_id in session state
+    # Create assistant run (i.e. log to database) and save run_id in session state.
+    # Only reads or writes storage the first time for an assistant.
     st.session_state["pdf_assistant_run_id"] = pdf_assistant.create_run()
 
     # Check if knowlege base exists
@@ -91,14 +119,18 @@ def main() -> None:
             st.sidebar.success("Knowledge base loaded")
             loading_container.empty()
 
-    # Load messages for existing assistant
-    assistant_chat_history = pdf_assistant.memory.get_chat_history()
-    if len(assistant_chat_history) > 0:
-        logger.debug("Loading chat history")
-        st.session_state["messages"] = assistant_chat_history
-    else:
+    # Load messages for existing assistant, once per run
+    def load_messages() -> List[Dict[str, Any]]:
+        assistant_chat_history = pdf_assistant.memory.get_chat_history()
+        if len(assistant_chat_history) > 0:
+            logger.debug("Loading chat history")
+            return assistant_chat_history
         logger.debug("No chat history found")
-        st.session_state["messages"] = [{"role": "assistant", "content": "Ask me anything..."}]
+        return [{"role": "assistant", "content": "Ask me anything..."}]
+
+    st.session_state["messages"] = session_cached(
+        "pdf_messages", load_messages, version=st.session_state["pdf_assistant_run_id"]
+    )
 
     # Prompt for user input
     if prompt := st.chat_input():
@@ -130,16 +162,20 @@ def main() -> None:
     if pdf_assistant.knowledge_base:
         if st.sidebar.button("Update Knowledge Base", disabled=True):
             pdf_assistant.knowledge_base.load(recreate=False)
+            backfill_catalog(pdf_assistant.knowledge_base.vector_db)
             st.session_state["pdf_knowledge_base_loaded"] = True
             st.sidebar.success("Knowledge base updated")
 
         if st.sidebar.button("Recreate Knowledge Base", disabled=True):
             pdf_assistant.knowledge_base.load(recreate=True)
+            clear_catalog(pdf_assistant.knowledge_base.vector_db)
+            backfill_catalog(pdf_assistant.knowledge_base.vector_db)
             st.session_state["pdf_knowledge_base_loaded"] = True
             st.sidebar.success("Knowledge base recreated")
 
         if st.sidebar.button("Clear Knowledge Base", disabled=True):
             pdf_assistant.knowledge_base.vector_db.clear()
+            clear_catalog(pdf_assistant.knowledge_base.vector_db)
             st.session_state["pdf_knowledge_base_loaded"] = False
             st.sidebar.success("Knowledge base cleared")
 
@@ -150,6 +186,8 @@ def main() -> None:
     if pdf_assistant.knowledge_base:
         if "file_uploader_key" not in st.session_state:
             st.session_state["file_uploader_key"] = 0
+        if "pdf_ingestions" not in st.session_state:
+            st.session_state["pdf_ingestions"] = []
 
         uploaded_file = st.sidebar.file_uploader(
             "Upload PDF",
@@ -157,20 +195,27 @@ def main() -> None:
             key=st.session_state["file_uploader_key"],
         )
         if uploaded_file is not None:
-            alert = st.sidebar.info("Processing PDF...", icon="ℹ️")
             pdf_name = uploaded_file.name.split(".")[0]
             if f"{pdf_name}_uploaded" not in st.session_state:
-                reader = PDFReader()
-                pdf_documents: List[Document] = reader.read(uploaded_file)
-                if pdf_documents:
-                    pdf_assistant.knowledge_base.load_documents(pdf_documents)
-                else:
-                    st.sidebar.error("Could not read PDF")
+                # Loaded in the background, the chat stays usable while the PDF loads
+                ingestion = submit_pdf(uploaded_file, pdf_assistant.knowledge_base.vector_db, PDFReader())
+                st.session_state["pdf_ingestions"].append(ingestion)
                 st.session_state[f"{pdf_name}_uploaded"] = True
-            alert.empty()
+
+        # Only this fragment reruns while PDFs load, not the whole page
+        if not st.session_state.pop("pdf_ingestions_stopped", False):
+            st.session_state["pdf_ingestions_finished"] = []
+        loading = any(ingestion.running for ingestion in st.session_state["pdf_ingestions"])
+        with st.sidebar:
+            st.fragment(show_ingestions, run_every=1 if loading else None)(polling=loading)
 
     if pdf_assistant.storage:
-        pdf_assistant_run_ids: List[str] = pdf_assistant.storage.get_all_run_ids(user_id=username)
+        # Loaded again for a new or another run
+        pdf_assistant_run_ids: List[str] = session_cached(
+            "pdf_run_ids",
+            lambda: pdf_assistant.storage.get_all_run_ids(user_id=username),
+            version=(username, st.session_state["pdf_assistant_run_id"]),
+        )
         new_pdf_assistant_run_id = st.sidebar.selectbox("Run ID", options=pdf_assistant_run_ids)
         if st.session_state["pdf_assistant_run_id"] != new_pdf_assistant_run_id:
             logger.debug(f"Loading run {new_pdf_assistant_run_id}")
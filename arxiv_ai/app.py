@@ -1,4 +1,4 @@
-from typing import List, Optional, Tuple
+from typing import Any, Dict, List, Optional, Tuple
 
 import streamlit as st
 from phi.assistant import Assistant
@@ -11,6 +11,7 @@ from phi.tools.streamlit.components import (
 from arxiv_ai.assistant import get_arxiv_assistant
 from arxiv_ai.knowledge import get_available_docs, get_arxiv_summary_knowledge_base_for_user
 from utils.log import logger
+from utils.session_cache import invalidate, session_cached
 
 
 st.set_page_config(
@@ -41,6 +42,8 @@ with st.expander(":rainbow[:point_down: How to use]"):
 def restart_assistant():
     st.session_state["arxiv_assistant"] = None
     st.session_state["arxiv_assistant_run_id"] = None
+    invalidate("arxiv_messages", "arxiv_run_ids")
+    st.session_state.pop("arxiv_document_name", None)
     st.rerun()
 
 
@@ -79,17 +82,22 @@ def main() -> None:
         st.session_state["arxiv_assistant"] = arxiv_assistant
     else:
         arxiv_assistant = st.session_state["arxiv_assistant"]
-    # Create assistant run (i.e. log to database) and save run_id in session state
+    # Create assistant run (i.e. log to database) and save run_id in session state.
+    # Only reads or writes storage the first time for an assistant.
     st.session_state["arxiv_assistant_run_id"] = arxiv_assistant.create_run()
 
-    # Load messages for existing assistant
-    assistant_chat_history = arxiv_assistant.memory.get_chat_history()
-    if len(assistant_chat_history) > 0:
-        logger.debug("Loading chat history")
-        st.session_state["messages"] = assistant_chat_history
-    else:
+    # Load messages for existing assistant, once per run
+    def load_messages() -> List[Dict[str, Any]]:
+        assistant_chat_history = arxiv_assistant.memory.get_chat_history()
+        if len(assistant_chat_history) > 0:
+            logger.debug("Loading chat history")
+            return assistant_chat_history
         logger.debug("No chat history found")
-        st.session_state["messages"] = [{"role": "assistant", "content": "Ask me questions from the Arxiv"}]
+        return [{"role": "assistant", "content": "Ask me questions from the Arxiv"}]
+
+    st.session_state["messages"] = session_cached(
+        "arxiv_messages", load_messages, version=st.session_state["arxiv_assistant_run_id"]
+    )
 
     # Prompt for user input
     if prompt := st.chat_input():
@@ -118,28 +126,40 @@ def main() -> None:
 
                 st.session_state["messages"].append({"role": "assistant", "content": response})
 
+                # The assistant may have added papers to the knowledge base
+                invalidate("arxiv_available_docs")
+
     # Select a specific paper
-    summary_knowledge_base = get_arxiv_summary_knowledge_base_for_user(user_id=username)
+    summary_knowledge_base = session_cached(
+        "arxiv_summary_knowledge_base",
+        lambda: get_arxiv_summary_knowledge_base_for_user(user_id=username),
+        version=username,
+    )
     if summary_knowledge_base:
-        available_docs: Optional[List[Tuple[str, str]]] = get_available_docs(summary_knowledge_base)
+        available_docs: Optional[List[Tuple[str, str]]] = session_cached(
+            "arxiv_available_docs", lambda: get_available_docs(summary_knowledge_base), version=username
+        )
         if available_docs:
-            available_docs.insert(0, ("-- all --", "-- all --"))
             selected_paper = st.sidebar.selectbox(
                 "Select Paper",
-                options=available_docs,
+                options=[("-- all --", "-- all --")] + available_docs,
                 key="selected_paper",
                 format_func=lambda x: x[1],
             )
             logger.info(f"Selected paper: {selected_paper}")
-            if selected_paper is not None:
-                # Refresh the assistant to update the instructions and document names
+            document_name = None
+            if selected_paper is not None and selected_paper[0] != "-- all --":
+                document_name = selected_paper
+            # Refresh the assistant to update the instructions and document names, when the selection changes
+            if st.session_state.get("arxiv_document_name") != document_name:
                 arxiv_assistant = get_arxiv_assistant(
                     user_id=username,
                     run_id=st.session_state["arxiv_assistant_run_id"],
-                    document_name=selected_paper if selected_paper[0] != "-- all --" else None,
+                    document_name=document_name,
                     debug_mode=True,
                 )
                 st.session_state["arxiv_assistant"] = arxiv_assistant
+                st.session_state["arxiv_document_name"] = document_name
 
     st.sidebar.markdown("---")
 
@@ -150,7 +170,12 @@ def main() -> None:
         arxiv_assistant.auto_rename_run()
 
     if arxiv_assistant.storage:
-        arxiv_assistant_run_ids: List[str] = arxiv_assistant.storage.get_all_run_ids(user_id=username)
+        # Loaded again for a new or another run
+        arxiv_assistant_run_ids: List[str] = session_cached(
+            "arxiv_run_ids",
+            lambda: arxiv_assistant.storage.get_all_run_ids(user_id=username),
+            version=(username, st.session_state["arxiv_assistant_run_id"]),
+        )
         new_arxiv_assistant_run_id = st.sidebar.selectbox("Run ID", options=arxiv_assistant_run_ids)
         if st.session_state["arxiv_assistant_run_id"] != new_arxiv_assistant_run_id:
             logger.debug(f"Loading run {new_arxiv_assistant_run_id}")
@@ -160,6 +185,7 @@ def main() -> None:
                 run_id=new_arxiv_assistant_run_id,
                 debug_mode=True,
             )
+            st.session_state.pop("arxiv_document_name", None)
             st.rerun()
 
     arxiv_assistant_run_name = arxiv_assistant.run_name
@@ -30,7 +30,7 @@ def get_arxiv_assistant(
             [
                 f"The user is asking about the `document_name`: {document_name}",
                 "If the user asks a specific question, use the `search_document` tool to get context from the specific paper.",
-                "If the user asks the summarize the paper, use the `get_document_contents` tool to get the first 5000 words of the paper and provide the user with a concise and relevant answer.",
+                "If the user asks the summarize the paper, use the `get_document_contents` tool to get the start of the paper and provide the user with a concise and relevant answer.",
             ]
         )
 
@@ -45,7 +45,7 @@ def get_arxiv_assistant(
 
     instructions.extend(
         [
-            "If the user asks more details, use the `get_document_contents` tool to get the first 5000 words of the paper and provide the user with a concise and relevant answer.",
+            "If the user asks more details, use the `get_document_contents` tool to get the start of the paper and provide the user with a concise and relevant answer.",
             "If the user is asking a question from a specific paper, use the `search_document` tool to get context from the specific paper.",
             "If the user is asking about the content of the knowledge base use `get_document_names` tool to get the list of documents.",
             "If the user provides a link then use `add_arxiv_papers_to_knowledge_base` tool to add the paper to the knowledge base.",
@@ -56,7 +56,6 @@ def get_arxiv_assistant(
             "If you do not have information on the topic, use the `search_arxiv_and_add_to_knowledge_base` tool to search for the topic on ArXiv and add it to the knowledge base.",
             "If you cannot find the information in the knowledge base or on arxiv, **THINK** if you can find it on the web. If you can find the information on the web, use the `search_web` tool",
             "When searching the knowledge base, search for at least 3 documents.",
-            "When getting document contents, get at least 5000 words so you get the first few pages.",
             "Always try to provide the user with links to the arxiv papers if available.",
             "If the user compliments you, ask them to star phidata on GitHub: https://github.com/phidatahq/phidata",
         ]
@@ -0,0 +1,222 @@
+import json
+import multiprocessing
+import uuid
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, Iterable, List
+
+import arxiv
+from phi.document import Document
+from phi.knowledge import AssistantKnowledge
+from phi.vectordb.pgvector import PgVector2
+
+from ai.catalog import update_catalog
+from ai.chunking import chunk_pages, count_tokens
+from ai.jobs import schedule_index_refresh
+from ai.pdf_store import Pages, extract_stored_pdf, pdf_store
+from ai.pipeline import batched, delete_stale_documents, embed_documents, upsert_documents
+from arxiv_ai.settings import arxiv_settings
+from utils.log import logger
+
+######################################################
+## Loading arXiv papers into the knowledge bases
+######################################################
+
+
+def get_paper_meta_data(result: arxiv.Result) -> Dict[str, Any]:
+    return {
+        "title": result.title,
+        "name": result.get_short_id(),
+        "entry_id": result.entry_id,
+        "updated": result.updated.isoformat() if result.updated else None,
+        "authors": [author.name for author in result.authors],
+        "primary_category": result.primary_category,
+        "categories": result.categories,
+        "published": result.published.isoformat() if result.published else None,
+        "pdf_url": result.pdf_url,
+        "links": [link.href for link in result.links],
+    }
+
+
+def get_paper_details(result: arxiv.Result) -> Dict[str, Any]:
+    paper_details = get_paper_meta_data(result)
+    paper_details["summary"] = result.summary
+    paper_details["comment"] = result.comment
+    return paper_details
+
+
+def get_summary_document(result: arxiv.Result) -> Document:
+    content = json.dumps(get_paper_details(result))
+    meta_data = get_paper_meta_data(result)
+    meta_data["num_tokens"] = count_tokens(content)
+    return Document(
+        id=result.get_short_id(),
+        name=result.get_short_id(),
+        meta_data=meta_data,
+        content=content,
+    )
+
+
+def get_chunk_documents(result: arxiv.Result, pages: Pages) -> List[Document]:
+    """Splits the pages of a paper into chunks along its sections and paragraphs.
+
+    Each chunk stores its `offset` in the text of the paper and the length of the `overlap` it
+    repeats from the previous chunk, so the text is reassembled by skipping the overlaps. The
+    number of tokens of each chunk is stored too, so its context is packed without tokenizing it.
+    """
+    meta_data = get_paper_meta_data(result)
+    text, chunks = chunk_pages(
+        pages,
+        max_tokens=arxiv_settings.arxiv_chunk_tokens,
+        overlap_tokens=arxiv_settings.arxiv_chunk_overlap_tokens,
+    )
+    documents = []
+    for chunk_number, chunk in enumerate(chunks, start=1):
+        chunk_meta_data = meta_data.copy()
+        chunk_meta_data.update(
+            page=chunk.page,
+            chunk=chunk_number,
+            section=chunk.section,
+            offset=chunk.start,
+            overlap=chunk.start - chunk.overlap_start,
+        )
+        content = text[chunk.overlap_start : chunk.end]
+        chunk_meta_data["num_tokens"] = count_tokens(content)
+        documents.append(
+            Document(
+                id=f"{result.get_short_id()}__{chunk_number}",
+                name=result.get_short_id(),
+                meta_data=chunk_meta_data,
+                content=content,
+            )
+        )
+    return documents
+
+
+@lru_cache
+def get_extraction_pool() -> ProcessPoolExecutor:
+    # Workers are forked from a server process that preloads this module, so they do not inherit
+    # the threads and connections of the app. Like with "spawn", the main script is imported by
+    # each worker and must guard its entrypoint with `if __name__ == "__main__"`.
+    mp_context = multiprocessing.get_context("forkserver")
+    mp_context.set_forkserver_preload([__name__])
+    return ProcessPoolExecutor(max_workers=arxiv_settings.arxiv_extract_workers, mp_context=mp_context)
+
+
+def fetch_pdf(result: arxiv.Result) -> str:
+    """Returns the SHA-256 of the PDF of `result` in the PDF store, downloading it if it is not there"""
+    # arXiv ids with a version always point to the same PDF
+    key = f"arxiv/{result.get_short_id()}"
+    digest = pdf_store.get_ref(key)
+    if digest is not None:
+        logger.info(f"Found {result.get_short_id()} in the PDF store")
+        return digest
+
+    logger.info(f"Downloading: {result.pdf_url}")
+    pdf_path = result.download_pdf(dirpath=str(pdf_store.temp_dir()), filename=f"{uuid.uuid4().hex}.pdf")
+    digest = pdf_store.put_file(Path(pdf_path))
+    pdf_store.set_ref(key, digest)
+    logger.info(f"Downloaded: {result.pdf_url}")
+    return digest
+
+
+def write_documents(vector_db: PgVector2, documents: List[Document]) -> None:
+    """Embeds and upserts `documents`, one embedding request and one statement per batch"""
+    for batch in batched(documents, arxiv_settings.arxiv_batch_size):
+        embed_documents(batch, embedder=vector_db.embedder, batch_size=arxiv_settings.arxiv_batch_size)
+        upsert_documents(vector_db, batch)
+
+
+def load_papers(
+    results: Iterable[arxiv.Result],
+    knowledge_base: AssistantKnowledge,
+    summary_knowledge_base: AssistantKnowledge,
+) -> List[Document]:
+    """Loads the papers of `results` into the knowledge bases.
+
+    Papers are downloaded concurrently, the text of each downloaded paper is extracted in the
+    extraction process pool and the pages of each extracted paper are embedded and written while
+    the other papers are still downloading. A paper that fails to download or parse is logged and
+    skipped, without holding up the others.
+
+    PDFs and their text are kept in the PDF store, so a paper added before (by any user) is
+    neither downloaded nor parsed again.
+
+    Args:
+        results (Iterable[arxiv.Result]): The arXiv search results to load.
+        knowledge_base (AssistantKnowledge): Receives the summary and pages of each paper.
+        summary_knowledge_base (AssistantKnowledge): Receives the summary of each paper.
+
+    Returns:
+        List[Document]: The summaries of the papers.
+    """
+    vector_db = knowledge_base.vector_db
+    summary_vector_db = summary_knowledge_base.vector_db
+    if not isinstance(vector_db, PgVector2) or not isinstance(summary_vector_db, PgVector2):
+        raise ValueError("ArXiv knowledge bases must use PgVector2")
+
+    results = list(results)
+    document_summaries = [get_summary_document(result) for result in results]
+    vector_db.create()
+    summary_vector_db.create()
+
+    # Summaries are written first, so every paper is searchable even if its PDF fails
+    write_documents(summary_vector_db, document_summaries)
+    update_catalog(summary_vector_db, document_summaries)
+
+    summaries = {summary.id: summary for summary in document_summaries}
+    # Papers without a PDF only have their summary in the knowledge base
+    without_pdf = [summaries[result.get_short_id()] for result in results if not result.pdf_url]
+    write_documents(vector_db, without_pdf)
+    update_catalog(vector_db, without_pdf)
+
+    downloading: Dict[Future, arxiv.Result] = {}
+    extracting: Dict[Future, arxiv.Result] = {}
+    with ThreadPoolExecutor(
+        max_workers=arxiv_settings.arxiv_download_workers, thread_name_prefix="arxiv-download"
+    ) as downloads:
+        for result in results:
+            if result.pdf_url:
+                downloading[downloads.submit(fetch_pdf, result)] = result
+        pending = set(downloading)
+        while len(pending) > 0:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    if future in downloading:
+                        result = downloading.pop(future)
+                        digest = future.result()
+                        pages = pdf_store.get_pages(digest)
+                        if pages is None:
+                            extraction = get_extraction_pool().submit(
+                                extract_stored_pdf, str(pdf_store.root), digest
+                            )
+                            extracting[extraction] = result
+                            pending.add(extraction)
+                            continue
+                    else:
+                        result = extracting.pop(future)
+                        pages = future.result()
+
+                    paper_documents = [summaries[result.get_short_id()]]
+                    paper_documents.extend(get_chunk_documents(result, pages))
+                    write_documents(vector_db, paper_documents)
+                    # Rows of an earlier load of the paper, like one document per page
+                    delete_stale_documents(
+                        vector_db, result.get_short_id(), [document.id for document in paper_documents]
+                    )
+                    update_catalog(vector_db, paper_documents)
+                    logger.info(f"Loaded {len(paper_documents)} documents for paper {result.entry_id}")
+                except BrokenProcessPool as e:
+                    # A crashed worker breaks the pool, the next papers get a new one
+                    get_extraction_pool.cache_clear()
+                    logger.error(f"Error extracting paper {result.entry_id}: {e}")
+                except Exception as e:
+                    logger.error(f"Error loading paper {result.entry_id}: {e}")
+
+    # Queued for a job worker, only once a collection crosses a threshold of its index policy
+    schedule_index_refresh(vector_db)
+    schedule_index_refresh(summary_vector_db)
+    return document_summaries
@@ -1,5 +1,4 @@
 from os import getenv
-from typing import Set
 
 from discord import Intents, Client, Message
 from arxiv_ai.ls.message import handle_mention, handle_message
@@ -14,8 +13,6 @@ def run():
     intents.message_content = True
     client = Client(intents=intents)
 
-    client.active_threads: Set[int] = set()
-
     @client.event
     async def on_ready():
         logger.info(f"Logged in as {client.user}")
@@ -6,7 +6,8 @@ from phi.llm.openai import OpenAIChat
 from phi.tools.resend_toolkit import ResendToolkit
 
 from ai.settings import ai_settings
-from arxiv_ai.tools import ArxivTools
+from arxiv_ai.paper_context import paper_context_cache
+from arxiv_ai.tools import get_arxiv_tools
 from arxiv_ai.storage import latent_space_arxiv_bot_storage
 from utils.log import logger
 
@@ -17,40 +18,38 @@ def get_discussion_assistant(
     paper: Optional[ArxivPaper] = None,
     debug_mode: bool = True,
 ) -> Optional[Assistant]:
-    arxiv_tools = ArxivTools(user_id="latent_space")
-    paper_data = None
+    arxiv_tools = get_arxiv_tools(user_id="latent_space")
     paper_title = None
     paper_id = None
     if paper is None:
-        assistant_run: Optional[AssistantRun] = latent_space_arxiv_bot_storage.read(run_id=thread_id)
-        if assistant_run is not None:
-            paper_data = assistant_run.run_data.get("paper", None)
-            logger.info(f"Paper found in run data: {paper_data}")
+        # The paper of a thread is only read from the run the first time
+        thread_paper = paper_context_cache.get_thread_paper(thread_id)
+        if thread_paper is not None:
+            paper_id, paper_title = thread_paper
+        else:
+            assistant_run: Optional[AssistantRun] = latent_space_arxiv_bot_storage.read(run_id=thread_id)
+            if assistant_run is not None:
+                paper_data = (assistant_run.run_data or {}).get("paper", None)
+                logger.info(f"Paper found in run data: {paper_data}")
+                if paper_data is not None:
+                    paper_title = paper_data.get("title")
+                    paper_id = paper_data.get("id")
     else:
         paper_title = paper.title
         paper_id = paper.get_short_id()
 
-    if paper_title is None:
-        if paper_data is None:
-            return None
-        paper_title = paper_data.get("title")
-        paper_id = paper_data.get("id")
-
     if paper_id is None:
         return None
+    paper_context_cache.set_thread_paper(thread_id, paper_id, paper_title)
 
-    try:
-        paper_content = arxiv_tools.get_document_contents(paper_id, limit=100)
-        if paper_content == "":
-            arxiv_tools.add_arxiv_papers_to_knowledge_base([paper_id])
-    except Exception as e:
-        logger.error(e)
+    # Cached, so the paper is only looked up and loaded the first time
+    arxiv_tools.get_paper_context(paper_id, paper=paper)
 
     instructions = [
         "You are made by phidata: https://github.com/phidatahq/phidata",
         f"You are interacting with the user: `{user_id}`",
         f"Your goal is to help the user answer questions about the ArXiv paper `title: {paper_title}` | `name: {paper_id}`",
-        "If the user asks to summarize, use the `get_document_contents` tool to get the first 15000 characters and return a summary of the paper in 3 bullet points or less",
+        "If the user asks to summarize, use the `get_document_contents` tool to get the start of the paper and return a summary of the paper in 3 bullet points or less",
         "The audience has knowledge of the field, so focus on the main contributions and findings of the paper",
         "Mention statistics and significant wins of the paper",
         "If the users asks questions from the paper, use the `search_document` tool.",
@@ -58,7 +57,6 @@ def get_discussion_assistant(
         "Remember: DO NOT SEND AN EMAIL TO THE USER WITHOUT THEM PROVIDING THEIR EMAIL ADDRESS",
         "Make sure your email body is formatted using HTML",
         "Remind the user to check their spam folder if they do not receive the email",
-        "When you use `get_document_contents` tool, get at least 5000 characters so you get the first few pages.",
     ]
 
     return Assistant(
@@ -1,11 +1,11 @@
-from typing import List
-
 import arxiv
 from arxiv import Result as ArxivPaper
 from discord import Client, Message
 from discord.enums import ChannelType
 from discord.threads import Thread
 from arxiv_ai.ls.discuss import get_discussion_assistant
+from arxiv_ai.ls.worker import iterate_blocking, run_blocking, stream_reply, thread_queue
+from arxiv_ai.settings import arxiv_settings
 from utils.log import logger
 
 
@@ -15,7 +15,8 @@ async def discuss(arxiv_url: str, message: Message, client: Client):
     # -*- Get Result from ArXiv
     try:
         paper_id = arxiv_url.split("/")[-1]
-        paper: ArxivPaper = next(arxiv.Client().results(arxiv.Search(id_list=[paper_id])))
+        search = arxiv.Search(id_list=[paper_id])
+        paper: ArxivPaper = await run_blocking(lambda: next(arxiv.Client().results(search)))
     except Exception as e:
         logger.error(e)
         await message.reply("Sorry, could not find this paper.")
@@ -31,14 +32,19 @@ async def discuss(arxiv_url: str, message: Message, client: Client):
     # -*- Create run in the database
     thread_id: int = thread.id
     user_name: str = message.author.name
-    discussion_assistant = get_discussion_assistant(user_id=user_name, thread_id=str(thread_id), paper=paper)
-    if discussion_assistant is None:
-        await message.reply("Sorry, I was not able to create a thread. Please try again.")
-        return
-    discussion_assistant.create_run()
+    # Loading the paper into the knowledge base takes a while, so it runs on the worker pool.
+    # Questions asked in the thread meanwhile wait for it in the thread queue.
+    async with thread_queue.turn(thread_id):
+        discussion_assistant = await run_blocking(
+            get_discussion_assistant, user_id=user_name, thread_id=str(thread_id), paper=paper
+        )
+        if discussion_assistant is None:
+            await message.reply("Sorry, I was not able to create a thread. Please try again.")
+            return
+        await run_blocking(discussion_assistant.create_run)
 
-    # -*- Follow up
-    await thread.send(f"How can I help with: `{paper.title}`")
+        # -*- Follow up
+        await thread.send(f"How can I help with: `{paper.title}`")
 
 
 async def handle_mention(message: Message, client: Client):
@@ -87,13 +93,18 @@ async def handle_message(message: Message, client: Client):
     if thread.owner != client.user:
         return
 
-    if thread_id in client.active_threads:
+    # -*- Requests of a thread are answered one at a time, in order
+    num_requests = thread_queue.num_requests(thread_id)
+    # The first request of the thread is being answered, the others are waiting for it
+    num_waiting = max(num_requests - 1, 0)
+    if num_waiting >= arxiv_settings.arxiv_bot_max_queued:
         await message.reply(
-            "Sorry, I am already working on a request in this thread. Please wait for the current request to finish. And then ask your question."
+            "Sorry, I already have too many questions waiting in this thread. "
+            "Please ask again once I answered them."
         )
         return
-
-    client.active_threads.add(thread_id)
+    if num_requests > 0:
+        await message.reply("I will answer this once I am done with the earlier questions in this thread.")
 
     user_name: str = message.author.name
     user_message: str = message.content
@@ -101,73 +112,18 @@ async def handle_message(message: Message, client: Client):
     channel: str = message.channel.name
     logger.info(f'{user_name} said: "{user_message}" in thread: {channel} ({server})')
 
-    # -*- Start the LLM summarization
-    discussion_assistant = get_discussion_assistant(user_id=user_name, thread_id=str(thread_id))
-
-    try:
-        if discussion_assistant is None:
+    async with thread_queue.turn(thread_id):
+        try:
+            # -*- Start the LLM summarization
+            discussion_assistant = await run_blocking(
+                get_discussion_assistant, user_id=user_name, thread_id=str(thread_id)
+            )
+            if discussion_assistant is None:
+                await message.reply("Sorry, I was not able to process your request. Please start again.")
+                return
+            logger.info(f"Message: {user_message}")
+            response = discussion_assistant.run(message=user_message, stream=True)
+            await stream_reply(message, iterate_blocking(response))
+        except Exception as e:
+            logger.error(e)
             await message.reply("Sorry, I was not able to process your request. Please start again.")
-            client.active_threads.remove(thread_id)
-            return
-        await thread.send("... working")
-        logger.info(f"Message: {user_message}")
-        response = discussion_assistant.run(message=user_message, stream=False)
-
-        if len(response) < 1900:
-            await message.reply(response)
-        else:
-            chunked_response = await chunk_text(response)
-            for chunk in chunked_response:
-                await thread.send(chunk)
-    except Exception as e:
-        logger.error(e)
-        await message.reply("Sorry, I was not able to process your request. Please start again.")
-        client.active_threads.remove(thread_id)
-        return
-
-    client.active_threads.remove(thread_id)
-
-
-async def chunk_text(text, max_length=1900):
-    """
-    Chunk a large text into parts, each not exceeding max_length characters,
-    ensuring each chunk (except the last one) ends with a full stop. This version
-    keeps the original formatting of the input text.
-
-    :param text: The text to be chunked.
-    :param max_length: Maximum length of each chunk.
-    :return: A list of text chunks.
-    """
-    chunks: List = []
-    current_chunk: str = ""
-    current_length: int = 0
-
-    words = text.split(" ")  # Split by space to keep punctuation attached to words
-    for word in words:
-        # Include space in length calculation if current_chunk is not empty
-        word_length_with_space = len(word) + (1 if current_chunk else 0)
-
-        if current_length + word_length_with_space <= max_length:
-            # Add a space before the word if current_chunk is not empty
-            current_chunk += " " + word if current_chunk else word
-            current_length += word_length_with_space
-        else:
-            # End the chunk at the last full stop
-            last_full_stop = current_chunk.rfind(".")
-            if last_full_stop != -1 and current_length != max_length:
-                # Include the sentence ending in the current chunk
-                chunks.append(current_chunk[: last_full_stop + 1])
-                # Start a new chunk with the remaining text and the current word
-                current_chunk = current_chunk[last_full_stop + 1 :].lstrip() + " " + word
-                current_length = len(current_chunk)
-            else:
-                # Add the chunk as is and start a new one
-                chunks.append(current_chunk)
-                current_chunk = word
-                current_length = len(word)
-
-    # Add the last chunk without looking for a full stop
-    if current_chunk:
-        chunks.append(current_chunk)
-
-    return chunks
@@ -7,9 +7,8 @@ from phi.llm.openai import OpenAIChat
 from phi.tools.resend_toolkit import ResendToolkit
 
 from ai.settings import ai_settings
-from arxiv_ai.tools import ArxivTools
+from arxiv_ai.tools import get_arxiv_tools
 from arxiv_ai.storage import latent_space_arxiv_bot_storage
-from utils.log import logger
 
 
 def get_summary_assistant(
@@ -18,34 +17,9 @@ def get_summary_assistant(
     paper: ArxivPaper,
     debug_mode: bool = True,
 ) -> Assistant:
-    paper_details = {
-        "title": paper.title,
-        "entry_id": paper.entry_id,
-        "updated": paper.updated.isoformat() if paper.updated else None,
-        "authors": [author.name for author in paper.authors],
-        "primary_category": paper.primary_category,
-        "categories": paper.categories,
-        "published": paper.published.isoformat() if paper.published else None,
-        "pdf_url": paper.pdf_url,
-        "links": [link.href for link in paper.links],
-        "summary": paper.summary,
-        "comment": paper.comment,
-    }
-
-    arxiv_tools = ArxivTools(user_id="latent_space")
-    try:
-        paper_content = arxiv_tools.get_document_contents(paper.get_short_id(), limit=10000)
-    except Exception as e:
-        logger.error(e)
-        paper_content = ""
-
-    try:
-        if paper_content == "":
-            arxiv_tools.add_arxiv_papers_to_knowledge_base([paper.get_short_id()])
-            paper_content = arxiv_tools.get_document_contents(paper.get_short_id(), limit=10000)
-    except Exception as e:
-        logger.error(e)
-        paper_content = ""
+    arxiv_tools = get_arxiv_tools(user_id="latent_space")
+    # Cached, so the paper is only looked up and loaded the first time
+    paper_context = arxiv_tools.get_paper_context(paper.get_short_id(), paper=paper)
 
     instructions = [
         "You are made by phidata: https://github.com/phidatahq/phidata",
@@ -54,7 +28,7 @@ def get_summary_assistant(
         "Provide your summary in 3 bullet points or less",
         "The audience has knowledge of the field, so focus on the main contributions and findings of the paper",
         "Mention statistics and significant wins of the paper",
-        "You will also be provided with the first 10000 characters of the paper to help you provide a relevant answer",
+        "You will also be provided with the start of the paper to help you provide a relevant answer",
     ]
 
     return Assistant(
@@ -82,7 +56,7 @@ def get_summary_assistant(
             <paper_content>
             {}
             </paper_content>
-            """.format(json.dumps(paper_details, indent=4), paper_content)
+            """.format(json.dumps(paper_context.meta_data, indent=4), paper_context.content)
         ),
         run_data={"paper": {"title": paper.title, "id": paper.get_short_id()}},
     )
@@ -0,0 +1,129 @@
+import asyncio
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from contextlib import asynccontextmanager
+from functools import partial
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional, TypeVar
+
+from discord import Message
+
+from arxiv_ai.settings import arxiv_settings
+from utils.log import logger
+
+T = TypeVar("T")
+
+# Discord rejects messages longer than 2000 characters
+MAX_MESSAGE_LENGTH = 1900
+
+# Runs the blocking assistant and ingest work of the bot, so it never blocks the Discord event loop
+executor = ThreadPoolExecutor(max_workers=arxiv_settings.arxiv_bot_workers, thread_name_prefix="arxiv-bot")
+
+# Returned by next() when a blocking iterator is exhausted
+_END = object()
+
+
+async def run_blocking(fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """Runs a blocking function on the bot executor"""
+    return await asyncio.get_running_loop().run_in_executor(executor, partial(fn, *args, **kwargs))
+
+
+def close_iterator(iterator: Iterator[Any], pending: Optional[Future] = None) -> None:
+    """Closes a blocking iterator once the `next()` call in flight on it returned"""
+    if pending is not None:
+        wait([pending])
+    close = getattr(iterator, "close", None)
+    if close is not None:
+        try:
+            close()
+        except Exception as e:
+            logger.warning(f"Error closing iterator: {e}")
+
+
+async def iterate_blocking(iterator: Iterator[T]) -> AsyncIterator[T]:
+    """Iterates a blocking iterator, like a streaming assistant run, on the bot executor"""
+    pending: Optional[Future] = None
+    try:
+        while True:
+            pending = executor.submit(next, iterator, _END)
+            item = await asyncio.wrap_future(pending)
+            if item is _END:
+                break
+            yield item
+    finally:
+        # A cancelled await leaves next() running in its thread, a generator cannot be closed meanwhile
+        await asyncio.wrap_future(executor.submit(close_iterator, iterator, pending))
+
+
+class ThreadQueue:
+    """Runs the requests of each Discord thread one at a time, in the order they arrive.
+
+    Only used from the event loop thread, so the counters need no locking.
+    """
+
+    def __init__(self):
+        self._locks: Dict[int, asyncio.Lock] = {}
+        self._num_requests: Dict[int, int] = {}
+
+    def num_requests(self, thread_id: int) -> int:
+        """Returns the number of requests running or waiting in the thread"""
+        return self._num_requests.get(thread_id, 0)
+
+    @asynccontextmanager
+    async def turn(self, thread_id: int) -> AsyncIterator[None]:
+        """Waits until the earlier requests of the thread are done"""
+        lock = self._locks.setdefault(thread_id, asyncio.Lock())
+        self._num_requests[thread_id] = self.num_requests(thread_id) + 1
+        try:
+            async with lock:
+                yield
+        finally:
+            self._num_requests[thread_id] -= 1
+            if self._num_requests[thread_id] == 0:
+                del self._num_requests[thread_id]
+                del self._locks[thread_id]
+
+
+thread_queue = ThreadQueue()
+
+
+def split_message(text: str, max_length: int = MAX_MESSAGE_LENGTH) -> List[str]:
+    """Splits `text` into parts of at most `max_length` characters, at line or sentence ends if possible"""
+    parts = []
+    while len(text) > max_length:
+        split_at = text.rfind("\n", 0, max_length)
+        if split_at <= 0:
+            split_at = text.rfind(". ", 0, max_length) + 1
+        if split_at <= 0:
+            split_at = max_length
+        parts.append(text[:split_at])
+        text = text[split_at:].lstrip()
+    return parts + [text]
+
+
+async def stream_reply(message: Message, deltas: AsyncIterator[str], placeholder: str = "... working") -> str:
+    """Replies to `message` with the text of `deltas`, editing the reply as the text arrives.
+
+    The reply is edited at most every `arxiv_bot_edit_interval` seconds to stay within the
+    Discord rate limits, and continues in new messages when it grows past the message length limit.
+
+    Returns:
+        str: The full text.
+    """
+    reply: Message = await message.reply(placeholder)
+    response = ""
+    # Text of the current reply message
+    text = ""
+    last_edit = time.monotonic()
+    async for delta in deltas:
+        response += delta
+        text += delta
+        parts = split_message(text)
+        for part in parts[:-1]:
+            await reply.edit(content=part)
+            reply = await message.channel.send(placeholder)
+        text = parts[-1]
+        if text.strip() and time.monotonic() - last_edit >= arxiv_settings.arxiv_bot_edit_interval:
+            await reply.edit(content=text)
+            last_edit = time.monotonic()
+    await reply.edit(content=text if text.strip() else "Sorry, I do not have an answer for that.")
+    return response
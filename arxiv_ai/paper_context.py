@@ -0,0 +1,94 @@
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from arxiv_ai.settings import arxiv_settings
+
+######################################################
+## Cache of the papers discussed by the assistants
+######################################################
+
+# (user_id, paper_id), papers are loaded into the knowledge bases of a user
+PaperKey = Tuple[str, str]
+
+
+@dataclass
+class PaperContext:
+    paper_id: str
+    title: Optional[str] = None
+    # The arXiv metadata of the paper, like its authors, categories and summary
+    meta_data: Dict[str, Any] = field(default_factory=dict)
+    # The metadata, abstract and start of the paper, as returned by `ArxivTools.get_document_contents`
+    content: str = ""
+    # True if the paper is in the knowledge base
+    ingested: bool = False
+
+
+class PaperContextCache:
+    """Bounded LRU cache of the context of arXiv papers, and of the paper discussed in each thread.
+
+    A paper found in the knowledge base stays cached until it is evicted or loaded again.
+    A paper that could not be loaded is retried after `retry_after` seconds, so a failing paper
+    is not downloaded again on every message.
+    """
+
+    def __init__(self, max_size: int, retry_after: float):
+        self.max_size = max_size
+        self.retry_after = retry_after
+        self._papers: "OrderedDict[PaperKey, Tuple[float, PaperContext]]" = OrderedDict()
+        self._threads: "OrderedDict[str, Tuple[str, Optional[str]]]" = OrderedDict()
+        self._loading = [threading.Lock() for _ in range(64)]
+        self._lock = threading.Lock()
+
+    def get(self, key: PaperKey) -> Optional[PaperContext]:
+        """Returns the cached context of a paper, None if missing or due for a retry"""
+        with self._lock:
+            entry = self._papers.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.monotonic():
+                del self._papers[key]
+                return None
+            self._papers.move_to_end(key)
+            return entry[1]
+
+    def put(self, key: PaperKey, context: PaperContext) -> None:
+        expires_at = float("inf") if context.ingested else time.monotonic() + self.retry_after
+        with self._lock:
+            self._papers[key] = (expires_at, context)
+            self._papers.move_to_end(key)
+            while len(self._papers) > self.max_size:
+                self._papers.popitem(last=False)
+
+    def invalidate(self, user_id: str, paper_ids: Iterable[str]) -> None:
+        """Drops the cached context of papers that were just loaded"""
+        with self._lock:
+            for paper_id in paper_ids:
+                self._papers.pop((user_id, paper_id), None)
+
+    def loading(self, key: PaperKey) -> threading.Lock:
+        """Returns the lock held while the context of a paper is built, so a paper is loaded once"""
+        return self._loading[hash(key) % len(self._loading)]
+
+    def get_thread_paper(self, thread_id: str) -> Optional[Tuple[str, Optional[str]]]:
+        """Returns the id and title of the paper discussed in a thread, None if unknown"""
+        with self._lock:
+            paper = self._threads.get(thread_id)
+            if paper is not None:
+                self._threads.move_to_end(thread_id)
+            return paper
+
+    def set_thread_paper(self, thread_id: str, paper_id: str, title: Optional[str]) -> None:
+        with self._lock:
+            self._threads[thread_id] = (paper_id, title)
+            self._threads.move_to_end(thread_id)
+            while len(self._threads) > self.max_size:
+                self._threads.popitem(last=False)
+
+
+paper_context_cache = PaperContextCache(
+    max_size=arxiv_settings.arxiv_context_cache_size,
+    retry_after=arxiv_settings.arxiv_context_retry_after,
+)
@@ -0,0 +1,35 @@
+from pydantic_settings import BaseSettings
+
+
+class ArxivSettings(BaseSettings):
+    """ArXiv settings that can be set using environment variables.
+
+    Reference: https://docs.pydantic.dev/latest/usage/pydantic_settings/
+    """
+
+    # Number of papers downloaded at the same time
+    arxiv_download_workers: int = 4
+    # Number of processes extracting the text of downloaded papers
+    arxiv_extract_workers: int = 2
+    # Number of documents embedded per API request and written per statement
+    arxiv_batch_size: int = 100
+    # Maximum number of tokens of a chunk of a paper
+    arxiv_chunk_tokens: int = 400
+    # Number of tokens a chunk repeats from the previous chunk of the same section
+    arxiv_chunk_overlap_tokens: int = 50
+    # Number of tokens of a paper (its metadata, abstract and start) given to the assistants as its content
+    arxiv_context_tokens: int = 3000
+    # Number of papers whose context is kept in memory by the assistants
+    arxiv_context_cache_size: int = 256
+    # Seconds before loading a paper that failed to load is tried again
+    arxiv_context_retry_after: float = 60
+    # Number of requests of the Discord bot running at the same time, across all threads
+    arxiv_bot_workers: int = 8
+    # Number of requests of a Discord thread waiting for the one running, more are turned down
+    arxiv_bot_max_queued: int = 3
+    # Seconds between edits of a reply streamed by the Discord bot
+    arxiv_bot_edit_interval: float = 1.0
+
+
+# Create ArxivSettings object
+arxiv_settings = ArxivSettings()
@@ -1,16 +1,21 @@
 import json
+from dataclasses import replace
+from functools import lru_cache
 from typing import List, Optional
-from pathlib import Path
 
 import arxiv
-from pypdf import PdfReader
 from phi.document import Document
 from phi.tools import ToolRegistry
 from phi.knowledge import AssistantKnowledge
 from phi.vectordb.pgvector import PgVector2
 
+from ai.catalog import list_catalog
+from ai.context import pack_documents
+from ai.search import read_contents, search_documents
+from arxiv_ai.ingest import get_paper_details, load_papers
 from arxiv_ai.knowledge import get_arxiv_knowledge_base_for_user, get_arxiv_summary_knowledge_base_for_user
-from workspace.settings import ws_settings
+from arxiv_ai.paper_context import PaperContext, paper_context_cache
+from arxiv_ai.settings import arxiv_settings
 from utils.log import logger
 
 
@@ -24,15 +29,12 @@ class ArxivTools(ToolRegistry):
             user_id=user_id
         )
         self.knowledge_base: AssistantKnowledge = get_arxiv_knowledge_base_for_user(user_id=user_id)
-        self.storage_dir: Path = ws_settings.ws_root.joinpath(ws_settings.storage_dir)
         self.register(self.add_arxiv_papers_to_knowledge_base)
         self.register(self.search_arxiv_and_add_to_knowledge_base)
         self.register(self.get_document_summaries)
         self.register(self.search_document)
         self.register(self.get_document_contents)
         self.register(self.get_document_titles)
-        if not self.storage_dir.exists():
-            self.storage_dir.mkdir(parents=True, exist_ok=True)
 
     def add_arxiv_papers_to_knowledge_base(self, id_list: List[str]) -> str:
         """
@@ -47,80 +49,18 @@ class ArxivTools(ToolRegistry):
         """
         logger.debug(f"Searching arxiv for: {id_list}")
 
-        all_result_documents = []
-        document_summaries = []
-        for result in self.client.results(search=arxiv.Search(id_list=id_list)):
-            try:
-                result_documents = []
-                meta_data = {
-                    "title": result.title,
-                    "name": result.get_short_id(),
-                    "entry_id": result.entry_id,
-                    "updated": result.updated.isoformat() if result.updated else None,
-                    "authors": [author.name for author in result.authors],
-                    "primary_category": result.primary_category,
-                    "categories": result.categories,
-                    "published": result.published.isoformat() if result.published else None,
-                    "pdf_url": result.pdf_url,
-                    "links": [link.href for link in result.links],
-                }
-
-                document_summary = meta_data.copy()
-                document_summary["summary"] = result.summary
-                document_summary["comment"] = result.comment
-                document_summaries.append(
-                    Document(
-                        id=result.get_short_id(),
-                        name=result.get_short_id(),
-                        meta_data=meta_data,
-                        content=json.dumps(document_summary),
-                    )
-                )
-
-                result_documents.append(
-                    Document(
-                        id=result.get_short_id(),
-                        name=result.get_short_id(),
-                        meta_data=meta_data,
-                        content=json.dumps(document_summary),
-                    )
-                )
-                if result.pdf_url:
-                    logger.info(f"Downloading: {result.pdf_url}")
-                    pdf_path = result.download_pdf(dirpath=str(self.storage_dir))
-                    logger.info(f"Downloaded: {pdf_path}")
-                    pdf_reader = PdfReader(pdf_path)
-                    for page_number, page in enumerate(pdf_reader.pages, start=1):
-                        _page_content = page.extract_text()
-                        if _page_content:
-                            _meta_data = meta_data.copy()
-                            _meta_data["page"] = page_number
-                            _id = f"{result.get_short_id()}__{page_number}"
-                            result_documents.append(
-                                Document(
-                                    id=_id,
-                                    name=result.get_short_id(),
-                                    meta_data=_meta_data,
-                                    content=_page_content,
-                                )
-                            )
-
-                if result_documents:
-                    all_result_documents.extend(result_documents)
-            except Exception as e:
-                logger.error(f"Error creating document for paper {result.entry_id}: {e}")
-
-        logger.info(f"Found {len(document_summaries)} results for: {id_list}")
         try:
-            logger.info(f"Loading {len(all_result_documents)} documents for id_list: {id_list}")
-            self.knowledge_base.load_documents(all_result_documents, upsert=True)
-
-            logger.info(f"Loading {len(document_summaries)} document summaries for id_list: {id_list}")
-            self.summary_knowledge_base.load_documents(document_summaries, upsert=True)
+            document_summaries = load_papers(
+                self.client.results(search=arxiv.Search(id_list=id_list)),
+                knowledge_base=self.knowledge_base,
+                summary_knowledge_base=self.summary_knowledge_base,
+            )
         except Exception as e:
             logger.error(f"Error loading documents for id_list: {id_list}: {e}")
             return f"Error loading documents for id: {id_list}: {e}"
 
+        paper_context_cache.invalidate(self.user_id, [doc.name for doc in document_summaries])
+        logger.info(f"Loaded {len(document_summaries)} results for: {id_list}")
         return json.dumps([doc.to_dict() for doc in document_summaries])
 
     def search_arxiv_and_add_to_knowledge_base(self, query: str, num_results: int = 5) -> str:
@@ -135,87 +75,25 @@ class ArxivTools(ToolRegistry):
         """
         logger.debug(f"Searching arxiv for: {query}")
 
-        all_result_documents = []
-        document_summaries = []
-        for result in self.client.results(
-            search=arxiv.Search(
-                query=query,
-                max_results=num_results,
-                sort_by=arxiv.SortCriterion.Relevance,
-                sort_order=arxiv.SortOrder.Descending,
-            )
-        ):
-            try:
-                result_documents = []
-                meta_data = {
-                    "title": result.title,
-                    "name": result.get_short_id(),
-                    "entry_id": result.entry_id,
-                    "updated": result.updated.isoformat() if result.updated else None,
-                    "authors": [author.name for author in result.authors],
-                    "primary_category": result.primary_category,
-                    "categories": result.categories,
-                    "published": result.published.isoformat() if result.published else None,
-                    "pdf_url": result.pdf_url,
-                    "links": [link.href for link in result.links],
-                }
-
-                document_summary = meta_data.copy()
-                document_summary["summary"] = result.summary
-                document_summary["comment"] = result.comment
-                document_summaries.append(
-                    Document(
-                        id=result.get_short_id(),
-                        name=result.get_short_id(),
-                        meta_data=meta_data,
-                        content=json.dumps(document_summary),
-                    )
-                )
-
-                result_documents.append(
-                    Document(
-                        id=result.get_short_id(),
-                        name=result.get_short_id(),
-                        meta_data=meta_data,
-                        content=json.dumps(document_summary),
-                    )
-                )
-                if result.pdf_url:
-                    logger.info(f"Downloading: {result.pdf_url}")
-                    pdf_path = result.download_pdf(dirpath=str(self.storage_dir))
-                    logger.info(f"Downloaded: {pdf_path}")
-                    pdf_reader = PdfReader(pdf_path)
-                    for page_number, page in enumerate(pdf_reader.pages, start=1):
-                        _page_content = page.extract_text()
-                        if _page_content:
-                            _meta_data = meta_data.copy()
-                            _meta_data["page"] = page_number
-                            _id = f"{result.get_short_id()}__{page_number}"
-                            result_documents.append(
-                                Document(
-                                    id=_id,
-                                    name=result.get_short_id(),
-                                    meta_data=_meta_data,
-                                    content=_page_content,
-                                )
-                            )
-
-                if result_documents:
-                    all_result_documents.extend(result_documents)
-            except Exception as e:
-                logger.error(f"Error creating document for paper {result.entry_id}: {e}")
-
-        logger.info(f"Found {len(document_summaries)} results for: {query}")
         try:
-            logger.info(f"Loading {len(all_result_documents)} documents for query: {query}")
-            self.knowledge_base.load_documents(all_result_documents, upsert=True)
-
-            logger.info(f"Loading {len(document_summaries)} document summaries for query: {query}")
-            self.summary_knowledge_base.load_documents(document_summaries, upsert=True)
+            document_summaries = load_papers(
+                self.client.results(
+                    search=arxiv.Search(
+                        query=query,
+                        max_results=num_results,
+                        sort_by=arxiv.SortCriterion.Relevance,
+                        sort_order=arxiv.SortOrder.Descending,
+                    )
+                ),
+                knowledge_base=self.knowledge_base,
+                summary_knowledge_base=self.summary_knowledge_base,
+            )
         except Exception as e:
             logger.error(f"Error loading documents for query: {query}: {e}")
             return f"Error loading documents for query: {query}: {e}"
 
+        paper_context_cache.invalidate(self.user_id, [doc.name for doc in document_summaries])
+        logger.info(f"Loaded {len(document_summaries)} results for: {query}")
         return json.dumps([doc.to_dict() for doc in document_summaries])
 
     def get_document_summaries(self, query: str, limit: int = 10) -> Optional[str]:
@@ -237,41 +115,45 @@ class ArxivTools(ToolRegistry):
             logger.error(f"Error getting summaries for query: {query}: {e}")
             return "No documents found for query: {query}"
 
-    def search_document(self, query: str, document_name: str, num_documents: int = 5) -> Optional[str]:
+    def search_document(
+        self, query: str, document_name: str, num_documents: int = 10, max_tokens: int = 2000
+    ) -> Optional[str]:
         """Use this function to search a particular arXiv document with name=document_name for a query.
 
         Args:
             query (str): Query to search for
             document_name (str): Name of the document to search
-            num_documents (int): Number of results to return. Defaults to 5.
+            num_documents (int): Number of results to consider. Defaults to 10.
+            max_tokens (int): Maximum number of tokens to return. Defaults to 2000.
 
         Returns:
-            str: JSON string of the search results
+            str: The most relevant parts of the document that fit in `max_tokens`, in reading order
         """
 
         logger.debug(f"Searching document {document_name} for query: {query}")
         if self.knowledge_base.vector_db is None or not isinstance(self.knowledge_base.vector_db, PgVector2):
             return "Sorry could not search latest document"
 
-        search_results: List[Document] = self.knowledge_base.vector_db.search(
-            query=query, limit=num_documents, filters={"name": document_name}
+        vector_db: PgVector2 = self.knowledge_base.vector_db
+        search_results: List[Document] = search_documents(
+            vector_db, query=query, limit=num_documents, where=[vector_db.table.c.name == document_name]
         )
         logger.debug(f"Search result: {search_results}")
 
         if len(search_results) == 0:
             return f"Sorry could not find any results from document: {document_name}"
 
-        return json.dumps([doc.to_dict() for doc in search_results])
+        return pack_documents(search_results, max_tokens=max_tokens)
 
-    def get_document_contents(self, document_name: str, limit: int = 10000) -> Optional[str]:
+    def get_document_contents(self, document_name: str, max_tokens: int = 3000) -> Optional[str]:
         """Use this function to get the content of a particular arXiv document with name=document_name.
 
         Args:
             document_name (str): Name of the document to search. Eg: "1706.03762v7"
-            limit (int): Maximum number of characters to return. Defaults to 10000.
+            max_tokens (int): Maximum number of tokens to return. Defaults to 3000.
 
         Returns:
-            str: JSON string of the document contents
+            str: The metadata, abstract and start of the document that fit in `max_tokens`
         """
 
         logger.debug(f"Getting document contents: {document_name}")
@@ -279,21 +161,11 @@ class ArxivTools(ToolRegistry):
             return "Vector DB not found."
 
         vector_db: PgVector2 = self.knowledge_base.vector_db
-        table = vector_db.table
         try:
-            with vector_db.Session() as session, session.begin():
-                document_query = (
-                    session.query(table)
-                    .filter(table.c.name == document_name)
-                    .order_by(table.c.created_at.desc())
-                )
-                document_result = session.execute(document_query)
-                document_rows = document_result.fetchall()
-                document_content = ""
-                for document_row in document_rows:
-                    document_content += document_row.content
-
-                return document_content[:limit]
+            document_content = read_contents(
+                vector_db, where=[vector_db.table.c.name == document_name], max_tokens=max_tokens
+            )
+            return document_content or ""
         except Exception as e:
             logger.error(f"Error getting document contents: {e}")
             logger.error("Table might not exist, creating for future use")
@@ -315,22 +187,52 @@ class ArxivTools(ToolRegistry):
             return "No documents found in the knowledge base."
 
         vector_db: PgVector2 = self.knowledge_base.vector_db
-        table = vector_db.table
-        with vector_db.Session() as session, session.begin():
-            try:
-                query = session.query(table).distinct(table.c.name).limit(limit)
-                result = session.execute(query)
-                rows = result.fetchall()
-
-                if rows is None:
-                    return "Sorry could not find any documents"
-
-                document_titles = []
-                for row in rows:
-                    document_title = row.meta_data["title"]
-                    document_titles.append(document_title)
-
-                return json.dumps(document_titles)
-            except Exception as e:
-                logger.error(f"Error getting document names: {e}")
-                return "No documents found in the knowledge base."
+        try:
+            document_titles = [entry["title"] for entry in list_catalog(vector_db, limit=limit)]
+            return json.dumps(document_titles)
+        except Exception as e:
+            logger.error(f"Error getting document names: {e}")
+            return "No documents found in the knowledge base."
+
+    def get_paper_context(self, paper_id: str, paper: Optional[arxiv.Result] = None) -> PaperContext:
+        """Returns the metadata and start of a paper, loading it into the knowledge base if needed.
+
+        Contexts are cached, so once a paper is loaded this does not query the database.
+
+        Args:
+            paper_id (str): The id of the paper. Eg: "1706.03762v7"
+            paper (arxiv.Result): (optional) The paper, its metadata is added to the context.
+
+        Returns:
+            PaperContext: The context of the paper, `ingested` is False if it could not be loaded.
+        """
+        key = (self.user_id, paper_id)
+        context = paper_context_cache.get(key)
+        if context is None:
+            with paper_context_cache.loading(key):
+                context = paper_context_cache.get(key)
+                if context is None:
+                    context = self._load_paper_context(paper_id)
+                    paper_context_cache.put(key, context)
+        if paper is not None and not context.meta_data:
+            context = replace(context, title=paper.title, meta_data=get_paper_details(paper))
+            paper_context_cache.put(key, context)
+        return context
+
+    def _load_paper_context(self, paper_id: str) -> PaperContext:
+        max_tokens = arxiv_settings.arxiv_context_tokens
+        paper_content = ""
+        try:
+            paper_content = self.get_document_contents(paper_id, max_tokens=max_tokens) or ""
+            if paper_content == "":
+                self.add_arxiv_papers_to_knowledge_base([paper_id])
+                paper_content = self.get_document_contents(paper_id, max_tokens=max_tokens) or ""
+        except Exception as e:
+            logger.error(f"Error loading paper {paper_id}: {e}")
+        return PaperContext(paper_id=paper_id, content=paper_content, ingested=paper_content != "")
+
+
+@lru_cache
+def get_arxiv_tools(user_id: str) -> ArxivTools:
+    """Returns the ArxivTools of a user, shared by all the assistants of the user"""
+    return ArxivTools(user_id=user_id)
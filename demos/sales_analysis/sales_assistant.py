@@ -5,6 +5,7 @@ from phi.knowledge.combined import CombinedKnowledgeBase
 from phi.vectordb.pgvector import PgVector2
 from phi.storage.assistant.postgres import PgAssistantStorage
 
+from ai.index import get_vector_index
 from db.session import db_url
 from workspace.settings import ws_settings
 
@@ -17,9 +18,12 @@ sales_ai_knowledge_base = CombinedKnowledgeBase(
         JSONKnowledgeBase(path=sales_knowledge_dir),
     ],
     # Store the knowledge in `ai.sales_knowledge`
-    vector_db=PgVector2(collection="sales_knowledge", db_url=db_url),
+    vector_db=PgVector2(
+        collection="sales_knowledge", db_url=db_url, index=get_vector_index("sales_knowledge")
+    ),
 )
 sales_ai_knowledge_base.load(recreate=False)
+# The index is built outside of imports: python -m ai.index sales_knowledge --refresh
 
 sales_ai_storage = PgAssistantStorage(table_name="sales_assistant", db_url=db_url)
 
@@ -1,11 +1,33 @@
-from typing import Optional
+from array import array
+from typing import Any, Dict, List, Optional, Tuple
 import asyncio
 import datetime
 import json
+import sys
+import threading
+import time
 from urllib.parse import urljoin
 
 import requests
 import aiohttp
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from hn_ai.cache import ItemCache
+
+# HTTP status codes worth retrying: rate limiting and transient server errors
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+
+class FetchFailed:
+    """Marks a request that failed after all retries, unlike None for an id that does not exist"""
+
+    def __repr__(self):
+        return "FETCH_FAILED"
+
+
+# Passed as `failed` to tell failed requests apart from ids that do not exist
+FETCH_FAILED = FetchFailed()
 
 
 class InvalidItemID(Exception):
@@ -25,11 +47,64 @@ class HTTPError(Exception):
 
 
 class HackerNews:
-    def __init__(self):
+    def __init__(
+        self,
+        max_concurrency: int = 50,
+        max_retries: int = 3,
+        backoff_factor: float = 0.5,
+        timeout: float = 10.0,
+        keepalive_timeout: float = 30.0,
+        cache: Optional[ItemCache] = None,
+        cache_sync_interval: Optional[float] = 60.0,
+    ):
+        """
+        Args:
+            max_concurrency (int): Maximum number of requests in flight at once.
+            max_retries (int): Number of times a failed request is retried.
+            backoff_factor (float): Retry `n` sleeps for `backoff_factor * 2 ** n` seconds.
+            timeout (float): Total timeout in seconds for a single request.
+            keepalive_timeout (float): Seconds an idle pooled connection is kept open.
+            cache (ItemCache): (optional) Cache for items and users.
+            cache_sync_interval (float): Seconds between invalidating cached entries
+                using the `updates` feed. None disables the automatic sync.
+        """
         self.base_url = "https://hacker-news.firebaseio.com/v0/"
         self.item_url = urljoin(self.base_url, "item/")
         self.user_url = urljoin(self.base_url, "user/")
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.timeout = timeout
+        self.keepalive_timeout = keepalive_timeout
+        self.cache = cache
+        self.cache_sync_interval = cache_sync_interval
+        self._cache_synced_at: float = time.monotonic()
+
         self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_maxsize=max_concurrency,
+            max_retries=Retry(
+                total=max_retries,
+                backoff_factor=backoff_factor,
+                status_forcelist=RETRY_STATUS_CODES,
+                allowed_methods=["GET"],
+                # Return the last response once retries run out, so it raises HTTPError below
+                raise_on_status=False,
+            ),
+        )
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        # Sync callers share one long-lived event loop running in a daemon thread,
+        # so the aiohttp connection pool survives between calls.
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread: Optional[threading.Thread] = None
+        self._loop_lock = threading.Lock()
+        # aiohttp sessions are bound to the loop they were created on,
+        # so keep one pooled session and in-flight limit per event loop.
+        self._async_sessions: Dict[
+            asyncio.AbstractEventLoop, Tuple[aiohttp.ClientSession, asyncio.Semaphore]
+        ] = {}
 
     def _get_sync(self, url):
         """Internal method used for GET requests
@@ -43,58 +118,220 @@ class HackerNews:
         Raises:
           HTTPError: If HTTP request failed.
         """
-        response = self.session.get(url)
+        response = self.session.get(url, timeout=self.timeout)
         if response.status_code == requests.codes.ok:
             return response.json()
         else:
             raise HTTPError
 
-    async def _get_async(self, url, session):
+    @staticmethod
+    def _close_orphaned_session(session: aiohttp.ClientSession) -> None:
+        """Closes a session whose event loop was closed.
+
+        Transports close their socket through their event loop, which a closed loop cannot do, and
+        `ClientSession.detach()` only drops the connector. So the sockets of the pooled connections
+        are closed directly, which relies on aiohttp's `_conns` and asyncio's `TransportSocket._sock`.
+        The transports can still emit a ResourceWarning when they are collected, their sockets are closed.
+        """
+        connector = session.connector
+        if connector is not None:
+            for connections in list(getattr(connector, "_conns", {}).values()):
+                for protocol, _ in connections:
+                    transport = protocol.transport
+                    sock = transport.get_extra_info("socket") if transport is not None else None
+                    if getattr(sock, "_sock", None) is not None:
+                        sock._sock.close()
+            # Marks the connector closed, on a closed loop it does not touch the transports
+            connector._close()
+        session.detach()
+
+    def _prune_async_sessions(self) -> None:
+        """Closes the sessions of event loops that were closed, like the loop of a finished `asyncio.run`"""
+        for loop, (session, _) in list(self._async_sessions.items()):
+            if loop.is_closed() and self._async_sessions.pop(loop, None) is not None:
+                self._close_orphaned_session(session)
+
+    def _get_async_session(self) -> Tuple[aiohttp.ClientSession, asyncio.Semaphore]:
+        """Returns the pooled aiohttp session and in-flight semaphore for the running event loop"""
+        loop = asyncio.get_running_loop()
+        self._prune_async_sessions()
+        state = self._async_sessions.get(loop)
+        if state is None or state[0].closed:
+            connector = aiohttp.TCPConnector(
+                ssl=False,
+                limit=self.max_concurrency,
+                keepalive_timeout=self.keepalive_timeout,
+            )
+            session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+            )
+            state = (session, asyncio.Semaphore(self.max_concurrency))
+            self._async_sessions[loop] = state
+        return state
+
+    async def _get_async(self, url, failed=None):
         """Asynchronous internal method used for GET requests
 
+        Requests are retried with exponential backoff on connection errors,
+        timeouts and retryable status codes.
+
         Args:
             url (str): URL to fetch
-            session (obj): aiohttp client session for async loop
+            failed (obj): Returned if the request failed, None by default
 
         Returns:
-            data (obj): Individual URL request's response corountine
+            data (obj): Individual URL request's response, `failed` if the request failed
 
         """
-        data = None
-        async with session.get(url) as resp:
-            if resp.status == 200:
-                data = await resp.json()
-        return data
-
-    async def _async_loop(self, urls):
+        session, semaphore = self._get_async_session()
+        for attempt in range(self.max_retries + 1):
+            async with semaphore:
+                try:
+                    async with session.get(url) as resp:
+                        if resp.status == 200:
+                            return await resp.json()
+                        if resp.status not in RETRY_STATUS_CODES:
+                            return failed
+                except (aiohttp.ClientError, asyncio.TimeoutError):
+                    pass
+            # Sleep outside the semaphore so a backing-off request does not hold a slot
+            if attempt < self.max_retries:
+                await asyncio.sleep(self.backoff_factor * (2**attempt))
+        return failed
+
+    async def _async_loop(self, urls, failed=None):
         """Asynchronous internal method used to request multiple URLs
 
         Args:
             urls (list): URLs to fetch
+            failed (obj): Returned for each request that failed, None by default
 
         Returns:
-            responses (obj): All URL requests' response coroutines
+            responses (obj): All URL requests' responses
 
         """
-        results = []
-        async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(ssl=False)) as session:
-            for url in urls:
-                result = asyncio.ensure_future(self._get_async(url, session))
-                results.append(result)
-            responses = await asyncio.gather(*results)
-        return responses
-
-    def _run_async(self, urls):
-        """Asynchronous event loop execution
+        return await asyncio.gather(*[self._get_async(url, failed=failed) for url in urls])
+
+    def _get_loop(self) -> asyncio.AbstractEventLoop:
+        """Returns the background event loop used by sync callers, starting it if needed"""
+        with self._loop_lock:
+            if self._loop is None or self._loop.is_closed():
+                self._loop = asyncio.new_event_loop()
+                self._loop_thread = threading.Thread(
+                    target=self._loop.run_forever, name="hackernews-client", daemon=True
+                )
+                self._loop_thread.start()
+            return self._loop
+
+    def _run_async(self, urls, failed=None):
+        """Runs the asynchronous requests on the shared background event loop
+
+        Safe to call from sync code. Also works from code running inside an event loop, but it blocks
+        that loop until the requests are done, so async callers should await the `a*` coroutine
+        methods instead.
 
         Args:
             urls (list): URLs to fetch
+            failed (obj): Returned for each request that failed, None by default
 
         Returns:
             results (obj): All URL requests' responses
 
         """
-        return asyncio.run(self._async_loop(urls))
+        coroutine = self._async_loop(urls, failed=failed)
+        return asyncio.run_coroutine_threadsafe(coroutine, self._get_loop()).result()
+
+    async def aclose(self):
+        """Closes the pooled aiohttp session bound to the running event loop"""
+        state = self._async_sessions.pop(asyncio.get_running_loop(), None)
+        if state is not None:
+            await state[0].close()
+
+    def close(self):
+        """Closes all pooled connections and stops the background event loop"""
+        with self._loop_lock:
+            loop, thread = self._loop, self._loop_thread
+            self._loop, self._loop_thread = None, None
+        if loop is not None and not loop.is_closed():
+            asyncio.run_coroutine_threadsafe(self.aclose(), loop).result()
+            loop.call_soon_threadsafe(loop.stop)
+            if thread is not None:
+                thread.join()
+            loop.close()
+        self.session.close()
+
+    def _cached_lookup(self, key_fn, ids) -> Tuple[Dict[str, dict], List]:
+        """Returns the cached responses by cache key and the ids missing from the cache"""
+        if self.cache is None:
+            return {}, list(ids)
+        keys = [key_fn(i) for i in ids]
+        cached = self.cache.get_many(keys)
+        return cached, [i for i, key in zip(ids, keys) if key not in cached]
+
+    def _merge_cached(self, key_fn, ids, cached, missing, results) -> List[dict]:
+        """Caches freshly fetched responses and returns all responses in the order of `ids`"""
+        fetched = {key_fn(i): r for i, r in zip(missing, results) if r}
+        if self.cache is not None and len(fetched) > 0:
+            self.cache.set_many(fetched)
+        cached.update(fetched)
+        return [cached[key_fn(i)] for i in ids if key_fn(i) in cached]
+
+    def _get_one(self, base_url, key_fn, id_):
+        """Returns a single item or user response, using the cache if available"""
+        self._maybe_sync_cache()
+        if self.cache is not None:
+            cached = self.cache.get(key_fn(id_))
+            if cached is not None:
+                return cached
+        response = self._get_sync(urljoin(base_url, f"{id_}.json"))
+        if response and self.cache is not None:
+            self.cache.set(key_fn(id_), response)
+        return response
+
+    def _get_many(self, base_url, key_fn, ids) -> List[dict]:
+        """Returns item or user responses for `ids`, only fetching the ones missing from the cache"""
+        self._maybe_sync_cache()
+        ids = list(ids)
+        cached, missing = self._cached_lookup(key_fn, ids)
+        results = self._run_async([urljoin(base_url, f"{i}.json") for i in missing]) if missing else []
+        return self._merge_cached(key_fn, ids, cached, missing, results)
+
+    def _invalidate_updates(self, updates) -> None:
+        """Removes the items and users listed in an `updates` feed response from the cache"""
+        if self.cache is not None:
+            self.cache.invalidate(
+                [ItemCache.item_key(i) for i in updates.get("items", [])]
+                + [ItemCache.user_key(u) for u in updates.get("profiles", [])]
+            )
+        self._cache_synced_at = time.monotonic()
+
+    def _cache_sync_due(self) -> bool:
+        return (
+            self.cache is not None
+            and self.cache_sync_interval is not None
+            and time.monotonic() - self._cache_synced_at > self.cache_sync_interval
+        )
+
+    def _maybe_sync_cache(self) -> None:
+        if self._cache_sync_due():
+            try:
+                self.sync_cache()
+            except Exception:
+                # Entries still expire through the TTL if the feed is unavailable
+                self._cache_synced_at = time.monotonic()
+
+    def sync_cache(self):
+        """Invalidates cached items and users that the `updates` feed reports as changed"""
+        self._invalidate_updates(self.updated_ids())
+
+    def get_story_ids(self, page, limit=None):
+        """Returns the ids of a story category like 'topstories' without fetching the stories
+
+        The URL is: https://hacker-news.firebaseio.com/v0/<story_name>.json
+        """
+        url = urljoin(self.base_url, f"{page}.json")
+        return self._get_sync(url)[:limit]
 
     def _get_stories(self, page, limit):
         """
@@ -114,8 +351,7 @@ class HackerNews:
         e.g. https://hacker-news.firebaseio.com/v0/item/69696969.json
 
         """
-        url = urljoin(self.base_url, f"{page}.json")
-        story_ids = self._get_sync(url)[:limit]
+        story_ids = self.get_story_ids(page, limit)
         return self.get_items_by_ids(item_ids=story_ids)
 
     def get_item(self, item_id, expand=False):
@@ -139,8 +375,7 @@ class HackerNews:
           InvalidItemID: If corresponding Hacker News story does not exist.
 
         """
-        url = urljoin(self.item_url, f"{item_id}.json")
-        response = self._get_sync(url)
+        response = self._get_one(self.item_url, ItemCache.item_key, item_id)
 
         if not response:
             raise InvalidItemID
@@ -166,9 +401,8 @@ class HackerNews:
             List of `Item` objects for given item IDs and given item type
 
         """
-        urls = [urljoin(self.item_url, f"{i}.json") for i in item_ids]
-        result = self._run_async(urls=urls)
-        items = [Item(r) for r in result if r]
+        result = self._get_many(self.item_url, ItemCache.item_key, item_ids)
+        items = [Item(r) for r in result]
         if item_type:
             return [item for item in items if item.item_type == item_type]
         else:
@@ -194,8 +428,7 @@ class HackerNews:
           InvalidUserID: If no such user exists on Hacker News.
 
         """
-        url = urljoin(self.user_url, f"{user_id}.json")
-        response = self._get_sync(url)
+        response = self._get_one(self.user_url, ItemCache.user_key, user_id)
 
         if not response:
             raise InvalidUserID
@@ -219,9 +452,8 @@ class HackerNews:
         """
         Given a list of user ids, return all the User objects
         """
-        urls = [urljoin(self.user_url, f"{i}.json") for i in user_ids]
-        result = self._run_async(urls=urls)
-        return [User(r) for r in result if r]
+        result = self._get_many(self.user_url, ItemCache.user_key, user_ids)
+        return [User(r) for r in result]
 
     def top_stories(self, raw=False, limit=None):
         """Returns list of item ids of current top stories
@@ -321,11 +553,24 @@ class HackerNews:
         """
         url = urljoin(self.base_url, "updates.json")
         response = self._get_sync(url)
+        # Drop stale cache entries so the updated items and users are fetched fresh
+        self._invalidate_updates(response)
         return {
             "items": self.get_items_by_ids(item_ids=response["items"]),
             "profiles": self.get_users_by_ids(user_ids=response["profiles"]),
         }
 
+    def updated_ids(self):
+        """Returns the ids of items and users that have been changed/updated recently,
+        without fetching the items and users themselves.
+
+        Returns:
+            `dict` with the keys "items" and "profiles" whose values are `list` of ids
+
+        """
+        url = urljoin(self.base_url, "updates.json")
+        return self._get_sync(url)
+
     def get_max_item(self, expand=False):
         """The current largest item id
 
@@ -347,79 +592,446 @@ class HackerNews:
         else:
             return response
 
-    def get_all(self):
+    def get_all(self, columnar=False):
         """Returns ENTIRE Hacker News!
 
-        Downloads all the HN articles and returns them as Item objects
+        Downloads all the HN articles and returns them as Item objects.
+        This holds every item in memory, use `hn_ai.archive.crawl_archive`
+        to stream the archive to disk instead.
+
+        Args:
+            columnar (bool): Flag to return a column-oriented `ItemBatch`
+                instead of a list of `Item` objects.
 
         Returns:
             `list` object containing ids of HN stories.
 
         """
         max_item = self.get_max_item()
-        return self.get_last(num=max_item)
+        return self.get_last(num=max_item, columnar=columnar)
 
-    def get_last(self, num=10):
+    def get_last(self, num=10, columnar=False):
         """Returns last `num` of HN stories
 
         Downloads all the HN articles and returns them as Item objects
 
+        Args:
+            num (int): Number of items to return.
+            columnar (bool): Flag to return a column-oriented `ItemBatch`
+                instead of a list of `Item` objects.
+
         Returns:
             `list` object containing ids of HN stories.
 
         """
         max_item = self.get_max_item()
-        urls = [urljoin(self.item_url, f"{i}.json") for i in range(max_item - num + 1, max_item + 1)]
-        result = self._run_async(urls=urls)
+        result = self.get_window(max_item - num + 1, max_item)
+        if columnar:
+            return ItemBatch.from_responses(result)
         return [Item(r) for r in result if r]
 
+    def get_window(self, start_id, end_id, failed=None):
+        """Returns the raw API responses of every item id from `start_id` to `end_id`
+
+        Bypasses the cache, it is meant for bulk scans of the id space.
+
+        Args:
+            start_id (int): First item id.
+            end_id (int): Last item id.
+            failed (obj): Returned for ids whose request failed after all retries.
+                None by default, pass `FETCH_FAILED` to tell them apart from ids that do not exist.
+
+        Returns:
+            `list` of response dicts, None for ids that do not exist.
+
+        """
+        return self.get_raw_items(range(start_id, end_id + 1), failed=failed)
+
+    def get_raw_items(self, item_ids, failed=None):
+        """Returns the raw API responses of `item_ids`, bypassing the cache like `get_window`
+
+        Returns:
+            `list` of response dicts in the order of `item_ids`, None for ids that do not exist
+            and `failed` for ids whose request failed.
+
+        """
+        urls = [urljoin(self.item_url, f"{i}.json") for i in item_ids]
+        return self._run_async(urls=urls, failed=failed)
+
+    # -*- Native async API for callers already running inside an event loop
+
+    async def _aget(self, url):
+        """Asynchronous GET that raises instead of returning None
+
+        Raises:
+          HTTPError: If HTTP request failed.
+        """
+        response = await self._get_async(url)
+        if response is None:
+            raise HTTPError
+        return response
+
+    async def _amaybe_sync_cache(self) -> None:
+        if self._cache_sync_due():
+            try:
+                await self.async_sync_cache()
+            except Exception:
+                self._cache_synced_at = time.monotonic()
+
+    async def async_sync_cache(self):
+        """Async version of `sync_cache`"""
+        self._invalidate_updates(await self._aget(urljoin(self.base_url, "updates.json")))
+
+    async def _aget_one(self, base_url, key_fn, id_):
+        """Async version of `_get_one`"""
+        await self._amaybe_sync_cache()
+        if self.cache is not None:
+            cached = self.cache.get(key_fn(id_))
+            if cached is not None:
+                return cached
+        response = await self._get_async(urljoin(base_url, f"{id_}.json"))
+        if response and self.cache is not None:
+            self.cache.set(key_fn(id_), response)
+        return response
+
+    async def _aget_many(self, base_url, key_fn, ids) -> List[dict]:
+        """Async version of `_get_many`"""
+        await self._amaybe_sync_cache()
+        ids = list(ids)
+        cached, missing = self._cached_lookup(key_fn, ids)
+        results = await self._async_loop([urljoin(base_url, f"{i}.json") for i in missing]) if missing else []
+        return self._merge_cached(key_fn, ids, cached, missing, results)
+
+    async def _aget_stories(self, page, limit):
+        """Async version of `_get_stories`"""
+        url = urljoin(self.base_url, f"{page}.json")
+        story_ids = (await self._aget(url))[:limit]
+        return await self.aget_items_by_ids(item_ids=story_ids)
+
+    async def aget_item(self, item_id, expand=False):
+        """Async version of `get_item`"""
+        response = await self._aget_one(self.item_url, ItemCache.item_key, item_id)
+
+        if not response:
+            raise InvalidItemID
+
+        item = Item(response)
+        if expand:
+            by, kids, parent, poll, parts = await asyncio.gather(
+                self.aget_user(item.by) if item.by else _none(),
+                self.aget_items_by_ids(item.kids) if item.kids else _none(),
+                self.aget_item(item.parent) if item.parent else _none(),
+                self.aget_item(item.poll) if item.poll else _none(),
+                self.aget_items_by_ids(item.parts) if item.parts else _none(),
+            )
+            item.by, item.kids, item.parent, item.poll, item.parts = by, kids, parent, poll, parts
+
+        return item
+
+    async def aget_items_by_ids(self, item_ids, item_type=None):
+        """Async version of `get_items_by_ids`"""
+        result = await self._aget_many(self.item_url, ItemCache.item_key, item_ids)
+        items = [Item(r) for r in result]
+        if item_type:
+            return [item for item in items if item.item_type == item_type]
+        else:
+            return items
+
+    async def aget_user(self, user_id, expand=False):
+        """Async version of `get_user`"""
+        response = await self._aget_one(self.user_url, ItemCache.user_key, user_id)
+
+        if not response:
+            raise InvalidUserID
+
+        user = User(response)
+        if expand and user.submitted:
+            items = await self.aget_items_by_ids(user.submitted)
+            user_opt = {
+                "stories": "story",
+                "comments": "comment",
+                "jobs": "job",
+                "polls": "poll",
+                "pollopts": "pollopt",
+            }
+            for key, value in user_opt.items():
+                setattr(user, key, [i for i in items if i.item_type == value])
+
+        return user
+
+    async def aget_users_by_ids(self, user_ids):
+        """Async version of `get_users_by_ids`"""
+        result = await self._aget_many(self.user_url, ItemCache.user_key, user_ids)
+        return [User(r) for r in result]
+
+    async def atop_stories(self, raw=False, limit=None):
+        """Async version of `top_stories`"""
+        top_stories = await self._aget_stories("topstories", limit)
+        if raw:
+            top_stories = [story.raw for story in top_stories]
+        return top_stories
+
+    async def anew_stories(self, raw=False, limit=None):
+        """Async version of `new_stories`"""
+        new_stories = await self._aget_stories("newstories", limit)
+        if raw:
+            new_stories = [story.raw for story in new_stories]
+        return new_stories
+
+    async def aask_stories(self, raw=False, limit=None):
+        """Async version of `ask_stories`"""
+        ask_stories = await self._aget_stories("askstories", limit)
+        if raw:
+            ask_stories = [story.raw for story in ask_stories]
+        return ask_stories
+
+    async def ashow_stories(self, raw=False, limit=None):
+        """Async version of `show_stories`"""
+        show_stories = await self._aget_stories("showstories", limit)
+        if raw:
+            show_stories = [story.raw for story in show_stories]
+        return show_stories
+
+    async def ajob_stories(self, raw=False, limit=None):
+        """Async version of `job_stories`"""
+        job_stories = await self._aget_stories("jobstories", limit)
+        if raw:
+            job_stories = [story.raw for story in job_stories]
+        return job_stories
+
+    async def aupdates(self):
+        """Async version of `updates`"""
+        response = await self._aget(urljoin(self.base_url, "updates.json"))
+        self._invalidate_updates(response)
+        items, profiles = await asyncio.gather(
+            self.aget_items_by_ids(item_ids=response["items"]),
+            self.aget_users_by_ids(user_ids=response["profiles"]),
+        )
+        return {"items": items, "profiles": profiles}
+
+    async def aget_max_item(self, expand=False):
+        """Async version of `get_max_item`"""
+        response = await self._aget(urljoin(self.base_url, "maxitem.json"))
+        if expand:
+            return await self.aget_item(response)
+        else:
+            return response
+
+
+async def _none():
+    return None
+
 
 class Item(object):
 
     """
     Represents stories, comments, jobs, Ask HNs and polls
+
+    Fields are read from the original API response when accessed,
+    `raw` and the datetimes are only built when used.
     """
 
+    __slots__ = ("data", "by", "kids", "parent", "poll", "parts")
+
     def __init__(self, data):
-        self.item_id = data.get("id")
-        self.deleted = data.get("deleted")
-        self.item_type = data.get("type")
+        self.data = data
+        # Kept as attributes because `HackerNews.get_item(expand=True)` replaces them with objects
         self.by = data.get("by")
-        self.submission_time = datetime.datetime.fromtimestamp(data.get("time", 0))
-        self.text = data.get("text")
-        self.dead = data.get("dead")
+        self.kids = data.get("kids")
         self.parent = data.get("parent")
         self.poll = data.get("poll")
-        self.kids = data.get("kids")
-        self.url = data.get("url")
-        self.score = data.get("score")
-        self.title = data.get("title")
         self.parts = data.get("parts")
-        self.descendants = data.get("descendants")
-        self.time: Optional[datetime.datetime] = None
-        if data.get("time"):
-            self.time = datetime.datetime.fromtimestamp(data.get("time"))
-        self.raw = json.dumps(data)
+
+    @property
+    def item_id(self):
+        return self.data.get("id")
+
+    @property
+    def deleted(self):
+        return self.data.get("deleted")
+
+    @property
+    def item_type(self):
+        return self.data.get("type")
+
+    @property
+    def text(self):
+        return self.data.get("text")
+
+    @property
+    def dead(self):
+        return self.data.get("dead")
+
+    @property
+    def url(self):
+        return self.data.get("url")
+
+    @property
+    def score(self):
+        return self.data.get("score")
+
+    @property
+    def title(self):
+        return self.data.get("title")
+
+    @property
+    def descendants(self):
+        return self.data.get("descendants")
+
+    @property
+    def time(self) -> Optional[datetime.datetime]:
+        timestamp = self.data.get("time")
+        return datetime.datetime.fromtimestamp(timestamp) if timestamp else None
+
+    @property
+    def submission_time(self) -> datetime.datetime:
+        return datetime.datetime.fromtimestamp(self.data.get("time", 0))
+
+    @property
+    def raw(self):
+        return json.dumps(self.data)
 
     def __repr__(self):
         retval = "<hackernews.Item: {0} - {1}>".format(self.item_id, self.title)
         return retval
 
 
+class ItemBatch(object):
+
+    """
+    Column-oriented batch of items for bulk scans
+
+    Numeric fields are stored in compact `array` columns (a sentinel when missing,
+    so 0 stays 0) and text fields in lists, so a large batch costs a handful of
+    objects per column instead of one object per item. Indexing or iterating builds `Item` objects.
+    """
+
+    int_fields = ("id", "time", "score", "descendants", "parent", "poll")
+    str_fields = ("type", "by", "title", "url", "text")
+    flag_fields = ("deleted", "dead")
+
+    # Stored for a missing int field, no id, timestamp or count can take this value
+    MISSING_INT = -(2**63)
+    # Stored for a missing flag field, flags are stored as 0 or 1
+    MISSING_FLAG = -1
+
+    __slots__ = ("columns", "kids", "parts")
+
+    def __init__(self):
+        self.columns: Dict[str, Any] = {}
+        for field in self.int_fields:
+            self.columns[field] = array("q")
+        for field in self.str_fields:
+            self.columns[field] = []
+        for field in self.flag_fields:
+            self.columns[field] = array("b")
+        self.kids: List[Optional[List[int]]] = []
+        self.parts: List[Optional[List[int]]] = []
+
+    @classmethod
+    def from_responses(cls, responses):
+        """Builds a batch from API responses, skipping empty ones"""
+        batch = cls()
+        for response in responses:
+            if response:
+                batch.append(response)
+        return batch
+
+    def append(self, data):
+        for field in self.int_fields:
+            value = data.get(field)
+            self.columns[field].append(self.MISSING_INT if value is None else value)
+        for field in self.str_fields:
+            value = data.get(field)
+            # Types and authors repeat a lot, interning stores each distinct value once
+            if value is not None and field in ("type", "by"):
+                value = sys.intern(value)
+            self.columns[field].append(value)
+        for field in self.flag_fields:
+            value = data.get(field)
+            self.columns[field].append(self.MISSING_FLAG if value is None else int(bool(value)))
+        self.kids.append(data.get("kids"))
+        self.parts.append(data.get("parts"))
+
+    def row(self, index):
+        """Returns the API response of the item at `index`, without missing fields"""
+        data = {}
+        for field in self.int_fields:
+            if self.columns[field][index] != self.MISSING_INT:
+                data[field] = self.columns[field][index]
+        for field in self.str_fields:
+            if self.columns[field][index] is not None:
+                data[field] = self.columns[field][index]
+        for field in self.flag_fields:
+            if self.columns[field][index] != self.MISSING_FLAG:
+                data[field] = bool(self.columns[field][index])
+        if self.kids[index] is not None:
+            data["kids"] = self.kids[index]
+        if self.parts[index] is not None:
+            data["parts"] = self.parts[index]
+        return data
+
+    def __len__(self):
+        return len(self.columns["id"])
+
+    def __getitem__(self, index):
+        return Item(self.row(index))
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield Item(self.row(index))
+
+    def __repr__(self):
+        return "<hackernews.ItemBatch: {0} items>".format(len(self))
+
+
 class User(object):
 
     """
     Represents a hacker i.e. a user on Hacker News
+
+    Fields are read from the original API response when accessed,
+    `raw` and `created` are only built when used.
     """
 
+    __slots__ = ("data", "stories", "comments", "jobs", "polls", "pollopts")
+
     def __init__(self, data):
-        self.user_id = data.get("id")
-        self.delay = data.get("delay")
-        self.created = datetime.datetime.fromtimestamp(data.get("created", 0))
-        self.karma = data.get("karma")
-        self.about = data.get("about")
-        self.submitted = data.get("submitted")
-        self.raw = json.dumps(data)
+        self.data = data
+        # Set by `HackerNews.get_user(expand=True)`
+        self.stories = None
+        self.comments = None
+        self.jobs = None
+        self.polls = None
+        self.pollopts = None
+
+    @property
+    def user_id(self):
+        return self.data.get("id")
+
+    @property
+    def delay(self):
+        return self.data.get("delay")
+
+    @property
+    def created(self) -> datetime.datetime:
+        return datetime.datetime.fromtimestamp(self.data.get("created", 0))
+
+    @property
+    def karma(self):
+        return self.data.get("karma")
+
+    @property
+    def about(self):
+        return self.data.get("about")
+
+    @property
+    def submitted(self):
+        return self.data.get("submitted")
+
+    @property
+    def raw(self):
+        return json.dumps(self.data)
 
     def __repr__(self):
         retval = "<hackernews.User: {0}>".format(self.user_id)
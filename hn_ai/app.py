@@ -1,4 +1,4 @@
-from typing import List
+from typing import Any, Dict, List
 
 import streamlit as st
 from phi.assistant import Assistant
@@ -9,6 +9,7 @@ from phi.tools.streamlit.components import (
 
 from hn_ai.assistant import get_hn_assistant
 from utils.log import logger
+from utils.session_cache import invalidate, session_cached
 
 
 st.set_page_config(
@@ -30,6 +31,7 @@ with st.expander(":rainbow[:point_down: Example Questions]"):
 def restart_assistant():
     st.session_state["hn_assistant"] = None
     st.session_state["hn_assistant_run_id"] = None
+    invalidate("hn_messages", "hn_run_ids")
     st.rerun()
 
 
@@ -58,17 +60,22 @@ def main() -> None:
     else:
         hn_assistant = st.session_state["hn_assistant"]
 
-    # Create assistant run (i.e. log to database) and save run_id in session state
+    # Create assistant run (i.e. log to database) and save run_id in session state.
+    # Only reads or writes storage the first time for an assistant.
     st.session_state["hn_assistant_run_id"] = hn_assistant.create_run()
 
-    # Load messages for existing assistant
-    assistant_chat_history = hn_assistant.memory.get_chat_history()
-    if len(assistant_chat_history) > 0:
-        logger.debug("Loading chat history")
-        st.session_state["messages"] = assistant_chat_history
-    else:
+    # Load messages for existing assistant, once per run
+    def load_messages() -> List[Dict[str, Any]]:
+        assistant_chat_history = hn_assistant.memory.get_chat_history()
+        if len(assistant_chat_history) > 0:
+            logger.debug("Loading chat history")
+            return assistant_chat_history
         logger.debug("No chat history found")
-        st.session_state["messages"] = [{"role": "assistant", "content": "Ask me about what's on HackerNews"}]
+        return [{"role": "assistant", "content": "Ask me about what's on HackerNews"}]
+
+    st.session_state["messages"] = session_cached(
+        "hn_messages", load_messages, version=st.session_state["hn_assistant_run_id"]
+    )
 
     # Prompt for user input
     if prompt := st.chat_input():
@@ -174,7 +181,12 @@ def main() -> None:
         hn_assistant.auto_rename_run()
 
     if hn_assistant.storage:
-        hn_assistant_run_ids: List[str] = hn_assistant.storage.get_all_run_ids(user_id=username)
+        # Loaded again for a new or another run
+        hn_assistant_run_ids: List[str] = session_cached(
+            "hn_run_ids",
+            lambda: hn_assistant.storage.get_all_run_ids(user_id=username),
+            version=(username, st.session_state["hn_assistant_run_id"]),
+        )
         new_hn_assistant_run_id = st.sidebar.selectbox("Run ID", options=hn_assistant_run_ids)
         if st.session_state["hn_assistant_run_id"] != new_hn_assistant_run_id:
             logger.debug(f"Loading run {new_hn_assistant_run_id}")
@@ -0,0 +1,142 @@
+import argparse
+import gzip
+import json
+import os
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Union
+
+from hn_ai.api import FETCH_FAILED, HackerNews
+from utils.log import logger
+
+######################################################
+## Full HackerNews archive crawler
+######################################################
+
+
+def get_shard_path(output_dir: Path, window_start: int, window_end: int) -> Path:
+    # Zero padded so shards sort in id order
+    return output_dir.joinpath(f"items-{window_start:012d}-{window_end:012d}.jsonl.gz")
+
+
+def get_failed_ids(window_start: int, responses: List[Any]) -> List[int]:
+    """Returns the ids of the items of a window whose request failed"""
+    return [window_start + i for i, response in enumerate(responses) if response is FETCH_FAILED]
+
+
+def crawl_archive(
+    output_dir: Union[str, Path],
+    window_size: int = 10000,
+    start_id: int = 1,
+    end_id: Optional[int] = None,
+    worker_index: int = 0,
+    num_workers: int = 1,
+    refetch_attempts: int = 2,
+    hn: Optional[HackerNews] = None,
+) -> str:
+    """Downloads every HackerNews item from `start_id` to `end_id` into gzipped JSONL shards.
+
+    The id range is walked in windows of `window_size` ids. Each window is written to its own
+    shard, which is renamed into place only once complete, so finished shards double as the
+    checkpoint: a restarted crawl skips them. Workers split the windows round robin, so
+    `num_workers` processes with different `worker_index` values can crawl the same range.
+    Items whose request failed after all retries are fetched again; a window that still has
+    failed items is not written, so the next crawl fetches it again.
+
+    Args:
+        output_dir (str or Path): Directory for the shards.
+        window_size (int): Number of item ids per shard.
+        start_id (int): First item id to crawl.
+        end_id (int): Last item id to crawl. Defaults to the current `maxitem`.
+        worker_index (int): Index of this worker, from 0 to `num_workers - 1`.
+        num_workers (int): Number of workers splitting the id range.
+        refetch_attempts (int): Number of times the failed items of a window are fetched again.
+        hn (HackerNews): (optional) HackerNews client to use.
+
+    Returns:
+        str: A summary of the crawl.
+    """
+    hn = hn or HackerNews()
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    if end_id is None:
+        end_id = hn.get_max_item()
+
+    num_items = 0
+    num_shards = 0
+    num_failed_windows = 0
+    for window_number, window_start in enumerate(range(start_id, end_id + 1, window_size)):
+        if window_number % num_workers != worker_index:
+            continue
+
+        window_end = min(window_start + window_size - 1, end_id)
+        shard_path = get_shard_path(output_dir, window_start, window_end)
+        if shard_path.exists():
+            continue
+
+        responses = hn.get_window(window_start, window_end, failed=FETCH_FAILED)
+        for _ in range(refetch_attempts):
+            failed_ids = get_failed_ids(window_start, responses)
+            if len(failed_ids) == 0:
+                break
+            for item_id, response in zip(failed_ids, hn.get_raw_items(failed_ids, failed=FETCH_FAILED)):
+                responses[item_id - window_start] = response
+        failed_ids = get_failed_ids(window_start, responses)
+        if len(failed_ids) > 0:
+            # Not checkpointed, the next crawl fetches the whole window again
+            num_failed_windows += 1
+            logger.error(
+                f"Could not fetch {len(failed_ids)} items in {window_start}-{window_end}: {failed_ids[:10]}"
+            )
+            continue
+
+        tmp_path = shard_path.with_name(shard_path.name + ".tmp")
+        with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+            for response in responses:
+                if response:
+                    f.write(json.dumps(response, separators=(",", ":")))
+                    f.write("\n")
+                    num_items += 1
+        os.replace(tmp_path, shard_path)
+        # A previous crawl with a smaller `end_id` may have left a partial shard for this window
+        for stale_path in output_dir.glob(f"items-{window_start:012d}-*.jsonl.gz"):
+            if stale_path != shard_path:
+                stale_path.unlink()
+        num_shards += 1
+        logger.info(f"Wrote items {window_start}-{window_end} to {shard_path.name}")
+
+    summary = f"Wrote {num_items} items in {num_shards} shards to {output_dir}"
+    if num_failed_windows > 0:
+        summary += f", {num_failed_windows} windows failed and are left for the next crawl"
+    return summary
+
+
+def read_archive(output_dir: Union[str, Path]) -> Iterator[Dict[str, Any]]:
+    """Yields the API response of every item in the archive, in id order"""
+    for shard_path in sorted(Path(output_dir).glob("items-*.jsonl.gz")):
+        with gzip.open(shard_path, "rt", encoding="utf-8") as f:
+            for line in f:
+                yield json.loads(line)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Crawl the full HackerNews archive")
+    parser.add_argument("output_dir")
+    parser.add_argument("--window-size", type=int, default=10000)
+    parser.add_argument("--start-id", type=int, default=1)
+    parser.add_argument("--end-id", type=int, default=None)
+    parser.add_argument("--worker-index", type=int, default=0)
+    parser.add_argument("--num-workers", type=int, default=1)
+    parser.add_argument("--refetch-attempts", type=int, default=2)
+    args = parser.parse_args()
+
+    logger.info(
+        crawl_archive(
+            output_dir=args.output_dir,
+            window_size=args.window_size,
+            start_id=args.start_id,
+            end_id=args.end_id,
+            worker_index=args.worker_index,
+            num_workers=args.num_workers,
+            refetch_attempts=args.refetch_attempts,
+        )
+    )
@@ -0,0 +1,131 @@
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional, Tuple, Union
+
+
+class ItemCache:
+    """
+    Cache for the raw JSON of Hacker News items and users.
+
+    An in-process LRU with a TTL sits in front of an optional on-disk SQLite tier,
+    so cached data can be shared between processes and survive restarts.
+    Keys are strings like "item:<id>" and "user:<id>".
+    """
+
+    def __init__(
+        self,
+        max_size: int = 10000,
+        ttl: float = 300,
+        db_path: Optional[Union[str, Path]] = None,
+        db_ttl: Optional[float] = None,
+    ):
+        """
+        Args:
+            max_size (int): Maximum number of entries kept in memory.
+            ttl (float): Seconds an entry is served from memory.
+            db_path (str or Path): (optional) Path of the SQLite database used as the on-disk tier.
+            db_ttl (float): Seconds an entry is served from disk. Defaults to `ttl`.
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self.db_ttl = db_ttl if db_ttl is not None else ttl
+        self._memory: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        if db_path is not None:
+            Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(str(db_path), check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS hn_cache "
+                "(key TEXT PRIMARY KEY, data TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self._db.commit()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Returns the cached data for `key`, None if missing or expired"""
+        return self.get_many([key]).get(key)
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        """Returns the cached data for all `keys` that are present and not expired"""
+        now = time.time()
+        found: Dict[str, Dict[str, Any]] = {}
+        missing = []
+        with self._lock:
+            for key in keys:
+                entry = self._memory.get(key)
+                if entry is not None and entry[0] > now:
+                    self._memory.move_to_end(key)
+                    found[key] = entry[1]
+                else:
+                    if entry is not None:
+                        del self._memory[key]
+                    missing.append(key)
+
+            if self._db is not None and len(missing) > 0:
+                # Stay well below SQLite's limit on the number of host parameters
+                for i in range(0, len(missing), 500):
+                    chunk = missing[i : i + 500]
+                    rows = self._db.execute(
+                        "SELECT key, data FROM hn_cache WHERE expires_at > ? AND key IN ({})".format(
+                            ",".join("?" * len(chunk))
+                        ),
+                        [now, *chunk],
+                    ).fetchall()
+                    for key, data in rows:
+                        found[key] = json.loads(data)
+                        self._set_memory(key, found[key], now)
+        return found
+
+    def set(self, key: str, data: Dict[str, Any]) -> None:
+        """Caches `data` under `key`"""
+        self.set_many({key: data})
+
+    def set_many(self, entries: Dict[str, Dict[str, Any]]) -> None:
+        """Caches every key/data pair in `entries`"""
+        now = time.time()
+        with self._lock:
+            for key, data in entries.items():
+                self._set_memory(key, data, now)
+            if self._db is not None and len(entries) > 0:
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO hn_cache (key, data, expires_at) VALUES (?, ?, ?)",
+                    [(key, json.dumps(data), now + self.db_ttl) for key, data in entries.items()],
+                )
+                self._db.commit()
+
+    def invalidate(self, keys: Iterable[str]) -> None:
+        """Removes `keys` from every tier"""
+        keys = list(keys)
+        with self._lock:
+            for key in keys:
+                self._memory.pop(key, None)
+            if self._db is not None and len(keys) > 0:
+                self._db.executemany("DELETE FROM hn_cache WHERE key = ?", [(key,) for key in keys])
+                self._db.commit()
+
+    def clear(self) -> None:
+        """Removes every entry from every tier"""
+        with self._lock:
+            self._memory.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM hn_cache")
+                self._db.commit()
+
+    def _set_memory(self, key: str, data: Dict[str, Any], now: float) -> None:
+        self._memory[key] = (now + self.ttl, data)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_size:
+            self._memory.popitem(last=False)
+
+    @staticmethod
+    def item_key(item_id) -> str:
+        return f"item:{item_id}"
+
+    @staticmethod
+    def user_key(user_id) -> str:
+        return f"user:{user_id}"
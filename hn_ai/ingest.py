@@ -0,0 +1,274 @@
+import json
+from typing import Callable, Dict, List, Optional, Tuple
+
+from phi.document import Document
+from phi.knowledge import AssistantKnowledge
+from phi.vectordb.pgvector import PgVector2
+from sqlalchemy import (
+    BigInteger,
+    Column,
+    DateTime,
+    MetaData,
+    String,
+    Table,
+    bindparam,
+    func,
+    select,
+    text,
+    update,
+)
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.engine import Engine
+
+from ai.pipeline import embed_documents, get_content_hash, run_pipeline, upsert_documents
+from db.session import db_engine
+from hn_ai.api import FETCH_FAILED, HackerNews, Item
+from utils.log import logger
+
+######################################################
+## Incremental HackerNews ingestion
+######################################################
+
+# Story categories and how many stories of each are kept in the knowledge base
+HN_STORY_CATEGORIES = {
+    "topstories": 2000,
+    "showstories": 100,
+    "askstories": 50,
+}
+
+
+class IngestState:
+    """
+    Checkpoint for an incremental knowledge base load, stored in the `ai.hn_ingest_state` table.
+
+    Keeps the largest item id seen by the last completed load and the ids that are still
+    pending in the current load, so an interrupted load resumes where it stopped.
+    """
+
+    def __init__(self, name: str, engine: Engine = db_engine, schema: str = "ai"):
+        self.name = name
+        self.engine = engine
+        self.table = Table(
+            "hn_ingest_state",
+            MetaData(schema=schema),
+            Column("name", String, primary_key=True),
+            Column("max_item", BigInteger),
+            Column("pending_ids", postgresql.JSONB),
+            Column("updated_at", DateTime(timezone=True), server_default=func.now(), onupdate=func.now()),
+        )
+        with self.engine.begin() as conn:
+            conn.execute(text(f"CREATE SCHEMA IF NOT EXISTS {schema};"))
+        self.table.create(self.engine, checkfirst=True)
+
+    def read(self) -> Dict:
+        """Returns the saved checkpoint as {"max_item": int or None, "pending_ids": list}"""
+        with self.engine.connect() as conn:
+            row = conn.execute(
+                select(self.table.c.max_item, self.table.c.pending_ids).where(self.table.c.name == self.name)
+            ).first()
+        if row is None:
+            return {"max_item": None, "pending_ids": []}
+        return {"max_item": row.max_item, "pending_ids": row.pending_ids or []}
+
+    def write(self, max_item: Optional[int], pending_ids: List[int]) -> None:
+        stmt = postgresql.insert(self.table).values(
+            name=self.name, max_item=max_item, pending_ids=pending_ids
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["name"],
+            set_=dict(
+                max_item=stmt.excluded.max_item,
+                pending_ids=stmt.excluded.pending_ids,
+                updated_at=func.now(),
+            ),
+        )
+        with self.engine.begin() as conn:
+            conn.execute(stmt)
+
+
+def get_story_document(story) -> Document:
+    meta_data = {
+        "id": story.item_id,
+        "type": story.item_type,
+        "author": story.by,
+        "score": story.score,
+        "total_comments": story.descendants,
+        "time": story.time.isoformat(),
+    }
+    if story.parent:
+        meta_data["parent"] = story.parent
+
+    content = {
+        "title": story.title,
+        "url": story.url,
+        "author": story.by,
+    }
+    if story.text:
+        content["text"] = story.text
+
+    return Document(
+        id=str(story.item_id),
+        name=str(story.item_id),
+        meta_data=meta_data,
+        content=json.dumps(content),
+    )
+
+
+def get_existing_hashes(vector_db: PgVector2, ids: List[str]) -> Dict[str, str]:
+    """Returns the content hash of every document in `ids` that is already in the vector db"""
+    if not vector_db.table_exists():
+        return {}
+
+    table = vector_db.table
+    existing: Dict[str, str] = {}
+    with vector_db.Session() as session, session.begin():
+        for i in range(0, len(ids), 1000):
+            rows = session.execute(
+                select(table.c.id, table.c.content_hash).where(table.c.id.in_(ids[i : i + 1000]))
+            ).fetchall()
+            existing.update({row.id: row.content_hash for row in rows})
+    return existing
+
+
+def update_meta_data(vector_db: PgVector2, documents: List[Document]) -> None:
+    """Refreshes the meta data (score, comments) of unchanged documents without re-embedding them"""
+    if len(documents) == 0:
+        return
+
+    table = vector_db.table
+    stmt = (
+        update(table)
+        .where(table.c.id == bindparam("_id"))
+        .values(meta_data=bindparam("_meta_data"), updated_at=func.now())
+    )
+    with vector_db.Session() as session, session.begin():
+        session.execute(stmt, [{"_id": doc.id, "_meta_data": doc.meta_data} for doc in documents])
+
+
+def load_stories_incrementally(
+    knowledge_base: AssistantKnowledge,
+    hn: Optional[HackerNews] = None,
+    batch_size: int = 100,
+    queue_size: int = 2,
+    state_name: Optional[str] = None,
+    progress: Optional[Callable[[int, Optional[int]], None]] = None,
+) -> str:
+    """Streams HackerNews stories into `knowledge_base`, only fetching and embedding what changed.
+
+    Stories are fetched if they are new (not in the knowledge base or above the last `maxitem`),
+    listed in the `updates` feed, or left pending by an interrupted load or a failed request. Fetched stories
+    whose content hash matches the stored one only get their meta data refreshed.
+
+    Args:
+        knowledge_base (AssistantKnowledge): Knowledge base backed by PgVector2.
+        hn (HackerNews): (optional) HackerNews client to use.
+        batch_size (int): Number of stories fetched, embedded and written together.
+        queue_size (int): Maximum number of batches waiting between two stages.
+        state_name (str): Name of the checkpoint. Defaults to the vector db collection.
+        progress (Callable): (optional) Called with the number of stories loaded and the total after
+            each batch.
+
+    Returns:
+        str: A summary of the load.
+    """
+    vector_db = knowledge_base.vector_db
+    if vector_db is None or not isinstance(vector_db, PgVector2):
+        return "Incremental loading requires a PgVector2 knowledge base."
+
+    hn = hn or HackerNews()
+    state = IngestState(name=state_name or vector_db.collection)
+    checkpoint = state.read()
+    last_max_item: Optional[int] = checkpoint["max_item"]
+    pending_ids: List[int] = checkpoint["pending_ids"]
+    if len(pending_ids) > 0:
+        logger.info(f"Resuming interrupted load with {len(pending_ids)} pending stories")
+
+    max_item: int = hn.get_max_item()
+    story_ids: List[int] = []
+    for category, limit in HN_STORY_CATEGORIES.items():
+        category_ids = hn.get_story_ids(category, limit)
+        logger.info(f"Fetched {len(category_ids)} {category} ids from HackerNews.")
+        story_ids.extend(category_ids)
+    story_ids = list(dict.fromkeys(story_ids))
+
+    existing_hashes = get_existing_hashes(vector_db, [str(i) for i in story_ids])
+    updated_ids = set(hn.updated_ids().get("items", []))
+    to_fetch = list(
+        dict.fromkeys(
+            pending_ids
+            + [
+                i
+                for i in story_ids
+                if str(i) not in existing_hashes
+                or i in updated_ids
+                or (last_max_item is not None and i > last_max_item)
+            ]
+        )
+    )
+    logger.info(f"{len(to_fetch)} of {len(story_ids)} stories are new, changed or pending")
+    state.write(max_item=last_max_item, pending_ids=to_fetch)
+    if progress is not None:
+        progress(0, len(to_fetch))
+
+    def fetch_batch(batch: Tuple[int, List[int]]) -> Tuple[int, List[Document], List[Document], List[int]]:
+        """Fetches a batch of stories and splits their documents into changed and unchanged.
+
+        Also returns the ids of the stories whose request failed, to fetch them again later.
+        """
+        end, batch_ids = batch
+        changed: List[Document] = []
+        unchanged: List[Document] = []
+        failed_ids: List[int] = []
+        for story_id, response in zip(batch_ids, hn.get_raw_items(batch_ids, failed=FETCH_FAILED)):
+            if response is FETCH_FAILED:
+                failed_ids.append(story_id)
+                continue
+            if response is None:
+                # Deleted or not a story anymore
+                continue
+            story = Item(response)
+            try:
+                document = get_story_document(story)
+            except Exception as e:
+                logger.error(f"Error creating document for story {story.item_id}: {e}")
+                continue
+            if existing_hashes.get(document.id) == get_content_hash(document.content):
+                unchanged.append(document)
+            else:
+                changed.append(document)
+        return end, changed, unchanged, failed_ids
+
+    def embed_batch(batch: Tuple[int, List[Document], List[Document], List[int]]):
+        embed_documents(batch[1], embedder=vector_db.embedder)
+        return batch
+
+    # Fetching, embedding and writing run concurrently with at most `queue_size` batches between stages
+    vector_db.create()
+    batches = (
+        (min(i + batch_size, len(to_fetch)), to_fetch[i : i + batch_size])
+        for i in range(0, len(to_fetch), batch_size)
+    )
+    num_embedded = 0
+    num_refreshed = 0
+    # Stories whose request failed stay pending, so the next load fetches them again
+    failed_ids: List[int] = []
+    for end, changed, unchanged, batch_failed_ids in run_pipeline(
+        batches, fetch_batch, embed_batch, queue_size=queue_size
+    ):
+        upsert_documents(vector_db, changed)
+        update_meta_data(vector_db, unchanged)
+        num_embedded += len(changed)
+        num_refreshed += len(unchanged)
+        failed_ids.extend(batch_failed_ids)
+        state.write(max_item=last_max_item, pending_ids=failed_ids + to_fetch[end:])
+        logger.info(f"Loaded {end}/{len(to_fetch)} stories")
+        if progress is not None:
+            progress(end, len(to_fetch))
+
+    state.write(max_item=max_item, pending_ids=failed_ids)
+    if len(failed_ids) > 0:
+        logger.warning(f"Could not fetch {len(failed_ids)} stories, they are fetched again by the next load")
+    return (
+        f"Loaded {num_embedded} new or changed documents and refreshed {num_refreshed} unchanged documents "
+        f"in HackerNews knowledge base, {len(failed_ids)} stories could not be fetched."
+    )
@@ -0,0 +1,25 @@
+from typing import Optional
+
+from pydantic_settings import BaseSettings
+
+
+class HNSettings(BaseSettings):
+    """HackerNews settings that can be set using environment variables.
+
+    Reference: https://docs.pydantic.dev/latest/usage/pydantic_settings/
+    """
+
+    # Maximum number of requests in flight to the HackerNews API
+    hn_max_concurrency: int = 50
+    # Number of items and users kept in the in-process cache
+    hn_cache_max_size: int = 10000
+    # Seconds an item or user is served from the cache
+    hn_cache_ttl: float = 300
+    # Path of the SQLite database used as the on-disk cache tier, disabled if None
+    hn_cache_db_path: Optional[str] = None
+    # Seconds between invalidating cached entries using the updates feed
+    hn_cache_sync_interval: Optional[float] = 60
+
+
+# Create HNSettings object
+hn_settings = HNSettings()
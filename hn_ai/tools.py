@@ -1,13 +1,55 @@
 import json
-from typing import List, Optional
+from typing import Dict, List, Optional
 
 from phi.document import Document
 
 from hn_ai.api import HackerNews
+from hn_ai.cache import ItemCache
 from hn_ai.knowledge import hn_knowledge_base
+from hn_ai.settings import hn_settings
 from utils.log import logger
 
-hn = HackerNews()
+hn = HackerNews(
+    max_concurrency=hn_settings.hn_max_concurrency,
+    cache=ItemCache(
+        max_size=hn_settings.hn_cache_max_size,
+        ttl=hn_settings.hn_cache_ttl,
+        db_path=hn_settings.hn_cache_db_path,
+    ),
+    cache_sync_interval=hn_settings.hn_cache_sync_interval,
+)
+
+
+def get_comment_details(comment) -> dict:
+    comment_details = {
+        "id": comment.item_id,
+        "author": comment.by,
+    }
+    if comment.text:
+        comment_details["text"] = comment.text[:200]
+    return comment_details
+
+
+def get_top_comments(stories, num_comments: int) -> Dict[int, List[dict]]:
+    """Fetch the first `num_comments` comments of every story in one concurrent batch.
+
+    Returns:
+        dict: Mapping of story id to the details of its top comments.
+    """
+    comment_ids = [kid_id for story in stories if story.kids for kid_id in story.kids[:num_comments]]
+    if len(comment_ids) == 0:
+        return {}
+
+    comments = {comment.item_id: comment for comment in hn.get_items_by_ids(item_ids=comment_ids)}
+    top_comments = {}
+    for story in stories:
+        if story.kids and len(story.kids) > 0:
+            top_comments[story.item_id] = [
+                get_comment_details(comments[kid_id])
+                for kid_id in story.kids[:num_comments]
+                if kid_id in comments
+            ]
+    return top_comments
 
 
 def search_hackernews_stories(topic: str, num_results: int = 15) -> Optional[str]:
@@ -54,17 +96,7 @@ def get_story_details(id: str) -> Optional[str]:
         if story.text:
             story_details["text"] = story.text
         if story.kids and len(story.kids) > 0:
-            top_comments = []
-            for kid_id in story.kids[:10]:
-                kid = hn.get_item(kid_id)
-                kid_details = {
-                    "id": kid.item_id,
-                    "author": kid.by,
-                }
-                if kid.text:
-                    kid_details["text"] = kid.text[:200]
-                top_comments.append(kid_details)
-            story_details["top_comments"] = top_comments
+            story_details["top_comments"] = get_top_comments([story], num_comments=10).get(story.item_id, [])
 
         return json.dumps(story_details)
     except Exception as e:
@@ -118,24 +150,20 @@ def get_item_details_by_url(url: str) -> Optional[str]:
         if item.text:
             item_details["text"] = item.text
         if item.kids and len(item.kids) > 0:
-            top_comments = []
-            for kid_id in item.kids[:10]:
-                kid = hn.get_item(kid_id)
-                kid_details = {
-                    "id": kid.item_id,
-                    "author": kid.by,
-                }
-                if kid.text:
-                    kid_details["text"] = kid.text[:200]
-                top_comments.append(kid_details)
-            item_details["top_comments"] = top_comments
+            item_details["top_comments"] = get_top_comments([item], num_comments=10).get(item.item_id, [])
 
         return json.dumps(item_details)
     except Exception as e:
         return f"Error getting item details: {e}"
 
 
-def extract_story_details(story, fetch_comments: bool = True) -> Optional[dict]:
+def extract_story_details(
+    story, fetch_comments: bool = True, top_comments: Optional[List[dict]] = None
+) -> Optional[dict]:
+    """Extract the details of a story.
+
+    If `top_comments` is not provided and `fetch_comments` is True, the top 3 comments are fetched.
+    """
     try:
         if story.title is None:
             return None
@@ -151,17 +179,9 @@ def extract_story_details(story, fetch_comments: bool = True) -> Optional[dict]:
         }
         if story.text:
             story_details["text"] = story.text
-        if fetch_comments and story.kids and len(story.kids) > 0:
-            top_comments = []
-            for kid_id in story.kids[:3]:
-                kid = hn.get_item(kid_id)
-                kid_details = {
-                    "id": kid.item_id,
-                    "author": kid.by,
-                }
-                if kid.text:
-                    kid_details["text"] = kid.text[:200]
-                top_comments.append(kid_details)
+        if top_comments is None and fetch_comments and story.kids and len(story.kids) > 0:
+            top_comments = get_top_comments([story], num_comments=3).get(story.item_id, [])
+        if top_comments is not None:
             story_details["top_comments"] = top_comments
 
         return story_details
@@ -170,6 +190,25 @@ def extract_story_details(story, fetch_comments: bool = True) -> Optional[dict]:
         return None
 
 
+def extract_stories_details(stories, fetch_comments: bool = True) -> List[dict]:
+    """Extract the details of many stories, fetching the top 3 comments of all stories in one batch."""
+    top_comments: Dict[int, List[dict]] = {}
+    if fetch_comments:
+        try:
+            top_comments = get_top_comments([story for story in stories if story.title is not None], 3)
+        except Exception as e:
+            logger.error(f"Error getting top comments: {e}")
+
+    stories_details = []
+    for story in stories:
+        story_details = extract_story_details(
+            story, fetch_comments=False, top_comments=top_comments.get(story.item_id)
+        )
+        if story_details:
+            stories_details.append(story_details)
+    return stories_details
+
+
 def get_top_stories(num_results: int = 5) -> Optional[str]:
     """Use this function to get the top Hacker News stories.
 
@@ -182,11 +221,7 @@ def get_top_stories(num_results: int = 5) -> Optional[str]:
 
     try:
         top_stories = hn.top_stories(limit=num_results)
-        top_story_details = []
-        for story in top_stories:
-            story_details = extract_story_details(story)
-            if story_details:
-                top_story_details.append(story_details)
+        top_story_details = extract_stories_details(top_stories)
         return json.dumps(top_story_details)
     except Exception as e:
         return f"Error getting top stories: {e}"
@@ -204,11 +239,7 @@ def get_show_stories(num_results: int = 10) -> Optional[str]:
 
     try:
         show_stories = hn.show_stories(limit=num_results)
-        show_story_details = []
-        for story in show_stories:
-            story_details = extract_story_details(story)
-            if story_details:
-                show_story_details.append(story_details)
+        show_story_details = extract_stories_details(show_stories)
         return json.dumps(show_story_details)
     except Exception as e:
         return f"Error getting show stories: {e}"
@@ -226,11 +257,7 @@ def get_ask_stories(num_results: int = 10) -> Optional[str]:
 
     try:
         ask_stories = hn.ask_stories(limit=num_results)
-        ask_story_details = []
-        for story in ask_stories:
-            story_details = extract_story_details(story)
-            if story_details:
-                ask_story_details.append(story_details)
+        ask_story_details = extract_stories_details(ask_stories)
         return json.dumps(ask_story_details)
     except Exception as e:
         return f"Error getting ask stories: {e}"
@@ -248,11 +275,7 @@ def get_new_stories(num_results: int = 10) -> Optional[str]:
 
     try:
         new_stories = hn.new_stories(limit=num_results)
-        new_story_details = []
-        for story in new_stories:
-            story_details = extract_story_details(story)
-            if story_details:
-                new_story_details.append(story_details)
+        new_story_details = extract_stories_details(new_stories)
         return json.dumps(new_story_details)
     except Exception as e:
         return f"Error getting new stories: {e}"
@@ -279,20 +302,18 @@ def get_user_details(username: str) -> Optional[str]:
         }
         if user.submitted and len(user.submitted) > 0:
             top_submitted = [i for i in user.submitted[:200]]
-            submitted_stories = hn.get_items_by_ids(item_ids=top_submitted, item_type="story")
+            # Fetch the submitted items once and split them into stories and comments
+            submitted_items = hn.get_items_by_ids(item_ids=top_submitted)
+            submitted_stories = [i for i in submitted_items if i.item_type == "story"]
             # Get top 10 stories by score
             top_stories = sorted(submitted_stories, key=lambda x: (x.score if x.score else 0), reverse=True)[
                 :10
             ]
-            top_story_details = []
-            for story in top_stories:
-                story_details = extract_story_details(story, fetch_comments=False)
-                if story_details:
-                    top_story_details.append(story_details)
+            top_story_details = extract_stories_details(top_stories, fetch_comments=False)
 
             user_details["top_stories"] = top_story_details
 
-            submitted_comments = hn.get_items_by_ids(item_ids=top_submitted, item_type="comment")
+            submitted_comments = [i for i in submitted_items if i.item_type == "comment"]
             # Get latest 10 comments
             latest_comment_details = []
             for comment in submitted_comments[:10]:
@@ -4,14 +4,9 @@ from typing import List, Optional
 import streamlit as st
 from phi.tools.streamlit.components import get_username_sidebar
 
-from medical_ai.assistants import (
-    SearchTerms,
-    SearchResults,
-    search_term_generator,
-    arxiv_search_assistant,
-    research_editor,
-    arxiv_toolkit,
-)
+from medical_ai.assistants import SearchTerms, SearchResults, search_term_generator, research_editor
+from medical_ai.generate_report import get_paper_ids, read_arxiv_papers
+from medical_ai.generate_report import search_arxiv as search_arxiv_terms
 from medical_ai.search import exa_search
 
 
@@ -101,10 +96,7 @@ def main() -> None:
             with st.status("Searching ArXiv (this takes a while)", expanded=True) as status:
                 with st.container():
                     search_results_container = st.empty()
-                    for search_term in search_terms.terms:
-                        search_results = arxiv_search_assistant.run(search_term)
-                        if search_results:
-                            arxiv_search_results.append(search_results)
+                    arxiv_search_results = search_arxiv_terms(search_terms.terms)
 
                     if len(arxiv_search_results) > 0:
                         search_results_container.json(
@@ -113,15 +105,15 @@ def main() -> None:
                 status.update(label="ArXiv Search Complete", state="complete", expanded=False)
 
             if len(arxiv_search_results) > 0:
-                arxiv_paper_ids = []
-                for search_result in arxiv_search_results:
-                    arxiv_paper_ids.extend([result.id for result in search_result.results])
+                arxiv_paper_ids = get_paper_ids(arxiv_search_results)
 
                 if len(arxiv_paper_ids) > 0:
                     with st.status("Reading ArXiv Papers", expanded=True) as status:
                         with st.container():
                             arxiv_paper_ids_container = st.empty()
-                            arxiv_content = arxiv_toolkit.read_arxiv_papers(arxiv_paper_ids, pages_to_read=2)
+                            arxiv_content = json.dumps(
+                                read_arxiv_papers(arxiv_paper_ids, pages_to_read=2), indent=4
+                            )
                             arxiv_paper_ids_container.json(arxiv_paper_ids)
                         status.update(label="Reading ArXiv Papers Complete", state="complete", expanded=False)
 
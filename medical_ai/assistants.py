@@ -30,45 +30,56 @@ class SearchResults(BaseModel):
     results: List[SearchResult] = Field(..., description="List of top search results.")
 
 
-search_term_generator = Assistant(
-    name="Medical Search Generator",
-    description=dedent(
-        """\
-    You are a world-class medical researcher assigned a very important task.
-    You will be given a topic and number of search terms to generate.
-    You will generate a list of search terms for writing an article on that topic.
-    These terms will be used to search the web for the most relevant articles on the topic.\
-    """
-    ),
-    output_model=SearchTerms,
-    debug_mode=True,
-)
+def get_search_term_generator() -> Assistant:
+    return Assistant(
+        name="Medical Search Generator",
+        description=dedent(
+            """\
+        You are a world-class medical researcher assigned a very important task.
+        You will be given a topic and number of search terms to generate.
+        You will generate a list of search terms for writing an article on that topic.
+        These terms will be used to search the web for the most relevant articles on the topic.\
+        """
+        ),
+        output_model=SearchTerms,
+        debug_mode=True,
+    )
 
-arxiv_search_assistant = Assistant(
-    name="Arxiv Search Assistant",
-    description=dedent(
-        """\
-    You are a world-class medical researcher assigned a very important task.
-    Given a topic, search ArXiv for the top 10 articles about that topic and return the 4 most relevant articles to that topic.
-    This is an important task and your output should be highly relevant to the original topic.\
-    """
-    ),
-    tools=[arxiv_toolkit],
-    output_model=SearchResults,
-    debug_mode=True,
-)
 
-research_editor = Assistant(
-    name="Medical Research Editor",
-    description="You are a world-class medical researcher and your task is to generate a medical journal worthy report in the style of New York Times.",
-    instructions=[
-        "You will be provided with a topic and a list of articles along with their summary and content.",
-        "Carefully read each articles and generate a medical journal worthy report in the style of New York Times.",
-        "The report should be clear, concise, and informative.",
-        "Focus on providing a high-level overview of the topic and the key findings from the articles.",
-        "Do not copy the content from the articles, but use the information to generate a high-quality report.",
-        "Do not include any personal opinions or biases in the report.",
-    ],
-    markdown=True,
-    debug_mode=True,
-)
+def get_arxiv_search_assistant() -> Assistant:
+    return Assistant(
+        name="Arxiv Search Assistant",
+        description=dedent(
+            """\
+        You are a world-class medical researcher assigned a very important task.
+        Given a topic, search ArXiv for the top 10 articles about that topic and return the 4 most relevant articles to that topic.
+        This is an important task and your output should be highly relevant to the original topic.\
+        """
+        ),
+        tools=[arxiv_toolkit],
+        output_model=SearchResults,
+        debug_mode=True,
+    )
+
+
+def get_research_editor() -> Assistant:
+    return Assistant(
+        name="Medical Research Editor",
+        description="You are a world-class medical researcher and your task is to generate a medical journal worthy report in the style of New York Times.",
+        instructions=[
+            "You will be provided with a topic and a list of articles along with their summary and content.",
+            "Carefully read each articles and generate a medical journal worthy report in the style of New York Times.",
+            "The report should be clear, concise, and informative.",
+            "Focus on providing a high-level overview of the topic and the key findings from the articles.",
+            "Do not copy the content from the articles, but use the information to generate a high-quality report.",
+            "Do not include any personal opinions or biases in the report.",
+        ],
+        markdown=True,
+        debug_mode=True,
+    )
+
+
+# Used by the app, `generate_report` creates new assistants for every report so reports run concurrently
+search_term_generator = get_search_term_generator()
+arxiv_search_assistant = get_arxiv_search_assistant()
+research_editor = get_research_editor()
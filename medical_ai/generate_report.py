@@ -1,38 +1,230 @@
+import argparse
 import json
-from typing import List
+import re
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional
 
-from rich.pretty import pprint
+import arxiv
+from phi.utils.timer import Timer
 
+from ai.pdf_store import Pages, extract_stored_pdf, pdf_store
+from arxiv_ai.ingest import fetch_pdf, get_extraction_pool, get_paper_details
 from medical_ai.assistants import (
     SearchTerms,
     SearchResults,
-    search_term_generator,
-    arxiv_search_assistant,
-    research_editor,
-    arxiv_toolkit,
+    get_search_term_generator,
+    get_arxiv_search_assistant,
+    get_research_editor,
 )
+from utils.log import logger
 
-# Topic to generate a report on
-topic = "AI in Healthcare"
+######################################################
+## Medical research report pipeline
+######################################################
 
-# Generate a list of search terms
-search_terms: SearchTerms = search_term_generator.run(topic)  # type: ignore
-pprint(search_terms)
 
-# Generate a list of search results
-arxiv_search_results: List[SearchResults] = []
-for search_term in search_terms.terms:
-    search_results: SearchResults = arxiv_search_assistant.run(search_term)  # type: ignore
-    arxiv_search_results.append(search_results)
-# pprint(arxiv_search_results)
+@dataclass
+class Report:
+    topic: str
+    search_terms: List[str] = field(default_factory=list)
+    paper_ids: List[str] = field(default_factory=list)
+    content: Optional[str] = None
+    # Seconds spent in each stage of the pipeline
+    timings: Dict[str, float] = field(default_factory=dict)
 
-search_result_ids = []
-for search_result in arxiv_search_results:
-    search_result_ids.extend([result.id for result in search_result.results])
 
-# Read the content of the search results
-search_result_content = arxiv_toolkit.read_arxiv_papers(search_result_ids, pages_to_read=2)
+def generate_search_terms(topic: str, num_terms: int = 2) -> List[str]:
+    search_terms = get_search_term_generator().run(json.dumps({"topic": topic, "num_terms": num_terms}))
+    if not isinstance(search_terms, SearchTerms):
+        raise ValueError(f"Could not generate search terms for: {topic}")
+    return search_terms.terms
 
-research_editor.print_response(
-    json.dumps({"topic": "AI in Healthcare", "articles": search_result_content}, indent=4), show_message=False
-)
+
+def search_arxiv(search_terms: List[str], max_workers: int = 4) -> List[SearchResults]:
+    """Searches arXiv for every search term concurrently, a term whose search fails is skipped"""
+    if len(search_terms) == 0:
+        return []
+
+    search_results: List[SearchResults] = []
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(search_terms))) as executor:
+        # Assistants keep the state of their run, so every search gets its own
+        futures = [executor.submit(get_arxiv_search_assistant().run, term) for term in search_terms]
+        # Results are kept in the order of the search terms
+        for term, future in zip(search_terms, futures):
+            try:
+                result = future.result()
+                if isinstance(result, SearchResults):
+                    search_results.append(result)
+            except Exception as e:
+                logger.error(f"Error searching arXiv for: {term}: {e}")
+    return search_results
+
+
+def get_paper_ids(search_results: List[SearchResults]) -> List[str]:
+    """Returns the ids of the papers found, in order and without duplicates across search terms"""
+    paper_ids: Dict[str, str] = {}
+    for search_result in search_results:
+        for result in search_result.results:
+            # The same paper can be found at different versions
+            paper_ids.setdefault(re.sub(r"v\d+$", "", result.id), result.id)
+    return list(paper_ids.values())
+
+
+def read_arxiv_papers(
+    paper_ids: List[str], pages_to_read: Optional[int] = 2, max_workers: int = 4
+) -> List[Dict[str, Any]]:
+    """Reads the metadata and first pages of arXiv papers.
+
+    PDFs are downloaded concurrently and the text of each downloaded PDF is extracted in the
+    extraction process pool while the others download. PDFs and their text are kept in the PDF
+    store, so a paper read before is neither downloaded nor parsed again.
+
+    Args:
+        paper_ids (List[str]): The ids of the papers. Eg: ["2103.03404v1"]
+        pages_to_read (int): Number of pages to read from each paper, None to read all pages.
+        max_workers (int): Number of papers downloaded at the same time.
+
+    Returns:
+        List[Dict[str, Any]]: The papers, with the text of their pages.
+    """
+    if len(paper_ids) == 0:
+        return []
+
+    results = list(arxiv.Client().results(arxiv.Search(id_list=paper_ids)))
+    articles: Dict[str, Dict[str, Any]] = {}
+    for result in results:
+        articles[result.get_short_id()] = {"id": result.get_short_id(), **get_paper_details(result)}
+
+    def add_content(result: arxiv.Result, pages: Pages) -> None:
+        articles[result.get_short_id()]["content"] = [
+            {"page": page_number, "text": text}
+            for page_number, text in pages
+            if pages_to_read is None or page_number <= pages_to_read
+        ]
+
+    extracting = {}
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="arxiv-download") as downloads:
+        downloading = {downloads.submit(fetch_pdf, result): result for result in results if result.pdf_url}
+        for future in as_completed(downloading):
+            result = downloading[future]
+            try:
+                digest = future.result()
+                pages = pdf_store.get_pages(digest)
+                if pages is None:
+                    extraction = get_extraction_pool().submit(extract_stored_pdf, str(pdf_store.root), digest)
+                    extracting[extraction] = result
+                else:
+                    add_content(result, pages)
+            except Exception as e:
+                logger.error(f"Error downloading paper {result.entry_id}: {e}")
+    for future in as_completed(extracting):
+        result = extracting[future]
+        try:
+            add_content(result, future.result())
+        except BrokenProcessPool as e:
+            # A crashed worker breaks the pool, the next papers get a new one
+            get_extraction_pool.cache_clear()
+            logger.error(f"Error extracting paper {result.entry_id}: {e}")
+        except Exception as e:
+            logger.error(f"Error extracting paper {result.entry_id}: {e}")
+    return list(articles.values())
+
+
+def generate_report(
+    topic: str, num_search_terms: int = 2, pages_to_read: Optional[int] = 2, max_workers: int = 4
+) -> Report:
+    """Generates a report on a topic from the arXiv papers found for it.
+
+    The pipeline generates search terms for the topic, searches arXiv for every term concurrently,
+    reads the papers found (once, even if found for several terms) and writes the report from them.
+
+    Args:
+        topic (str): The topic of the report.
+        num_search_terms (int): Number of search terms to generate.
+        pages_to_read (int): Number of pages to read from each paper, None to read all pages.
+        max_workers (int): Number of searches and downloads running at the same time.
+
+    Returns:
+        Report: The report, with the time spent in each stage.
+    """
+    report = Report(topic=topic)
+
+    with Timer() as timer:
+        report.search_terms = generate_search_terms(topic, num_terms=num_search_terms)
+    report.timings["search_terms"] = timer.elapsed
+    logger.info(f"Search terms for {topic}: {report.search_terms}")
+
+    with Timer() as timer:
+        search_results = search_arxiv(report.search_terms, max_workers=max_workers)
+    report.timings["search"] = timer.elapsed
+    report.paper_ids = get_paper_ids(search_results)
+    logger.info(f"Papers for {topic}: {report.paper_ids}")
+
+    with Timer() as timer:
+        articles = read_arxiv_papers(report.paper_ids, pages_to_read=pages_to_read, max_workers=max_workers)
+    report.timings["read"] = timer.elapsed
+
+    with Timer() as timer:
+        report.content = get_research_editor().run(
+            json.dumps({"topic": topic, "articles": articles}, indent=4), stream=False
+        )
+    report.timings["report"] = timer.elapsed
+
+    timings = ", ".join(f"{stage}={seconds:.1f}s" for stage, seconds in report.timings.items())
+    logger.info(f"Generated report on {topic}: {timings}")
+    return report
+
+
+def generate_reports(topics: List[str], max_concurrent_reports: int = 2, **kwargs: Any) -> List[Report]:
+    """Generates a report on each topic, `max_concurrent_reports` at a time.
+
+    Args:
+        topics (List[str]): The topics of the reports.
+        max_concurrent_reports (int): Number of reports generated at the same time.
+        kwargs: Passed on to `generate_report`.
+
+    Returns:
+        List[Report]: The reports, in the order of `topics`. A report that failed has no content.
+    """
+    reports: Dict[str, Report] = {}
+    with ThreadPoolExecutor(max_workers=max_concurrent_reports, thread_name_prefix="report") as executor:
+        futures = {executor.submit(generate_report, topic, **kwargs): topic for topic in topics}
+        for future in as_completed(futures):
+            topic = futures[future]
+            try:
+                reports[topic] = future.result()
+            except Exception as e:
+                logger.error(f"Error generating report on {topic}: {e}")
+                reports[topic] = Report(topic=topic)
+    return [reports[topic] for topic in topics]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate medical research reports from arXiv papers")
+    parser.add_argument("topics", nargs="+", help="Topics to generate a report on")
+    parser.add_argument("--num-search-terms", type=int, default=2)
+    parser.add_argument("--pages-to-read", type=int, default=2)
+    parser.add_argument("--max-workers", type=int, default=4)
+    parser.add_argument("--max-concurrent-reports", type=int, default=2)
+    parser.add_argument("--output-dir", default=None, help="Directory to write the reports to as markdown")
+    args = parser.parse_args()
+
+    for report in generate_reports(
+        args.topics,
+        max_concurrent_reports=args.max_concurrent_reports,
+        num_search_terms=args.num_search_terms,
+        pages_to_read=args.pages_to_read,
+        max_workers=args.max_workers,
+    ):
+        if report.content is None:
+            continue
+        if args.output_dir is None:
+            print(report.content)
+            continue
+        report_path = Path(args.output_dir).joinpath(f"{re.sub(r'[^a-z0-9]+', '_', report.topic.lower())}.md")
+        report_path.parent.mkdir(parents=True, exist_ok=True)
+        report_path.write_text(report.content)
+        logger.info(f"Wrote report on {report.topic} to {report_path}")
@@ -1,8 +1,7 @@
-from typing import List
+from typing import Any, Dict, List
 
 import streamlit as st
 from phi.assistant import Assistant
-from phi.document import Document
 from phi.document.reader.pdf import PDFReader
 from phi.tools.streamlit.components import (
     get_openai_key_sidebar,
@@ -10,8 +9,11 @@ from phi.tools.streamlit.components import (
     reload_button_sidebar,
 )
 
-from pdf_ai.assistant import get_pdf_assistant
+from pdf_ai.assistant import get_pdf_assistant, refresh_pdf_assistant
+from ai.pdf_ingest import submit_pdf
+from pdf_ai.knowledge import set_latest_document
 from utils.log import logger
+from utils.session_cache import invalidate, session_cached
 
 
 st.set_page_config(
@@ -25,10 +27,38 @@ st.markdown("##### :blue_heart: built using [phidata](https://github.com/phidata
 def restart_assistant():
     st.session_state["pdf_assistant"] = None
     st.session_state["pdf_assistant_run_id"] = None
+    invalidate("pdf_messages", "pdf_run_ids")
     st.session_state["file_uploader_key"] += 1
     st.rerun()
 
 
+def show_ingestions(pdf_assistant: Assistant, polling: bool) -> None:
+    """Shows the progress of the PDFs loading in the background"""
+    for ingestion in list(st.session_state["pdf_ingestions"]):
+        if not ingestion.running:
+            st.session_state["pdf_ingestions"].remove(ingestion)
+            st.session_state["pdf_ingestions_finished"].append(ingestion)
+            if ingestion.status == "failed":
+                logger.error(f"Could not read {ingestion.name}: {ingestion.error}")
+            else:
+                # Update the instructions and document names, the run and its chat stay as they are
+                refresh_pdf_assistant(pdf_assistant)
+    if polling and len(st.session_state["pdf_ingestions"]) == 0:
+        # The last PDF finished loading, a full run of the page stops the polling
+        st.session_state["pdf_ingestions_stopped"] = True
+        st.rerun()
+    # Finished ingestions are shown until the next full run of the page, or the one after the
+    # run that stopped the polling
+    for ingestion in st.session_state["pdf_ingestions_finished"]:
+        if ingestion.status == "failed":
+            st.error("Could not read PDF")
+        else:
+            st.success(f"Loaded {ingestion.name}")
+    for ingestion in st.session_state["pdf_ingestions"]:
+        pages = f"{ingestion.pages_done}/{ingestion.num_pages or '?'} pages"
+        st.progress(ingestion.progress, text=f"Loading {ingestion.name}: {pages}")
+
+
 def main() -> None:
     # Get OpenAI key from environment variable or user input
     get_openai_key_sidebar()
@@ -54,17 +84,22 @@ def main() -> None:
     else:
         pdf_assistant = st.session_state["pdf_assistant"]
 
-    # Create assistant run (i.e. log to database) and save run_id in session state
+    # Create assistant run (i.e. log to database) and save run_id in session state.
+    # Only reads or writes storage the first time for an assistant.
     st.session_state["pdf_assistant_run_id"] = pdf_assistant.create_run()
 
-    # Load messages for existing assistant
-    assistant_chat_history = pdf_assistant.memory.get_chat_history()
-    if len(assistant_chat_history) > 0:
-        logger.debug("Loading chat history")
-        st.session_state["messages"] = assistant_chat_history
-    else:
+    # Load messages for existing assistant, once per run
+    def load_messages() -> List[Dict[str, Any]]:
+        assistant_chat_history = pdf_assistant.memory.get_chat_history()
+        if len(assistant_chat_history) > 0:
+            logger.debug("Loading chat history")
+            return assistant_chat_history
         logger.debug("No chat history found")
-        st.session_state["messages"] = [{"role": "assistant", "content": "Ask me questions from the PDF"}]
+        return [{"role": "assistant", "content": "Ask me questions from the PDF"}]
+
+    st.session_state["messages"] = session_cached(
+        "pdf_messages", load_messages, version=st.session_state["pdf_assistant_run_id"]
+    )
 
     # Prompt for user input
     if prompt := st.chat_input():
@@ -95,6 +130,8 @@ def main() -> None:
     if pdf_assistant.knowledge_base:
         if "file_uploader_key" not in st.session_state:
             st.session_state["file_uploader_key"] = 0
+        if "pdf_ingestions" not in st.session_state:
+            st.session_state["pdf_ingestions"] = []
 
         uploaded_file = st.sidebar.file_uploader(
             "Upload a PDF :page_facing_up:",
@@ -102,24 +139,21 @@ def main() -> None:
             key=st.session_state["file_uploader_key"],
         )
         if uploaded_file is not None:
-            alert = st.sidebar.info("Processing PDF...", icon="ℹ️")
             pdf_name = uploaded_file.name.split(".")[0]
             if f"{pdf_name}_uploaded" not in st.session_state:
-                reader = PDFReader()
-                pdf_documents: List[Document] = reader.read(uploaded_file)
-                if pdf_documents:
-                    pdf_assistant.knowledge_base.load_documents(documents=pdf_documents, upsert=True)
-                    # Refresh the assistant to update the instructions and document names
-                    pdf_assistant = get_pdf_assistant(
-                        user_id=username,
-                        run_id=st.session_state["pdf_assistant_run_id"],
-                        debug_mode=True,
-                    )
-                    st.session_state["pdf_assistant"] = pdf_assistant
-                else:
-                    st.sidebar.error("Could not read PDF")
+                # Loaded in the background, the chat stays usable while the PDF loads
+                ingestion = submit_pdf(uploaded_file, pdf_assistant.knowledge_base.vector_db, PDFReader())
+                # Pages are searchable as they load, so the latest document tools find them right away
+                set_latest_document(pdf_assistant.knowledge_base.vector_db, ingestion.name)
+                st.session_state["pdf_ingestions"].append(ingestion)
                 st.session_state[f"{pdf_name}_uploaded"] = True
-            alert.empty()
+
+        # Only this fragment reruns while PDFs load, not the whole page
+        if not st.session_state.pop("pdf_ingestions_stopped", False):
+            st.session_state["pdf_ingestions_finished"] = []
+        loading = any(ingestion.running for ingestion in st.session_state["pdf_ingestions"])
+        with st.sidebar:
+            st.fragment(show_ingestions, run_every=1 if loading else None)(pdf_assistant, polling=loading)
         st.sidebar.success(":information_source: If the PDF throws an error, try uploading it again")
 
     st.sidebar.markdown("---")
@@ -131,7 +165,12 @@ def main() -> None:
         pdf_assistant.auto_rename_run()
 
     if pdf_assistant.storage:
-        pdf_assistant_run_ids: List[str] = pdf_assistant.storage.get_all_run_ids(user_id=username)
+        # Loaded again for a new or another run
+        pdf_assistant_run_ids: List[str] = session_cached(
+            "pdf_run_ids",
+            lambda: pdf_assistant.storage.get_all_run_ids(user_id=username),
+            version=(username, st.session_state["pdf_assistant_run_id"]),
+        )
         new_pdf_assistant_run_id = st.sidebar.selectbox("Run ID", options=pdf_assistant_run_ids)
         if st.session_state["pdf_assistant_run_id"] != new_pdf_assistant_run_id:
             logger.debug(f"Loading run {new_pdf_assistant_run_id}")
@@ -1,5 +1,5 @@
 import json
-from typing import Optional, List
+from typing import Optional, List, Tuple
 
 from phi.assistant import Assistant
 from phi.llm.openai import OpenAIChat
@@ -12,15 +12,15 @@ from pdf_ai.knowledge import get_pdf_knowledge_base_for_user
 from utils.log import logger
 
 
-def get_pdf_assistant(
-    user_id: str,
-    run_id: Optional[str] = None,
-    debug_mode: bool = False,
-) -> Assistant:
-    pdf_tools = PDFTools(user_id=user_id)
+def get_document_names(pdf_tools: PDFTools) -> Optional[List]:
     document_names_json: Optional[str] = pdf_tools.get_document_names()
     document_names: Optional[List] = json.loads(document_names_json) if document_names_json else None
     logger.info(f"Documents available: {document_names}")
+    return document_names
+
+
+def get_pdf_instructions(user_id: str, document_names: Optional[List]) -> Tuple[str, List[str]]:
+    """Returns the introduction and instructions of the assistant for the documents of the user"""
 
     introduction = "Hi, I am PDF AI, built by [phidata](https://github.com/phidatahq/phidata)."
 
@@ -63,11 +63,22 @@ def get_pdf_assistant(
             "If the user asks what is this? they are asking about the latest document",
             "If you cannot find the information in the knowledge base, think if you can find it on the web. If you can find the information on the web, use the `search_web` tool",
             "When searching the knowledge base, search for at least 3 documents.",
-            "When getting document contents, get atleast 3000 words so you get the first few pages.",
+            "When getting document contents, ask for at least 3000 tokens (max_tokens=3000) so you get the first few pages.",
             "Most documents have a table of contents in the beginning so if you need those, use the `get_document_contents` tool.",
             "If the user compliments you, ask them to star phidata on GitHub: https://github.com/phidatahq/phidata",
         ]
     )
+    return introduction, instructions
+
+
+def get_pdf_assistant(
+    user_id: str,
+    run_id: Optional[str] = None,
+    debug_mode: bool = False,
+) -> Assistant:
+    pdf_tools = PDFTools(user_id=user_id)
+    document_names = get_document_names(pdf_tools)
+    introduction, instructions = get_pdf_instructions(user_id, document_names)
 
     return Assistant(
         name=f"pdf_assistant_{user_id}" if user_id else "hn_assistant",
@@ -91,3 +102,16 @@ def get_pdf_assistant(
         instructions=instructions,
         user_data={"documents": document_names},
     )
+
+
+def refresh_pdf_assistant(pdf_assistant: Assistant) -> None:
+    """Updates the instructions of an assistant after the documents of its user changed.
+
+    The run, its memory and the tools are kept, only the document names are read again.
+    """
+    pdf_tools = next(tool for tool in pdf_assistant.tools or [] if isinstance(tool, PDFTools))
+    document_names = get_document_names(pdf_tools)
+    pdf_assistant.introduction, pdf_assistant.instructions = get_pdf_instructions(
+        pdf_tools.user_id, document_names
+    )
+    pdf_assistant.user_data = {**(pdf_assistant.user_data or {}), "documents": document_names}
@@ -1,20 +1,75 @@
+from functools import lru_cache
 from typing import Optional
 
 from phi.knowledge import AssistantKnowledge
-from phi.embedder.openai import OpenAIEmbedder
 from phi.vectordb.pgvector import PgVector2
+from sqlalchemy import Column, DateTime, MetaData, String, Table, func, select, text
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.engine import Engine
+from sqlalchemy.sql.expression import ColumnElement
 
-from db.session import db_url
+from ai.embeddings import CachedOpenAIEmbedder
+from ai.tenant import get_namespace, get_user_vector_db, tenant_filters
 
 
 def get_pdf_knowledge_base_for_user(user_id: Optional[str] = None) -> AssistantKnowledge:
-    table_name = f"pdf_documents_{user_id}" if user_id else "pdf_documents"
     return AssistantKnowledge(
-        vector_db=PgVector2(
-            schema="ai",
-            db_url=db_url,
-            collection=table_name,
-            embedder=OpenAIEmbedder(model="text-embedding-3-small"),
+        vector_db=get_user_vector_db(
+            collection="pdf_documents",
+            user_id=user_id,
+            embedder=CachedOpenAIEmbedder(model="text-embedding-3-small"),
         ),
         num_documents=5,
     )
+
+
+# Name of the latest document uploaded to each PDF collection (or tenant of a shared collection),
+# so tools find it without scanning the collection
+latest_documents_table = Table(
+    "pdf_latest_documents",
+    MetaData(schema="ai"),
+    Column("collection", String, primary_key=True),
+    Column("name", String, nullable=False),
+    Column("updated_at", DateTime(timezone=True), server_default=func.now(), onupdate=func.now()),
+)
+
+
+@lru_cache
+def create_latest_documents_table(engine: Engine) -> None:
+    with engine.begin() as conn:
+        conn.execute(text("CREATE SCHEMA IF NOT EXISTS ai;"))
+    latest_documents_table.create(engine, checkfirst=True)
+
+
+def set_latest_document(vector_db: PgVector2, document_name: str) -> None:
+    """Marks `document_name` as the latest document uploaded to `vector_db`"""
+    create_latest_documents_table(vector_db.db_engine)
+    stmt = postgresql.insert(latest_documents_table).values(
+        collection=get_namespace(vector_db), name=document_name
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["collection"],
+        set_=dict(name=stmt.excluded.name, updated_at=func.now()),
+    )
+    with vector_db.Session() as session, session.begin():
+        session.execute(stmt)
+
+
+def latest_document_name(vector_db: PgVector2) -> ColumnElement:
+    """Returns a SQL expression for the name of the latest document in `vector_db`.
+
+    Embedding it in a query looks up the latest document in the same round trip.
+    Collections loaded before the pointer existed fall back to their newest row.
+    """
+    create_latest_documents_table(vector_db.db_engine)
+    table = vector_db.table
+    return func.coalesce(
+        select(latest_documents_table.c.name)
+        .where(latest_documents_table.c.collection == get_namespace(vector_db))
+        .scalar_subquery(),
+        select(table.c.name)
+        .where(*tenant_filters(vector_db))
+        .order_by(table.c.created_at.desc())
+        .limit(1)
+        .scalar_subquery(),
+    )
@@ -5,8 +5,9 @@ from phi.document import Document
 from phi.tools import ToolRegistry
 from phi.knowledge import AssistantKnowledge
 from phi.vectordb.pgvector import PgVector2
-
-from pdf_ai.knowledge import get_pdf_knowledge_base_for_user
+from ai.catalog import list_catalog
+from ai.search import read_contents, search_documents
+from pdf_ai.knowledge import get_pdf_knowledge_base_for_user, latest_document_name
 from utils.log import logger
 
 
@@ -21,14 +22,15 @@ class PDFTools(ToolRegistry):
         self.register(self.search_document)
         self.register(self.get_document_contents)
 
-    def get_latest_document_contents(self, limit: int = 5000) -> Optional[str]:
+    def get_latest_document_contents(self, max_tokens: int = 1500) -> Optional[str]:
         """Use this function to get the content of the latest document uploaded by the user.
+        The content is read from the start of the document, in page order, and cut at `max_tokens` tokens.
 
         Args:
-            limit (int): Maximum number of characters to return. Defaults to 5000.
+            max_tokens (int): Maximum number of tokens to return. Defaults to 1500.
 
         Returns:
-            str: JSON string of the latest document
+            str: The start of the latest document that fits in `max_tokens`, as plain text
         """
 
         logger.debug(f"Getting latest document for user {self.user_id}")
@@ -36,27 +38,16 @@ class PDFTools(ToolRegistry):
             return "Sorry could not find latest document"
 
         vector_db: PgVector2 = self.knowledge_base.vector_db
-        table = vector_db.table
-        with vector_db.Session() as session, session.begin():
-            query = session.query(table).order_by(table.c.created_at.desc()).limit(1)
-            result = session.execute(query)
-            row = result.fetchone()
-
-            if row is None:
-                return "Sorry could not find latest document"
-
-            latest_document_name = row.name
-            logger.debug(f"Latest document name: {latest_document_name}")
-
-            document_query = session.query(table).filter(table.c.name == latest_document_name)
-            document_result = session.execute(document_query)
-            document_rows = document_result.fetchall()
-            latest_document_content = ""
-            for document_row in document_rows:
-                document_content = document_row.content
-                latest_document_content += document_content
+        # The latest document is looked up in the same query
+        latest_document_content = read_contents(
+            vector_db,
+            where=[vector_db.table.c.name == latest_document_name(vector_db)],
+            max_tokens=max_tokens,
+        )
+        if latest_document_content is None:
+            return "Sorry could not find latest document"
 
-            return latest_document_content[:limit]
+        return latest_document_content
 
     def search_latest_document(self, query: str, num_documents: int = 5) -> Optional[str]:
         """Use this function to search the latest document uploaded by the user for a query.
@@ -74,24 +65,12 @@ class PDFTools(ToolRegistry):
             return "Sorry could not search latest document"
 
         vector_db: PgVector2 = self.knowledge_base.vector_db
-        table = vector_db.table
-        latest_document_name = None
-        with vector_db.Session() as session, session.begin():
-            latest_document_query = session.query(table).order_by(table.c.created_at.desc()).limit(1)
-            result = session.execute(latest_document_query)
-            row = result.fetchone()
-
-            if row is None:
-                return "Sorry could not find latest document"
-
-            latest_document_name = row.name
-            logger.debug(f"Latest document name: {latest_document_name}")
-
-        if latest_document_name is None:
-            return "Sorry could not find latest document"
-
-        search_results: List[Document] = vector_db.search(
-            query=query, limit=num_documents, filters={"name": latest_document_name}
+        # The latest document is looked up in the same query as the search
+        search_results: List[Document] = search_documents(
+            vector_db,
+            query=query,
+            limit=num_documents,
+            where=[vector_db.table.c.name == latest_document_name(vector_db)],
         )
         logger.debug(f"Search result: {search_results}")
 
@@ -115,25 +94,12 @@ class PDFTools(ToolRegistry):
             return None
 
         vector_db: PgVector2 = self.knowledge_base.vector_db
-        table = vector_db.table
-        with vector_db.Session() as session, session.begin():
-            try:
-                query = session.query(table).distinct(table.c.name).limit(limit)
-                result = session.execute(query)
-                rows = result.fetchall()
-
-                if rows is None:
-                    return "Sorry could not find any documents"
-
-                document_names = []
-                for row in rows:
-                    document_name = row.name
-                    document_names.append(document_name)
-
-                return json.dumps(document_names)
-            except Exception as e:
-                logger.error(f"Error getting document names: {e}")
-                return None
+        try:
+            document_names = [entry["name"] for entry in list_catalog(vector_db, limit=limit)]
+            return json.dumps(document_names)
+        except Exception as e:
+            logger.error(f"Error getting document names: {e}")
+            return None
 
     def search_document(self, query: str, document_name: str, num_documents: int = 5) -> Optional[str]:
         """Use this function to search the latest document uploaded by the user for a query.
@@ -161,15 +127,16 @@ class PDFTools(ToolRegistry):
 
         return json.dumps([doc.to_dict() for doc in search_results])
 
-    def get_document_contents(self, document_name: str, limit: int = 5000) -> Optional[str]:
+    def get_document_contents(self, document_name: str, max_tokens: int = 1500) -> Optional[str]:
         """Use this function to get the content of the document with name=document_name.
+        The content is read from the start of the document, in page order, and cut at `max_tokens` tokens.
 
         Args:
             document_name (str): Name of the document to get contents of
-            limit (int): Maximum number of characters to return. Defaults to 5000.
+            max_tokens (int): Maximum number of tokens to return. Defaults to 1500.
 
         Returns:
-            str: JSON string of the document contents
+            str: The start of the document that fits in `max_tokens`, as plain text
         """
 
         logger.debug(f"Getting document contents for user {document_name}")
@@ -177,18 +144,10 @@ class PDFTools(ToolRegistry):
             return "Sorry could not find latest document"
 
         vector_db: PgVector2 = self.knowledge_base.vector_db
-        table = vector_db.table
-        with vector_db.Session() as session, session.begin():
-            document_query = (
-                session.query(table).filter(table.c.name == document_name).order_by(table.c.created_at.desc())
-            )
-            document_result = session.execute(document_query)
-            document_rows = document_result.fetchall()
-            document_content = ""
-            for document_row in document_rows:
-                document_content += document_row.content
-
-            return document_content[:limit]
+        document_content = read_contents(
+            vector_db, where=[vector_db.table.c.name == document_name], max_tokens=max_tokens
+        )
+        return document_content or ""
 
     # def get_documents_with_intro_section(self) -> Optional[str]:
     #     """Use this function to get a quick introduction to the documents uploaded by the user.
@@ -0,0 +1,36 @@
+from typing import Any, Callable, Hashable, Optional, TypeVar
+
+import streamlit as st
+
+T = TypeVar("T")
+
+# Prefix of the session state keys of cached values
+PREFIX = "_session_cache:"
+
+
+def session_cached(key: str, load: Callable[[], T], version: Optional[Hashable] = None) -> T:
+    """Returns the value cached in the Streamlit session under `key`, calling `load` only on a miss.
+
+    Reruns of a page render from the cached value until it is invalidated or its `version` changes,
+    like the user or run the value was loaded for.
+
+    Args:
+        key (str): Name of the value in the session.
+        load (Callable): Loads the value, like a database query.
+        version (Hashable): (optional) The value is loaded again when it changes.
+
+    Returns:
+        The cached value.
+    """
+    entry: Any = st.session_state.get(PREFIX + key)
+    if entry is not None and entry[0] == version:
+        return entry[1]
+    value = load()
+    st.session_state[PREFIX + key] = (version, value)
+    return value
+
+
+def invalidate(*keys: str) -> None:
+    """Drops the cached values of `keys`, they are loaded again on their next use"""
+    for key in keys:
+        st.session_state.pop(PREFIX + key, None)